@@ -18,7 +18,6 @@ from __future__ import division    # This way: 3 / 2 == 1.5; 3 // 2 == 1
 import sys
 import os.path
 import logging
-import hashlib
 try:
     import httplib as httplib      # Python 2
 except ImportError:
@@ -43,6 +42,9 @@ import lib.NicePrint as NicePrint
 # Helper class and functions to rate/pace limiting function calls and run a
 # function multiple attempts/times on error
 import lib.rate_limited as rate_limited
+# -----------------------------------------------------------------------------
+# Helper functions to calculate checksums of files
+import lib.hashing as hashing
 
 
 # =============================================================================
@@ -80,6 +82,8 @@ def flickrapi_fn(fn_name,
 
         Runs flickrapi fn_name function handing over **fn_kwargs.
         It retries attempts, waittime, randtime with @retry
+        Each attempt waits for its tokens on the API bucket and reports
+        its outcome to the adaptive concurrency controller (api_call).
         Checks results is_good and provides feedback accordingly.
         Captures flicrkapi or BasicException error situations.
         caughtcode to report on exception error.
@@ -98,7 +102,8 @@ def flickrapi_fn(fn_name,
 
             Decorator to retry calling a function
         """
-        return fn_name(**kwargs)
+        with rate_limited.api_call(fn_name.__name__):
+            return fn_name(**kwargs)
 
     logging.info('fn:[%s] attempts:[%s] waittime:[%s] randtime:[%s]',
                  fn_name.__name__, attempts, waittime, randtime)
@@ -433,16 +438,9 @@ def callback(progress, verbose_progress):
 def md5checksum(afilepath):
     """ md5checksum
 
-        Calculates the MD5 checksum for afilepath
+        Calculates the MD5 checksum for afilepath (see hashing.digest_file)
     """
-    with open(afilepath, 'rb') as filehandler:
-        calc_md5 = hashlib.md5()
-        while True:
-            data = filehandler.read(8192)
-            if not data:
-                break
-            calc_md5.update(data)
-        return calc_md5.hexdigest()
+    return hashing.digest_file(afilepath)['md5']
 
 
 # -------------------------------------------------------------------------
@@ -26,7 +26,8 @@ import os
 import os.path
 import time
 import sqlite3 as lite
-import subprocess
+import threading
+import multiprocessing
 import xml
 # Prevents error "AttributeError: 'module' object has no attribute 'etree'"
 try:
@@ -60,6 +61,15 @@ import lib.FlickrApiWrapper as faw
 # -----------------------------------------------------------------------------
 # Helper module functions to wrap sqlite3 DB operations
 import lib.SQLiteDBHelper as litedb
+# -----------------------------------------------------------------------------
+# Helper class to scan FILES_DIR reusing unchanged directories listings
+import lib.scanner as scanner
+import lib.hashcache as hashcache
+import lib.remoteindex as remoteindex
+import lib.watcher as watcher
+import lib.tickets as tickets
+import lib.exiftools as exiftools
+import lib.hashing as hashing
 
 # =============================================================================
 # Functions aliases
@@ -88,6 +98,12 @@ class Uploadr(object):
     nuflickr = None
     # Flicrk connection authentication token
     token = None
+    # mp.WorkerPool reused across phases in multiprocessing mode
+    pool = None
+    # litedb.DBWriter for DB writes in multiprocessing mode
+    dbwriter = None
+    # exiftools.ExifToolPool to convert RAW files
+    exiftools = None
 
     # -------------------------------------------------------------------------
     # class Uploadr __init__
@@ -98,6 +114,11 @@ class Uploadr(object):
             a_cfg = A Configuration (check lib.myconfig)
             args  = provides access to arguments values
 
+            Compiles EXCLUDED_FOLDERS and IGNORED_REGEX (self.exclusions).
+            Configures connections to the local DB (litedb.configure).
+            Configures the pace of calls to Flickr (configure_bucket), the
+            retries (configure_retry) and the number of simultaneous uploads
+            (configure_concurrency).
             Gets FlickrAPI cached token, if available.
                 Saves into self.nuflickr (flicrkapi object) and self.token
             Adds .3gp mimetime as video.
@@ -105,6 +126,43 @@ class Uploadr(object):
 
         self.xcfg = a_cfg
         self.args = args
+        # EXCLUDED_FOLDERS and IGNORED_REGEX checks
+        self.exclusions = scanner.ExclusionMatcher(self.xcfg.EXCLUDED_FOLDERS,
+                                                   self.xcfg.IGNORED_REGEX,
+                                                   self.xcfg.FILES_DIR)
+        # fast_digest calculated along with the MD5 checksum of a file:
+        #   path: (hashcache.stat_key, fast_digest). See file_fast_digest.
+        self.fast_digests = {}
+        # remoteindex built (--checksum-index) once per run: index_built.
+        # Whether the current upload call uses it: use_index (shared with
+        # the pool processes, forked before the index is built).
+        self.index_built = False
+        self.use_index = multiprocessing.RawValue('b', False)
+
+        # Settings for connections to the local DB
+        litedb.configure(journal_mode=self.xcfg.DB_JOURNAL_MODE,
+                         synchronous=self.xcfg.DB_SYNCHRONOUS,
+                         cache_size=self.xcfg.DB_CACHE_SIZE,
+                         mmap_size=self.xcfg.DB_MMAP_SIZE,
+                         cached_statements=self.xcfg.DB_CACHED_STATEMENTS,
+                         reuse=self.xcfg.DB_REUSE_CONNECTION)
+
+        # Pace of the calls to Flickr shared by all processes
+        rate_limited.configure_bucket(rate=self.xcfg.API_RATE_PER_SECOND,
+                                      burst=self.xcfg.API_RATE_BURST,
+                                      hourly=self.xcfg.API_HOURLY_QUOTA,
+                                      weights=self.xcfg.API_WEIGHTS)
+        # Backoff in between attempts and pause of all calls to Flickr
+        # after consecutive failures
+        rate_limited.configure_retry(factor=self.xcfg.RETRY_BACKOFF_FACTOR,
+                                     max_wait=self.xcfg.RETRY_MAX_WAIT,
+                                     failures=self.xcfg.BREAKER_FAILURES,
+                                     pause=self.xcfg.BREAKER_PAUSE)
+        # Simultaneous uploads adjusted from --adaptive-min up to -p
+        if (self.args.adaptive_min and
+                self.args.processes and self.args.processes > 0):
+            rate_limited.configure_concurrency(self.args.adaptive_min,
+                                               self.args.processes)
 
         # get nuflickr/token from Cache file, if it exists
         self.nuflickr = faw.get_cached_token(
@@ -175,6 +233,122 @@ class Uploadr(object):
         if self.nuflickr is not None:
             self.token = self.nuflickr.token_cache.token
 
+    # -------------------------------------------------------------------------
+    # get_pool
+    #
+    # Returns the pool of processes for multiprocessing mode
+    #
+    def get_pool(self):
+        """ get_pool
+
+            Returns the mp.WorkerPool (created on first call) with
+            self.args.processes processes. Its processes are kept alive to
+            be reused by upload, create_sets and add_albums_tag and across
+            daemon mode run iterations. Call shutdown_pool at the end.
+            Processes are forked from the current state of the object, so
+            it must only be called once authenticated.
+
+            Also starts the litedb.DBWriter (before forking the pool) which
+            handles the DB writes (see db_write) of the pool processes.
+            Hence the pool processes do not use a DB lock.
+        """
+        if self.pool is None:
+            self.dbwriter = litedb.DBWriter(
+                self.xcfg.DB_PATH,
+                max_attempts=self.xcfg.MAX_SQL_ATTEMPTS)
+            self.dbwriter.start()
+            self.pool = mp.WorkerPool(self.args.processes, self,
+                                      with_lockdb=False)
+        return self.pool
+
+    # -------------------------------------------------------------------------
+    # get_exiftools
+    #
+    # Returns the pool of exiftool processes to convert RAW files
+    #
+    def get_exiftools(self):
+        """ get_exiftools
+
+            Returns the exiftools.ExifToolPool (created on first call) of
+            long running exiftool processes (from RAW_TOOL_PATH), one per
+            CPU. Call shutdown_pool at the end.
+        """
+        if self.exiftools is None:
+            self.exiftools = exiftools.ExifToolPool(
+                os.path.join(NP.strunicodeout(self.xcfg.RAW_TOOL_PATH),
+                             'exiftool'))
+        return self.exiftools
+
+    # -------------------------------------------------------------------------
+    # shutdown_pool
+    #
+    def shutdown_pool(self):
+        """ shutdown_pool
+
+            Stops the processes of the mp.WorkerPool and the exiftool
+            processes, if any.
+        """
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        if self.dbwriter is not None:
+            self.dbwriter.stop()
+            self.dbwriter = None
+        if self.exiftools is not None:
+            self.exiftools.stop()
+            self.exiftools = None
+
+    # -------------------------------------------------------------------------
+    # db_write
+    #
+    # Runs a write statement on the local DB
+    #
+    def db_write(self, con, qry_name, lock, cur, statement,
+                 qmarkargs=(), dbcaughtcode='000', wait=False):
+        """ db_write
+
+            Runs an INSERT/UPDATE/DELETE statement on the local DB.
+            Same arguments as litedb.execute (nprocs = self.args.processes).
+
+            If the litedb.DBWriter is running (multiprocessing mode) the
+            statement is submitted to it and committed later in a batch.
+            With wait, it waits for it to be committed and returns whether
+            it succeeded (see litedb.DBWriter.submit).
+            Otherwise it is executed (and committed) right away.
+        """
+        if self.dbwriter is not None:
+            return self.dbwriter.submit(qry_name, statement,
+                                        qmarkargs=qmarkargs,
+                                        dbcaughtcode=dbcaughtcode,
+                                        wait=wait)
+
+        return litedb.execute(con, qry_name, lock, self.args.processes,
+                              cur, statement,
+                              qmarkargs=qmarkargs,
+                              dbcaughtcode=dbcaughtcode)
+
+    # -------------------------------------------------------------------------
+    # flush_dbwriter
+    #
+    def flush_dbwriter(self):
+        """ flush_dbwriter
+
+            Waits for the litedb.DBWriter (if any) to commit all statements
+            submitted so far. Call it after each multiprocessing phase and
+            before reading back rows just written with db_write (from any
+            process). Reports statements which failed meanwhile.
+        """
+        if self.dbwriter is not None:
+            failed = self.dbwriter.flush()
+            if failed is None or failed > 0:
+                NP.niceerror(caught=True,
+                             caughtprefix='+++ DB',
+                             caughtcode='279',
+                             caughtmsg='DBWriter: [{!s}] statements failed '
+                             'to be recorded on the DB. Please check logs.'
+                             .format('all' if failed is None else failed),
+                             useniceprint=True)
+
     # -------------------------------------------------------------------------
     # remove_excluded_media
     #
@@ -189,6 +363,40 @@ class Uploadr(object):
         """
         NP.niceprint('*****Removing files from Excluded Folders*****')
 
+        self.remove_matching_media(self.exclusions.is_excluded)
+
+        NP.niceprint('*****Completed files from Excluded Folders*****')
+
+    # -------------------------------------------------------------------------
+    # remove_ignored_media
+    #
+    # When IGNORED_REGEX defintion changes. You can run the --remove-ignored
+    # option in order to remove files previously uploaded.
+    #
+    def remove_ignored_media(self):
+        """ remove_ignored_media
+
+        Remove previously uploaded files, that are now being ignored due to
+        change of the INI file configuration IGNORED_REGEX.
+        """
+        NP.niceprint('*****Removing files from Ignored Regex*****')
+
+        self.remove_matching_media(
+            lambda path: self.exclusions.is_ignored(os.path.basename(path)))
+
+        NP.niceprint('*****Completed files from Ignored Regex*****')
+
+    # -------------------------------------------------------------------------
+    # remove_matching_media
+    #
+    # Remove files previously uploaded matching a criteria
+    #
+    def remove_matching_media(self, matches):
+        """ remove_matching_media
+
+        Remove previously uploaded files for which matches(path) is True
+        (see remove_excluded_media and remove_ignored_media).
+        """
         if not self.check_token():
             # authenticate sys.exits in case of failure
             self.authenticate()
@@ -200,24 +408,16 @@ class Uploadr(object):
                        cur,
                        'SELECT files_id, path FROM files',
                        dbcaughtcode='025')
-        rows = cur.fetchall()
-        for row in rows:
-            logging.debug('Checking file_id:[%s] file:[%s] '
-                          'is_file_excluded?',
-                          NP.strunicodeout(row[0]),
-                          NP.strunicodeout(row[1]))
-            logging.debug('type(row[1]):[%s]', type(row[1]))
-            # row[0] is photo_id
-            # row[1] is filename
-            if (self.is_file_excluded(unicode(row[1], 'utf-8')  # noqa
-                                      if sys.version_info < (3, )
-                                      else str(row[1]))):
-                # Running in single processing mode, no need for lock
-                self.delete_file(row)
+        # row[0] is photo_id
+        # row[1] is filename
+        rows = [row for row in cur.fetchall()
+                if matches(scanner.db_text(row[1]))]
+        NP.niceprint('[{!s:>6s}] will be removed...'
+                     .format(str(len(rows))))
 
-        litedb.close(con)
+        self.delete_files(con, rows)
 
-        NP.niceprint('*****Completed files from Excluded Folders*****')
+        litedb.close(con)
 
     # -------------------------------------------------------------------------
     # removeDeleteMedia
@@ -229,9 +429,11 @@ class Uploadr(object):
 
         Remove files deleted at the local source
             loop through database
-            check if file exists
+            check if file exists (scanner.find_missing: folders listed in
+                parallel instead of a stat per file)
             if exists, continue
             if not exists, delete photo from fickr (flickr.photos.delete.html)
+                (see delete_files)
         """
 
         NP.niceprint('*****Removing deleted files*****')
@@ -251,101 +453,111 @@ class Uploadr(object):
         NP.niceprint('[{!s:>6s}] will be checked for Removal...'
                      .format(str(len(rows))))
 
-        count = 0
-        for row in rows:
-            if (not os.path.isfile(row[1].decode('utf-8')
-                                   if NP.is_str_unicode(row[1])
-                                   else row[1])):
-                # Running in single processing mode, no need for lock
-                success = self.delete_file(row)
-                logging.warning('delete_file result: [%s]', success)
-                count = count + 1
-                if count % 3 == 0:
-                    NP.niceprint('[{!s:>6s}] files removed...'
-                                 .format(str(count)))
-        if count % 100 > 0:
-            NP.niceprint('[{!s:>6s}] files removed...'
-                         .format(str(count)))
+        missing = scanner.find_missing(
+            [scanner.db_text(row[1]) for row in rows],
+            threads=max(self.args.scan_threads, scanner.STAT_THREADS))
+        rows = [row for row in rows if scanner.db_text(row[1]) in missing]
+        NP.niceprint('[{!s:>6s}] will be removed...'
+                     .format(str(len(rows))))
+
+        self.delete_files(con, rows)
 
         litedb.close(con)
 
         NP.niceprint('*****Completed deleted files*****')
 
+    # -------------------------------------------------------------------------
+    # delete_files
+    #
+    # Delete a list of files from flickr
+    #
+    def delete_files(self, con, rows):
+        """ delete_files
+
+        Deletes (delete_file) the files in rows (files_id, path):
+            in multiprocessing mode by the pool (fn_delete_files)
+            otherwise local DB updates are committed every 100 files
+        Returns the number of files processed.
+        """
+
+        # running in multi processing mode
+        if rows and self.args.processes and self.args.processes > 0:
+            count = self.get_pool().run('fn_delete_files', rows,
+                                        batch_size=10)
+            self.flush_dbwriter()
+        # running in single processing mode
+        else:
+            count = 0
+            for rows_chunk in mp.chunk(rows, 100):
+                with litedb.transaction(con, 'DELETE#034',
+                                        None, self.args.processes,
+                                        dbcaughtcode='034'):
+                    for row in rows_chunk:
+                        # Running in single processing mode, no need for lock
+                        success = self.delete_file(row)
+                        logging.warning('delete_file result: [%s]', success)
+                        count = count + 1
+                        if count % 3 == 0:
+                            NP.niceprint('[{!s:>6s}] files removed...'
+                                         .format(str(count)))
+        if count % 100 > 0:
+            NP.niceprint('[{!s:>6s}] files removed...'
+                         .format(str(count)))
+
+        return count
+
     # -------------------------------------------------------------------------
     # upload
     #
     #  Main cycle for file upload
     #
-    def upload(self):
+    def upload(self, candidates=None):
         """ upload
 
             Add files to flickr and into their sets(Albums)
             If enabled CHANGE_MEDIA, checks for file changes and updates flickr
+            candidates = list of new or changed files to consider instead of
+                         scanning FILES_DIR (see --watch)
+
+            Files are scanned, filtered, converted (RAW) and uploaded as a
+            pipeline: uploads start as soon as the first folders are scanned.
         """
-        # ---------------------------------------------------------------------
-        # Local Variables
-        #
-        #   nulockdb     = multiprocessing Lock for access to Database
-        #   numutex      = multiprocessing mutex for access to value srunning
-        #   nrunning    = multiprocessing Value to count processed photos
-        nulockdb = None
-        numutex = None
-        nurunning = None
 
         NP.niceprint("*****Uploading files*****")
-
-        con, cur = litedb.connect(self.xcfg.DB_PATH)
-
-        # Search for  media files to load including raw files to convert
-        all_media, rawfiles = self.grab_newfiles()
-
-        # If managing changes, consider all files
+        if self.args.delta_sync:
+            self.sync_remote()
+        if self.args.async_upload and not self.args.dry_run:
+            # Tickets left pending by a previous run
+            self.check_tickets()
+            self.flush_dbwriter()
+        if (self.args.checksum_index and
+                not self.args.not_is_already_uploaded and
+                not self.index_built):
+            # Kept up to date by upload_file/add_file_to_set afterwards
+            self.index_built = (self.is_checksum_index_synced() or
+                                self.build_checksum_index())
+            if not self.index_built:
+                NP.niceprint('Checksum index not available. Searching '
+                             'Flickr for each file instead.',
+                             logalso=logging.WARNING)
+        self.use_index.value = self.index_built
         if self.xcfg.MANAGE_CHANGES:
             logging.warning('MANAGE_CHANGES is True. Reviewing all_media.')
-            changed_media = all_media
-
-        # If not, then get just the new and missing files
         else:
             logging.warning('MANAGE_CHANGES is False. Reviewing only '
                             'changed_media.')
 
-            litedb.execute(con,
-                           'SELECT#027',
-                           nulockdb, self.args.processes,
-                           cur,
-                           'SELECT path FROM files',
-                           dbcaughtcode='027')
-            existing_media = set(file[0] for file in cur.fetchall())
-
-            if existing_media:
-                changed_media = set(all_media) - existing_media
-            else:
-                changed_media = all_media
-
-        changed_media_count = len(changed_media)
-        KonstantsClass.media_count = changed_media_count
-        NP.niceprint('Found [{!s:>6s}] files to upload.'
-                     .format(str(changed_media_count)))
-
-        # Convert Raw files
-        self.convert_raw_files(rawfiles, changed_media)
-
-        if self.args.bad_files:
-            # Cater for bad files
-            litedb.execute(con,
-                           'SELECT#028',
-                           nulockdb, self.args.processes,
-                           cur,
-                           'SELECT path FROM badfiles',
-                           dbcaughtcode='028')
-            bad_media = set(file[0] for file in cur.fetchall())
-            changed_media = set(changed_media) - bad_media
-            logging.debug('len(bad_media)=[%s]', len(bad_media))
+        con, cur = litedb.connect(self.xcfg.DB_PATH)
 
-            changed_media_count = len(changed_media)
-            NP.niceprint('Removing {!s} badfiles. Found {!s} files to upload.'
-                         .format(len(bad_media),
-                                 changed_media_count))
+        # Search for  media files to load including raw files to convert.
+        # Files flow folder by folder into upload while the scan goes on.
+        if candidates is None:
+            found_media = self.iter_newfiles()
+        else:
+            found_media = [self.grab_changedfiles(candidates)]
+        KonstantsClass.media_count = 0
+        changed_media = self.iter_changed_media(con, cur, found_media)
+        poller = self.start_ticket_poller()
 
         # running in multi processing mode
         if self.args.processes and self.args.processes > 0:
@@ -353,32 +565,33 @@ class Uploadr(object):
             logging.debug('__name__:[%s] to prevent recursive calling)!',
                           __name__)
 
-            # To prevent recursive calling, check if __name__ == '__main__'
-            # if __name__ == '__main__':
-            mp.mprocessing(self.args.processes,
-                           nulockdb,
-                           nurunning,
-                           numutex,
-                           changed_media,
-                           self.mp_upload_file,
-                           cur)
+            # Bounded number of files queued for upload: the scan only
+            # advances as processes become available. With --adaptive-min
+            # bounded by the slots adjusted as per Flickr's responses.
+            self.get_pool().run_stream(
+                'mp_upload_file',
+                ([afile] for afile in changed_media),
+                count_total='...',  # Not known until the scan completes
+                max_pending=rate_limited.API_SLOTS.get_limit
+                if rate_limited.API_SLOTS is not None
+                else 2 * self.args.processes)
+            self.stop_ticket_poller(poller)
+            self.flush_dbwriter()
             con.commit()
 
         # running in single processing mode
         else:
             count = 0
-            for i, file in enumerate(changed_media):
+            for file in changed_media:
                 logging.debug('file:[%s] type(file):[%s]',
                               file, type(file))
-                # lock parameter not used (set to None) under single processing
-                success = self.upload_file(lock=None, file=file)
-                if (self.args.drip_feed and
-                        success and
-                        i != changed_media_count - 1):
+                if self.args.drip_feed and count > 0:
                     NP.niceprint('Waiting [{!s}] seconds before next upload'
                                  .format(str(self.xcfg.DRIP_TIME)),
                                  verbosity=1)
                     NUTIME.sleep(self.xcfg.DRIP_TIME)
+                # lock parameter not used (set to None) under single processing
+                self.upload_file(lock=None, file=file)
                 count = count + 1
                 NP.niceprocessedfiles(count,
                                       KonstantsClass.media_count,
@@ -386,12 +599,106 @@ class Uploadr(object):
 
             # Show number of total files processed
             NP.niceprocessedfiles(count, KonstantsClass.media_count, True)
+            self.stop_ticket_poller(poller)
+
+        if poller is not None:
+            self.wait_tickets()
+
+        NP.niceprint('Found [{!s:>6s}] files to upload.'
+                     .format(str(KonstantsClass.media_count)))
+        if hashing.STATS.report() is not None:
+            NP.niceprint(hashing.STATS.report(),
+                         verbosity=1, logalso=logging.INFO)
 
         # Closing DB connection
         litedb.close(con)
 
         NP.niceprint("*****Completed uploading files*****")
 
+    # -------------------------------------------------------------------------
+    # iter_changed_media
+    #
+    # Filters the media found into the media to be uploaded
+    #
+    def iter_changed_media(self, con, cur, found_media):
+        """ iter_changed_media
+
+            Generates the files to be uploaded out of found_media, an
+            iterable of (files, rawfiles) lists (per folder):
+                If not MANAGE_CHANGES, files already on the DB are dropped.
+                With option --async-upload, files with an upload ticket still
+                pending are dropped.
+                RAW files are converted and their JPG files included.
+                With option --bad-files, files on badfiles are dropped.
+            Counts on KonstantsClass.media_count the files generated.
+        """
+
+        for files, rawfiles in found_media:
+            # If managing changes, consider all files
+            if self.xcfg.MANAGE_CHANGES:
+                changed_media = list(files)
+            # If not, then get just the new and missing files
+            else:
+                existing_media = self.db_paths_in(con, cur, 'files', files)
+                changed_media = [afile for afile in files
+                                 if afile not in existing_media]
+
+            if self.args.async_upload and changed_media:
+                pending_media = self.db_paths_in(con, cur, 'pending_tickets',
+                                                 changed_media)
+                if pending_media:
+                    changed_media = [afile for afile in changed_media
+                                     if afile not in pending_media]
+
+            # Convert Raw files
+            if rawfiles:
+                self.convert_raw_files(rawfiles, changed_media)
+
+            # Files are uploaded one at a time: hash them in parallel first
+            if not (self.args.processes and self.args.processes > 0):
+                self.prehash_files(con, cur, changed_media)
+
+            if self.args.bad_files and changed_media:
+                # Cater for bad files
+                bad_media = self.db_paths_in(con, cur, 'badfiles',
+                                             changed_media)
+                if bad_media:
+                    logging.debug('len(bad_media)=[%s]', len(bad_media))
+                    changed_media = [afile for afile in changed_media
+                                     if afile not in bad_media]
+
+            for afile in changed_media:
+                KonstantsClass.media_count += 1
+                yield afile
+
+    # -------------------------------------------------------------------------
+    # db_paths_in
+    #
+    # Which of a list of paths are on a DB table
+    #
+    def db_paths_in(self, con, cur, table, paths):
+        """ db_paths_in
+
+            Returns the set of paths found on column path of table
+            (files, badfiles or pending_tickets).
+        """
+
+        found = set()
+        # Within SQLite default limit of 999 host parameters
+        for paths_chunk in mp.chunk(list(paths), 500):
+            if litedb.execute(con,
+                              'SELECT#028:db_paths_in',
+                              None, self.args.processes,  # No need for lock
+                              cur,
+                              'SELECT path FROM {!s} WHERE path IN ({!s})'
+                              .format(table,
+                                      ', '.join('?' * len(paths_chunk))),
+                              qmarkargs=paths_chunk,
+                              dbcaughtcode='028'):
+                found.update(row[0] for row in cur.fetchall())
+
+        return found
+
     # -------------------------------------------------------------------------
     # convert_raw_files
     #
@@ -410,17 +717,32 @@ class Uploadr(object):
             return
 
         NP.niceprint('*****Converting files*****')
-        for fullpath in rawfiles:
-            dirpath, afile = os.path.split(fullpath)
-            fnameonly = os.path.splitext(afile)[0]
-            ext = os.path.splitext(afile)[1][1:].lower()
-
-            if self.args.dry_run:
+        if self.args.dry_run:
+            for fullpath in rawfiles:
                 NP.niceprint('Dry Run rawfile:[{!s}]...'
                              .format(NP.strunicodeout(fullpath)))
-                continue
+            return
+
+        def convert_fullpath(fullpath):
+            """ convert_fullpath
+
+                convert_raw_file for fullpath.
+            """
+            dirpath, afile = os.path.split(fullpath)
+            return self.convert_raw_file(dirpath,
+                                         afile,
+                                         os.path.splitext(afile)[1][1:]
+                                         .lower(),
+                                         os.path.splitext(afile)[0])
 
-            if self.convert_raw_file(dirpath, afile, ext, fnameonly):
+        # RAW files converted in parallel by the exiftool processes
+        converted = self.get_exiftools().map(convert_fullpath, rawfiles)
+
+        for fullpath, success in zip(rawfiles, converted):
+            dirpath, afile = os.path.split(fullpath)
+            fnameonly = os.path.splitext(afile)[0]
+
+            if success:
                 try:
                     okfilesize = True
                     filesize = os.path.getsize(
@@ -458,7 +780,9 @@ class Uploadr(object):
                                  NP.strunicodeout('/') +
                                  NP.strunicodeout(afile))))
         final_media_files.sort()
-        NP.niceprint('*****Completed converting files*****')
+        NP.niceprint('*****Completed converting files*****'
+                     ' [{!s}] RAW files: average [{:.2f}]s max [{:.2f}]s'
+                     .format(*self.get_exiftools().stats()))
 
     # -------------------------------------------------------------------------
     # convert_raw_file
@@ -494,27 +818,25 @@ class Uploadr(object):
             if convert_or_copy_tags == 'Convert':
                 flag = "-PreviewImage" \
                        if a_fext == 'cr2' else "-JpgFromRaw"
-                command = os.path.join(
-                    NP.strunicodeout(self.xcfg.RAW_TOOL_PATH), 'exiftool') +\
-                    " -b " + flag + " -w .JPG -ext " + a_fext + " -r " +\
-                    "'" + os.path.join(NP.strunicodeout(a_dirpath),
-                                       NP.strunicodeout(a_fname)) + "'"
+                command = ['-b', flag, '-w', '.JPG', '-ext', a_fext, '-r',
+                           os.path.join(NP.strunicodeout(a_dirpath),
+                                        NP.strunicodeout(a_fname))]
             elif convert_or_copy_tags == 'CopyTags':
-                command = os.path.join(
-                    NP.strunicodeout(self.xcfg.RAW_TOOL_PATH), 'exiftool') +\
-                    " -overwrite_original_in_place -tagsfromfile " +\
-                    "'" + os.path.join(NP.strunicodeout(a_dirpath),
-                                       NP.strunicodeout(a_fname)) + "'" +\
-                    " -r -all:all -ext JPG " +\
-                    "'" + os.path.join(NP.strunicodeout(a_dirpath),
-                                       NP.strunicodeout(a_fbasename)) + ".JPG'"
+                command = ['-overwrite_original_in_place', '-tagsfromfile',
+                           os.path.join(NP.strunicodeout(a_dirpath),
+                                        NP.strunicodeout(a_fname)),
+                           '-r', '-all:all', '-ext', 'JPG',
+                           os.path.join(NP.strunicodeout(a_dirpath),
+                                        NP.strunicodeout(a_fbasename)) +
+                           '.JPG']
             else:
                 # Nothing to do
                 return False
 
-            logging.info(command)
+            logging.info('exiftool %s', command)
             try:
-                p_cmd = subprocess.call(command, shell=True)
+                # On a long running exiftool (see get_exiftools)
+                logging.info(self.get_exiftools().execute(*command))
             except Exception:
                 NP.niceerror(caught=True,
                              caughtprefix='+++',
@@ -524,9 +846,6 @@ class Uploadr(object):
                              useniceprint=True,
                              exceptsysinfo=True)
                 result_cmd = False
-            finally:
-                if p_cmd is None:
-                    del p_cmd
 
             return result_cmd
         # ---------------------------------------------------------------------
@@ -539,6 +858,7 @@ class Uploadr(object):
                                                            a_fname))),
                      logalso=logging.INFO)
         success = False
+        convert_start = time.time()
 
         # file_ext = a_fname's extension (without the ".")
         file_ext = os.path.splitext(a_fname)[-1][1:].lower()
@@ -581,8 +901,9 @@ class Uploadr(object):
             return success
 
         success = True
-        NP.niceprint('  Converted raw:[{!s}]'
-                     .format(NP.strunicodeout(a_fname)),
+        NP.niceprint('  Converted raw:[{!s}] in [{:.2f}] seconds'
+                     .format(NP.strunicodeout(a_fname),
+                             time.time() - convert_start),
                      logalso=logging.INFO)
 
         return success
@@ -600,75 +921,16 @@ class Uploadr(object):
             Returns two sorted file lists:
                 JPG files found
                 RAW files found (if RAW conversion option is enabled)
+
+            See iter_newfiles.
         """
 
         files = []
         rawfiles = []
-        for dirpath, dirnames, filenames in\
-                os.walk(self.xcfg.FILES_DIR, followlinks=True):
+        for dir_files, dir_rawfiles in self.iter_newfiles():
+            files.extend(dir_files)
+            rawfiles.extend(dir_rawfiles)
 
-            # Prevent walking thru files in the list of EXCLUDED_FOLDERS
-            # Reduce time by not checking a file in an excluded folder
-            logging.debug('Check for UnicodeWarning comparison '
-                          'dirpath:[%s] type:[%s]',
-                          NP.strunicodeout(os.path.basename(
-                              os.path.normpath(dirpath))),
-                          type(os.path.basename(
-                              os.path.normpath(dirpath))))
-            if os.path.basename(os.path.normpath(dirpath)) \
-                    in self.xcfg.EXCLUDED_FOLDERS:
-                dirnames[:] = []
-                filenames[:] = []
-                logging.info('Folder [%s] on path [%s] excluded.',
-                             NP.strunicodeout(os.path.basename(
-                                 os.path.normpath(dirpath))),
-                             NP.strunicodeout(os.path.normpath(dirpath)))
-
-            for afile in filenames:
-                file_path = os.path.join(NP.strunicodeout(dirpath),
-                                         NP.strunicodeout(afile))
-                # Ignore filenames wihtin IGNORED_REGEX
-                if any(ignored.search(afile)
-                       for ignored in self.xcfg.IGNORED_REGEX):
-                    logging.debug('File:[%s] in IGNORED_REGEX:',
-                                  NP.strunicodeout(file_path))
-                    continue
-                ext = os.path.splitext(os.path.basename(afile))[1][1:].lower()
-                if ext in self.xcfg.ALLOWED_EXT:
-                    filesize = os.path.getsize(os.path.join(
-                        NP.strunicodeout(dirpath), NP.strunicodeout(afile)))
-                    if filesize < self.xcfg.FILE_MAX_SIZE:
-                        files.append(
-                            os.path.normpath(
-                                NP.strunicodeout(dirpath) +
-                                NP.strunicodeout("/") +
-                                NP.strunicodeout(afile).replace("'", "\'")))
-                    else:
-                        NP.niceprint('Skipping file due to '
-                                     'size restriction: [{!s}]'.format(
-                                         os.path.normpath(
-                                             NP.strunicodeout(dirpath) +
-                                             NP.strunicodeout('/') +
-                                             NP.strunicodeout(afile))))
-                # Assumes xCFG.ALLOWED_EXT and xCFG.RAW_EXT are disjoint
-                elif (self.xcfg.CONVERT_RAW_FILES and
-                      (ext in self.xcfg.RAW_EXT)):
-                    if not os.path.exists(
-                            os.path.join(
-                                NP.strunicodeout(dirpath),
-                                NP.strunicodeout(os.path.splitext(afile)[0])) +
-                            ".JPG"):
-                        logging.debug('rawfiles: including:[%s]',
-                                      NP.strunicodeout(afile))
-                        rawfiles.append(
-                            os.path.normpath(
-                                NP.strunicodeout(dirpath) +
-                                NP.strunicodeout("/") +
-                                NP.strunicodeout(afile).replace("'", "\'")))
-                    else:
-                        logging.warning('rawfiles: JPG exists. '
-                                        'Not including:[%s]',
-                                        NP.strunicodeout(afile))
         rawfiles.sort()
         files.sort()
         if not self.args.mask_sensitive:
@@ -688,6 +950,164 @@ class Uploadr(object):
 
         return files, rawfiles
 
+    # -------------------------------------------------------------------------
+    # iter_newfiles
+    #
+    # Generates files and RAW files from FILES_DIR, folder by folder
+    #
+    def iter_newfiles(self):
+        """ iter_newfiles
+
+            Select files from FILES_DIR taking into consideration
+            EXCLUDED_FOLDERS and IGNORED_REGEX filenames.
+            Generates per folder (as it is scanned) two sorted file lists:
+                JPG files found
+                RAW files found (if RAW conversion option is enabled)
+
+            Only folders changed since the previous run are listed (unless
+            option --full-scan is used). Folders are listed in parallel with
+            option --scan-threads. See scanner.ScanIndex.
+        """
+
+        files_count = 0
+        scan_start = time.time()
+        # Time spent by the caller while the scan is suspended
+        scan_paused = 0
+        con, cur = litedb.connect(self.xcfg.DB_PATH)
+        scan = scanner.ScanIndex(con, cur, self.args.processes,
+                                 full_scan=self.args.full_scan,
+                                 threads=self.args.scan_threads)
+        for dirpath, dirnames, filenames in scan.walk(self.xcfg.FILES_DIR):
+
+            # Prevent walking thru files in the list of EXCLUDED_FOLDERS
+            # Reduce time by not checking a file in an excluded folder
+            if self.exclusions.is_excluded_dir(dirpath):
+                dirnames[:] = []
+                filenames[:] = []
+                logging.info('Folder on path [%s] excluded.',
+                             NP.strunicodeout(os.path.normpath(dirpath)))
+
+            files_count += len(filenames)
+            files = []
+            rawfiles = []
+            # Names within dirpath to check for JPG files from RAW files
+            self.select_dir_files(dirpath, filenames,
+                                  set(afile for afile, _ in filenames),
+                                  files, rawfiles)
+            if files or rawfiles:
+                pause_start = time.time()
+                yield sorted(files), sorted(rawfiles)
+                scan_paused += time.time() - pause_start
+
+        scan_secs = time.time() - scan_start - scan_paused
+        scan.save()
+        litedb.close(con)
+        NP.niceprint('Scanned folders: [{!s}] listed, [{!s}] unchanged. '
+                     'Files: [{!s}] in [{:.1f}] seconds ([{:.0f}] files/s).'
+                     .format(scan.misses, scan.hits,
+                             files_count, scan_secs,
+                             files_count / scan_secs if scan_secs else 0),
+                     verbosity=1,
+                     logalso=logging.INFO)
+
+    # -------------------------------------------------------------------------
+    # grab_changedfiles
+    #
+    # Select files and RAW files from a list of new or changed files
+    #
+    def grab_changedfiles(self, candidates):
+        """ grab_changedfiles
+
+            Same as grab_newfiles but selecting only from candidates: the
+            new or changed files reported by a watcher (see --watch).
+            Files within EXCLUDED_FOLDERS are not watched and are dropped
+            here too (see scanner.ExclusionMatcher).
+        """
+
+        files = []
+        rawfiles = []
+        by_dir = {}
+        for apath in candidates:
+            if self.exclusions.is_excluded(apath):
+                logging.info('File on path [%s] excluded.',
+                             NP.strunicodeout(apath))
+                continue
+            try:
+                filesize = os.path.getsize(apath)
+            except OSError:
+                continue
+            by_dir.setdefault(os.path.dirname(apath), []).append(
+                (os.path.basename(apath), filesize))
+
+        for dirpath, filenames in sorted(by_dir.items()):
+            try:
+                dirfilenames = set(os.listdir(dirpath))
+            except OSError:
+                continue
+            self.select_dir_files(dirpath, filenames, dirfilenames,
+                                  files, rawfiles)
+
+        rawfiles.sort()
+        files.sort()
+        return files, rawfiles
+
+    # -------------------------------------------------------------------------
+    # select_dir_files
+    #
+    # Select files and RAW files from a folder to be uploaded
+    #
+    def select_dir_files(self, dirpath, filenames, dirfilenames,
+                         files, rawfiles):
+        """ select_dir_files
+
+            Appends to files and rawfiles the files within dirpath to be
+            uploaded taking into consideration IGNORED_REGEX, ALLOWED_EXT,
+            FILE_MAX_SIZE and RAW_EXT.
+                filenames    = list of (name, size) to select from
+                dirfilenames = set of all file names within dirpath
+                               (to check for JPG files from RAW files)
+        """
+
+        for afile, filesize in filenames:
+            file_path = os.path.join(NP.strunicodeout(dirpath),
+                                     NP.strunicodeout(afile))
+            # Ignore filenames wihtin IGNORED_REGEX
+            if self.exclusions.is_ignored(afile):
+                logging.debug('File:[%s] in IGNORED_REGEX:',
+                              NP.strunicodeout(file_path))
+                continue
+            ext = os.path.splitext(os.path.basename(afile))[1][1:].lower()
+            if ext in self.xcfg.ALLOWED_EXT:
+                if filesize < self.xcfg.FILE_MAX_SIZE:
+                    files.append(
+                        os.path.normpath(
+                            NP.strunicodeout(dirpath) +
+                            NP.strunicodeout("/") +
+                            NP.strunicodeout(afile).replace("'", "\'")))
+                else:
+                    NP.niceprint('Skipping file due to '
+                                 'size restriction: [{!s}]'.format(
+                                     os.path.normpath(
+                                         NP.strunicodeout(dirpath) +
+                                         NP.strunicodeout('/') +
+                                         NP.strunicodeout(afile))))
+            # Assumes xCFG.ALLOWED_EXT and xCFG.RAW_EXT are disjoint
+            elif (self.xcfg.CONVERT_RAW_FILES and
+                  (ext in self.xcfg.RAW_EXT)):
+                if (os.path.splitext(afile)[0] + '.JPG'
+                        not in dirfilenames):
+                    logging.debug('rawfiles: including:[%s]',
+                                  NP.strunicodeout(afile))
+                    rawfiles.append(
+                        os.path.normpath(
+                            NP.strunicodeout(dirpath) +
+                            NP.strunicodeout("/") +
+                            NP.strunicodeout(afile).replace("'", "\'")))
+                else:
+                    logging.warning('rawfiles: JPG exists. '
+                                    'Not including:[%s]',
+                                    NP.strunicodeout(afile))
+
     # -------------------------------------------------------------------------
     # is_file_excluded
     #
@@ -699,26 +1119,9 @@ class Uploadr(object):
         """ is_file_excluded
 
         Returns True if a file is within an EXCLUDED_FOLDERS directory/folder
+        (see scanner.ExclusionMatcher)
         """
-        for excluded_dir in self.xcfg.EXCLUDED_FOLDERS:
-            logging.debug('type(excluded_dir):[%s]', type(excluded_dir))
-            logging.debug('is excluded_dir unicode?[%s]',
-                          NP.is_str_unicode(excluded_dir))
-            logging.debug('type(filename):[%s]', type(filename))
-            logging.debug('is filename unicode?[{%s]',
-                          NP.is_str_unicode(filename))
-            logging.debug('is os.path.dirname(filename) unicode?[%s]',
-                          NP.is_str_unicode(os.path.dirname(filename)))
-            logging.debug('excluded_dir:[%s] filename:[%s]',
-                          NP.strunicodeout(excluded_dir),
-                          NP.strunicodeout(filename))
-            # Now everything should be in Unicode
-            if excluded_dir in os.path.dirname(filename):
-                logging.debug('Returning is_file_excluded:[True]')
-                return True
-
-        logging.debug('Returning is_file_excluded:[False]')
-        return False
+        return self.exclusions.is_excluded(filename)
 
     # -------------------------------------------------------------------------
     # update_video_date
@@ -762,6 +1165,171 @@ class Uploadr(object):
 
         return True
 
+    # -------------------------------------------------------------------------
+    # check_tickets
+    #
+    # Resolves the tickets of asynchronous uploads (--async-upload)
+    #
+    def check_tickets(self):
+        """ check_tickets
+
+            Checks the tickets on table pending_tickets with
+            photos.upload.checkTickets (tickets.PER_CALL tickets per call):
+                Complete: the pic is recorded on files (and its video date
+                          is set) as on a regular upload.
+                Failed:   the ticket is dropped. The file is uploaded again
+                          on the next run.
+            Returns the number of tickets still pending.
+        """
+
+        con, cur = litedb.connect(self.xcfg.DB_PATH)
+        pending = tickets.pending(con, cur, self.args.processes)
+        still_pending = 0
+        for ticket_ids in mp.chunk(sorted(pending), tickets.PER_CALL):
+            get_success, get_result, get_errcode = faw.flickrapi_fn(
+                self.nuflickr.photos.upload.checkTickets, (),
+                dict(tickets=','.join(ticket_ids)),
+                2, 2, False, caughtcode='247')
+            if not get_success:
+                logging.error('checkTickets errcode:[%s]', get_errcode)
+                still_pending += len(ticket_ids)
+                continue
+
+            for ticket_id, status, photo_id in \
+                    tickets.parse_check(get_result):
+                if ticket_id not in pending:
+                    continue
+                path, file_checksum, last_modified = pending[ticket_id]
+                if status == tickets.PENDING:
+                    still_pending += 1
+                    continue
+
+                if status == tickets.COMPLETE:
+                    NP.niceprint('Successful file:[{!s}] ID=[{!s}]'
+                                 .format(NP.strunicodeout(path), photo_id))
+                    self.db_write(
+                        con, 'INSERT#248:check_tickets', None,
+                        cur,
+                        'INSERT INTO files '
+                        '(files_id, path, md5, last_modified, tagged, '
+                        'set_name) '
+                        'VALUES (?, ?, ?, ?, 1, ?)',
+                        qmarkargs=(photo_id, path, file_checksum,
+                                   last_modified,
+                                   faw.set_name_from_file(
+                                       path,
+                                       self.xcfg.FILES_DIR,
+                                       self.xcfg.FULL_SET_NAME)),
+                        dbcaughtcode='248')
+                    self.index_upload(None, con, cur, photo_id, path,
+                                      file_checksum)
+
+                    # Update the Video Date Taken
+                    self.update_video_date(photo_id, path, last_modified)
+                else:
+                    NP.niceerror(caught=True,
+                                 caughtprefix='xxx',
+                                 caughtcode='249',
+                                 caughtmsg='Flickr failed to process '
+                                 'file:[{!s}] Ticket=[{!s}]. To be uploaded '
+                                 'on the next run.'
+                                 .format(NP.strunicodeout(path), ticket_id),
+                                 useniceprint=True)
+
+                self.db_write(con, 'DELETE#250:check_tickets', None,
+                              cur,
+                              tickets.DELETE,
+                              qmarkargs=(ticket_id,),
+                              dbcaughtcode='250')
+
+        litedb.close(con)
+        # The next check_tickets is not to find the tickets just handled
+        self.flush_dbwriter()
+
+        logging.info('check_tickets: pending:[%s] still pending:[%s]',
+                     len(pending), still_pending)
+        return still_pending
+
+    # -------------------------------------------------------------------------
+    # start_ticket_poller
+    #
+    def start_ticket_poller(self):
+        """ start_ticket_poller
+
+            With --async-upload, starts a thread running check_tickets
+            every tickets.POLL_SECS while files are uploaded. Returns
+            (thread, stop event) to be handed over to stop_ticket_poller.
+            None otherwise.
+
+            In multiprocessing mode the pool is started beforehand: the
+            processes are not to be forked while the thread is running.
+        """
+        if not self.args.async_upload or self.args.dry_run:
+            return None
+
+        if self.args.processes and self.args.processes > 0:
+            self.get_pool().start()
+
+        stop = threading.Event()
+        poller = threading.Thread(target=self.poll_tickets,
+                                  args=(stop,),
+                                  name='TicketPoller')
+        poller.daemon = True
+        poller.start()
+        return poller, stop
+
+    # -------------------------------------------------------------------------
+    # poll_tickets
+    #
+    def poll_tickets(self, stop):
+        """ poll_tickets
+
+            Runs check_tickets every tickets.POLL_SECS until stop
+            (threading.Event) is set.
+        """
+        while not stop.wait(tickets.POLL_SECS):
+            self.check_tickets()
+
+    # -------------------------------------------------------------------------
+    # stop_ticket_poller
+    #
+    def stop_ticket_poller(self, poller):
+        """ stop_ticket_poller
+
+            Stops (and waits for) the thread from start_ticket_poller.
+        """
+        if poller is not None:
+            thread, stop = poller
+            stop.set()
+            thread.join()
+
+    # -------------------------------------------------------------------------
+    # wait_tickets
+    #
+    def wait_tickets(self):
+        """ wait_tickets
+
+            Waits (up to tickets.WAIT_SECS) for Flickr to process the
+            asynchronous uploads, so they can be added to Sets on this run.
+            Tickets still pending are checked on the next run.
+        """
+        deadline = time.time() + tickets.WAIT_SECS
+        self.flush_dbwriter()
+        still_pending = self.check_tickets()
+        while still_pending and time.time() < deadline:
+            NP.niceprint('Waiting for Flickr to process [{!s}] uploads...'
+                         .format(still_pending),
+                         verbosity=1)
+            NUTIME.sleep(tickets.POLL_SECS)
+            still_pending = self.check_tickets()
+        self.flush_dbwriter()
+
+        if still_pending:
+            NP.niceprint('[{!s}] uploads still being processed by Flickr. '
+                         'To be checked on the next run.'
+                         .format(still_pending),
+                         logalso=logging.WARNING)
+
     # -------------------------------------------------------------------------
     # mp_upload_file
     #
@@ -779,7 +1347,7 @@ class Uploadr(object):
         # CODING pylint
         # pylint: disable=unused-argument
         for i, filepic in enumerate(filelist):
-            logging.warning('===Element of Chunk:[%s] file:[%s]', i, filepic)
+            logging.warning('===Element of Batch:[%s] file:[%s]', i, filepic)
             self.upload_file(lock, filepic)
 
             # no need to check for
@@ -831,11 +1399,29 @@ class Uploadr(object):
             file          = filename
             file_checksum = md5 checksum
             last_modified = Last modified time
+            Records also setname (Set of file) on column set_name.
+            Returns True if recorded.
             """
 
+            # The DBWriter retries while the DB is locked. Wait for the
+            # INSERT to be committed: an unrecorded pic would be uploaded
+            # again on the next run.
+            if self.dbwriter is not None:
+                return self.db_write(
+                    con, 'INSERT#030', lock,
+                    cur,
+                    'INSERT INTO files '
+                    '(files_id, path, md5, last_modified, tagged, set_name) '
+                    'VALUES (?, ?, ?, ?, 1, ?)',
+                    qmarkargs=(file_id, file, file_checksum, last_modified,
+                               setname),
+                    dbcaughtcode='031',
+                    wait=True)
+
             # Database Locked is returned often on this INSERT
             # Will try MAX_SQL_ATTEMPTS...
             attempts = None
+            db_success = False
             for attempts in range(0, self.xcfg.MAX_SQL_ATTEMPTS):
                 logging.info('db_insert_files: Start:[%s/%s attempts].',
                              attempts,
@@ -845,9 +1431,10 @@ class Uploadr(object):
                     con, 'INSERT#030', lock, self.args.processes,
                     cur,
                     'INSERT INTO files '
-                    '(files_id, path, md5, last_modified, tagged) '
-                    'VALUES (?, ?, ?, ?, 1)',
-                    qmarkargs=(file_id, file, file_checksum, last_modified),
+                    '(files_id, path, md5, last_modified, tagged, set_name) '
+                    'VALUES (?, ?, ?, ?, 1, ?)',
+                    qmarkargs=(file_id, file, file_checksum, last_modified,
+                               setname),
                     dbcaughtcode='031')
 
                 if not db_success:
@@ -872,7 +1459,10 @@ class Uploadr(object):
                              attempts,
                              self.xcfg.MAX_SQL_ATTEMPTS)
                 # Break the cycle of SQL_ATTEMPTS and continue
-                break
+                if db_success:
+                    break
+
+            return db_success
         # ---------------------------------------------------------------------
 
         # ---------------------------------------------------------------------
@@ -890,13 +1480,13 @@ class Uploadr(object):
             last_modified = Last modified time
             """
 
-            litedb.execute(con, 'INSERT#035', lock, self.args.processes,
-                           cur,
-                           'INSERT INTO badfiles '
-                           '(path, md5, last_modified, tagged) '
-                           'VALUES (?, ?, ?, 1)',
-                           qmarkargs=(file, file_checksum, last_modified),
-                           dbcaughtcode='035')
+            self.db_write(con, 'INSERT#035', lock,
+                          cur,
+                          'INSERT INTO badfiles '
+                          '(path, md5, last_modified, tagged) '
+                          'VALUES (?, ?, ?, 1)',
+                          qmarkargs=(file, file_checksum, last_modified),
+                          dbcaughtcode='035')
         # ---------------------------------------------------------------------
 
         if self.args.dry_run:
@@ -918,7 +1508,8 @@ class Uploadr(object):
         litedb.execute(con, 'SELECT#036', lock, self.args.processes,
                        cur,
                        'SELECT rowid, files_id, path, set_id, md5, '
-                       'tagged, last_modified FROM files WHERE path = ?',
+                       'tagged, last_modified, fast_digest, '
+                       'content_digest FROM files WHERE path = ?',
                        qmarkargs=(file,),
                        dbcaughtcode='036')
         row = cur.fetchone()
@@ -928,6 +1519,11 @@ class Uploadr(object):
         last_modified = os.stat(file).st_mtime
         # fille_checksum will be checked only if required for performance
         file_checksum = None
+        # File on DB only touched (same fast_digest): its md5 is unchanged
+        is_same_content = (row is not None and
+                           row[6] != last_modified and
+                           hashing.same_content(file, row[7],
+                                                self.file_fast_digest))
         # Check if file is already loaded
         if self.args.not_is_already_uploaded:
             is_loaded = False
@@ -935,9 +1531,15 @@ class Uploadr(object):
             is_no_set = None
             logging.info('not_is_already_uploaded:[%s]', is_loaded)
         else:
-            file_checksum = faw.md5checksum(file)
-            is_loaded, is_count, isfile_id, is_no_set = \
-                self.is_already_uploaded(file, file_checksum, setname)
+            file_checksum = str(row[4]) if is_same_content\
+                else self.file_md5(lock, file, con, cur)
+            if self.use_index.value:
+                is_loaded, is_count, isfile_id, is_no_set = \
+                    self.is_in_checksum_index(file, file_checksum, setname,
+                                              con, cur)
+            else:
+                is_loaded, is_count, isfile_id, is_no_set = \
+                    self.is_already_uploaded(file, file_checksum, setname)
             logging.info('is_already_uploaded:[%s] '
                          'count:[%s] pic:[%s] '
                          'row is None == [%s] '
@@ -958,7 +1560,7 @@ class Uploadr(object):
         # A) File loaded. Not recorded on DB. Update local DB.
         if is_loaded and row is None:
             if file_checksum is None:
-                file_checksum = faw.md5checksum(file)
+                file_checksum = self.file_md5(lock, file, con, cur)
 
             # Insert into DB files
             NP.niceprint(' Already loaded:[{!s}] '
@@ -984,7 +1586,7 @@ class Uploadr(object):
                             NP.strunicodeout(setname))
 
             if file_checksum is None:
-                file_checksum = faw.md5checksum(file)
+                file_checksum = self.file_md5(lock, file, con, cur)
 
             # Title Handling
             if self.args.title:
@@ -1025,6 +1627,7 @@ class Uploadr(object):
 
             uploadresp = None
             photo_id = None
+            ticket_id = None
             zuploadok = False
             zbadfile = False
             zuploaderror = False
@@ -1035,6 +1638,7 @@ class Uploadr(object):
                 # Reset variables on each iteration
                 uploadresp = None
                 photo_id = None
+                ticket_id = None
                 zuploadok = False
                 zbadfile = False
                 zuploaderror = False
@@ -1050,27 +1654,32 @@ class Uploadr(object):
                 # replace commas from tags and checksum tags
                 # to avoid tags conflicts
                 try:
-                    uploadresp = self.nuflickr.upload(
-                        filename=file,
-                        fileobj=faw.FileWithCallback(
-                            file,
-                            faw.callback,
-                            self.args.verbose_progress),
-                        title=title_filename
-                        if self.xcfg.FLICKR["title"] == ""
-                        else str(self.xcfg.FLICKR["title"]),
-                        description=str(self.xcfg.FLICKR["description"]),
-                        tags='{} checksum:{} album:"{}" {}'
-                        .format(
-                            self.xcfg.FLICKR["tags"],
-                            file_checksum,
-                            NP.strunicodeout(setname),
-                            self.args.tags if self.args.tags else '')
-                        .replace(',', ''),
-                        is_public=str(self.xcfg.FLICKR["is_public"]),
-                        is_family=str(self.xcfg.FLICKR["is_family"]),
-                        is_friend=str(self.xcfg.FLICKR["is_friend"])
-                    )
+                    with rate_limited.api_call('upload'):
+                        uploadresp = self.nuflickr.upload(
+                            filename=file,
+                            fileobj=faw.FileWithCallback(
+                                file,
+                                faw.callback,
+                                self.args.verbose_progress),
+                            title=title_filename
+                            if self.xcfg.FLICKR["title"] == ""
+                            else str(self.xcfg.FLICKR["title"]),
+                            description=str(self.xcfg.FLICKR["description"]),
+                            tags='{} checksum:{} album:"{}" {}'
+                            .format(
+                                self.xcfg.FLICKR["tags"],
+                                file_checksum,
+                                NP.strunicodeout(setname),
+                                self.args.tags if self.args.tags else '')
+                            .replace(',', ''),
+                            is_public=str(self.xcfg.FLICKR["is_public"]),
+                            is_family=str(self.xcfg.FLICKR["is_family"]),
+                            is_friend=str(self.xcfg.FLICKR["is_friend"]),
+                            # Reply with a ticket before processing the file
+                            **({'async': '1'}
+                               if self.args.async_upload
+                               else {})
+                        )
 
                     logging.info('is_good:[%s] Output for uploadresp:[%s]',
                                  faw.is_good(uploadresp),
@@ -1079,7 +1688,22 @@ class Uploadr(object):
                                      encoding='utf-8',
                                      method='xml'))
 
-                    if faw.is_good(uploadresp):
+                    if faw.is_good(uploadresp) and self.args.async_upload:
+                        # Save ticket_id returned from Flickr upload.
+                        # Resolved later on by check_tickets.
+                        ticket_id = tickets.ticket_from_upload(uploadresp)
+                        if ticket_id is None:
+                            zuploaderror = True
+                            raise IOError(uploadresp)
+                        zuploadok = True
+                        NP.niceprint(' Submitted file:[{!s}] '
+                                     'Ticket=[{!s}].'
+                                     .format(NP.strunicodeout(file),
+                                             ticket_id),
+                                     verbosity=1,
+                                     logalso=logging.INFO)
+                        break
+                    elif faw.is_good(uploadresp):
                         zuploadok = True
                         # Save photo_id returned from Flickr upload
                         photo_id = uploadresp.findall('photoid')[0].text
@@ -1095,7 +1719,7 @@ class Uploadr(object):
                         zuploaderror = True
                         raise IOError(uploadresp)
 
-                except (IOError, httplib.HTTPException):
+                except (IOError, httplib.HTTPException) as err:
                     NP.niceerror(caught=True,
                                  caughtprefix='+++',
                                  caughtcode='038',
@@ -1104,14 +1728,17 @@ class Uploadr(object):
                                  exceptsysinfo=True)
                     # CODING: Repeat also below on FlickError (!= 5 and 8)
                     # On error, check if exists a photo with file_checksum
+                    upload_wait = rate_limited.backoff_delay(
+                        attempts, UPLDR_K.upload_sleep,
+                        hint=rate_limited.retry_after(err))
                     NP.niceerror(caught=True,
                                  caughtprefix='xxx',
                                  caughtcode='039',
-                                 caughtmsg='Sleep {!s} and check if file is'
+                                 caughtmsg='Sleep {:.1f} and check if file is'
                                  ' already uploaded.'
-                                 .format(UPLDR_K.upload_sleep),
+                                 .format(upload_wait),
                                  useniceprint=True)
-                    NUTIME.sleep(UPLDR_K.upload_sleep)
+                    NUTIME.sleep(upload_wait)
 
                     zisloaded, ziscount, photo_id, zisnoset = \
                         self.is_already_uploaded(file, file_checksum, setname)
@@ -1180,14 +1807,16 @@ class Uploadr(object):
                     # CODING: Repeat above on IOError
                     # On error, check if exists a photo with
                     # file_checksum
+                    upload_wait = rate_limited.backoff_delay(
+                        attempts, UPLDR_K.upload_sleep)
                     NP.niceerror(caught=True,
                                  caughtprefix='xxx',
                                  caughtcode='042',
-                                 caughtmsg='Sleep {!s} and check if file is'
+                                 caughtmsg='Sleep {:.1f} and check if file is'
                                  ' already uploaded.'
-                                 .format(UPLDR_K.upload_sleep),
+                                 .format(upload_wait),
                                  useniceprint=True)
-                    NUTIME.sleep(UPLDR_K.upload_sleep)
+                    NUTIME.sleep(upload_wait)
 
                     zisloaded, ziscount, photo_id, zisnoset = \
                         self.is_already_uploaded(file, file_checksum, setname)
@@ -1237,6 +1866,16 @@ class Uploadr(object):
             elif (not zuploadok) and zbadfile:
                 NP.niceprint('       Bad file:[{!s}]'
                              .format(NP.strunicodeout(file)))
+            # Submitted (--async-upload). Pending Flickr's processing.
+            elif zuploadok and ticket_id is not None:
+                self.db_write(con, 'INSERT#246:upload_file', lock,
+                              cur,
+                              tickets.STORE,
+                              qmarkargs=(ticket_id, file, file_checksum,
+                                         last_modified),
+                              dbcaughtcode='246')
+
+                success = True
             # Successful update
             elif zuploadok:
                 NP.niceprint('Successful file:[{!s}]'
@@ -1248,14 +1887,19 @@ class Uploadr(object):
                 # Save file_id: from uploadresp or is_already_uploaded
                 file_id = photo_id
 
-                db_insert_files(lock,
-                                file_id, file, file_checksum, last_modified)
+                success = db_insert_files(lock, file_id, file,
+                                          file_checksum, last_modified)
+                if not success:
+                    NP.niceprint('Uploaded file NOT recorded on DB:[{!s}] '
+                                 'photo_id:[{!s}]'
+                                 .format(NP.strunicodeout(file), file_id),
+                                 logalso=logging.ERROR)
+                self.index_upload(lock, con, cur, file_id, file,
+                                  file_checksum)
 
                 # Update the Video Date Taken
                 self.update_video_date(file_id, file, last_modified)
 
-                success = True
-
         # C) File loaded. Recorded on DB. Look for changes...
         elif self.xcfg.MANAGE_CHANGES:
             # We have a file from disk which is found on the database
@@ -1276,8 +1920,8 @@ class Uploadr(object):
 
                 logging.info('Will UPDATE files SET set_id = null '
                              'for pic:[%s] ', row[1])
-                litedb.execute(
-                    con, 'UPDATE#050', lock, self.args.processes,
+                self.db_write(
+                    con, 'UPDATE#050', lock,
                     cur,
                     'UPDATE files SET set_id = null WHERE files_id = ?',
                     qmarkargs=(row[1],),
@@ -1287,12 +1931,16 @@ class Uploadr(object):
             # row[6] is last_modified date/timestamp
             # row[1] is files_id
             # row[4] is md5
+            # row[7] is fast_digest
+            # row[8] is content_digest
             #   if DB/last_modified is None update it with current
             #   file/last_modified value and do nothing else
             #
             #   if DB/lastmodified is different from file/lastmodified
-            #   then: if md5 has changed then perform replace_photo
-            #   operation on Flickr
+            #   then: if fast_digest is unchanged only update last_modified
+            #   else if md5 has changed then perform replace_photo
+            #   operation on Flickr (or only replace_metadata if
+            #   content_digest is unchanged)
             logging.warning('CHANGES LastModified @db:[%s]=[%s]=[%s]:@file',
                             NUTIME.strftime(UPLDR_K.TimeFormat,
                                             NUTIME.localtime(row[6])),
@@ -1302,8 +1950,8 @@ class Uploadr(object):
             if row[6] is None:
                 # Update db the last_modified time of file
 
-                litedb.execute(
-                    con, 'UPDATE#051', lock, self.args.processes,
+                self.db_write(
+                    con, 'UPDATE#051', lock,
                     cur,
                     'UPDATE files SET last_modified = ? WHERE files_id = ?',
                     qmarkargs=(last_modified, row[1]),
@@ -1313,18 +1961,331 @@ class Uploadr(object):
                 # Update db both the new file/md5 and the
                 # last_modified time of file by by calling replace_photo
 
-                if file_checksum is None:
-                    file_checksum = faw.md5checksum(file)
-                if file_checksum != str(row[4]):
-                    self.replace_photo(lock, file, row[1], row[4],
-                                       file_checksum, last_modified,
-                                       cur, con)
+                if is_same_content:
+                    # Only touched. Skip the MD5 checksum and record it
+                    # on hashcache for the new timestamp.
+                    logging.info('Same fast_digest: [%s]',
+                                 NP.strunicodeout(file))
+                    self.db_write(
+                        con, 'UPDATE#037', lock,
+                        cur,
+                        'UPDATE files SET last_modified = ? '
+                        'WHERE files_id = ?',
+                        qmarkargs=(last_modified, row[1]),
+                        dbcaughtcode='037')
+                    self.db_write(con, 'INSERT#270:upload_file', lock, cur,
+                                  hashcache.STORE,
+                                  qmarkargs=hashcache.store_args(
+                                      file, os.stat(file), str(row[4])),
+                                  dbcaughtcode='270')
+                else:
+                    if file_checksum is None:
+                        file_checksum = self.file_md5(lock, file, con, cur)
+                    if file_checksum != str(row[4]):
+                        file_content = self.file_content_digest(file)
+                        if file_content is not None and\
+                                file_content == row[8]:
+                            self.replace_metadata(lock, file, row[1],
+                                                  row[4], file_checksum,
+                                                  last_modified, cur, con)
+                        else:
+                            self.replace_photo(lock, file, row[1], row[4],
+                                               file_checksum, last_modified,
+                                               cur, con,
+                                               content_digest=file_content)
+                    else:
+                        self.db_write(
+                            con, 'UPDATE#271', lock,
+                            cur,
+                            'UPDATE files SET last_modified = ?, '
+                            'fast_digest = ? WHERE files_id = ?',
+                            qmarkargs=(last_modified,
+                                       self.file_fast_digest(file),
+                                       row[1]),
+                            dbcaughtcode='271')
+            elif row[8] is None and self.xcfg.MANAGE_METADATA_CHANGES:
+                # Record the content_digest of the file as uploaded to
+                # recognize later changes of its metadata only
+                file_content = self.file_content_digest(file)
+                if file_content is not None:
+                    self.db_write(
+                        con, 'UPDATE#275', lock,
+                        cur,
+                        'UPDATE files SET content_digest = ? '
+                        'WHERE files_id = ?',
+                        qmarkargs=(file_content, row[1]),
+                        dbcaughtcode='275')
 
         # Closing DB connection
         litedb.close(con)
+        self.fast_digests.pop(file, None)
 
         return success
 
+    # -------------------------------------------------------------------------
+    # file_md5
+    #
+    # MD5 checksum of a file using the hashcache table
+    #
+    def file_md5(self, lock, file, con, cur):
+        """ file_md5
+
+            Returns the MD5 checksum of file. Only reads file if its
+            (size, mtime, inode) changed since its checksum was recorded on
+            the hashcache table. See hashcache. Keeps the fast_digest of
+            file, calculated on the same pass, for file_fast_digest.
+        """
+
+        st_file = os.stat(file)
+        file_checksum = hashcache.lookup(con, cur, self.args.processes,
+                                         file, st_file)
+        if file_checksum is None:
+            digests = hashing.digest_file(file, hashing.MD5_AND_FAST)
+            file_checksum = digests['md5']
+            self.fast_digests[file] = (
+                hashcache.stat_key(st_file),
+                hashing.fast_digest_of(st_file.st_size, digests))
+            self.db_write(con, 'INSERT#522:file_md5', lock, cur,
+                          hashcache.STORE,
+                          qmarkargs=hashcache.store_args(file, st_file,
+                                                         file_checksum),
+                          dbcaughtcode='522')
+
+        return file_checksum
+
+    # -------------------------------------------------------------------------
+    # prehash_files
+    #
+    # MD5 checksum of several files in parallel into the hashcache table
+    #
+    def prehash_files(self, con, cur, files):
+        """ prehash_files
+
+            Calculates with a pool of threads (hashing.digest_files) the MD5
+            checksum of the files not yet on the hashcache table and records
+            them there for file_md5. Their fast_digest is calculated on the
+            same pass and kept for file_fast_digest: touched files are only
+            read once. Not needed with option --not-is-already-uploaded
+            (checksum only calculated on upload).
+        """
+
+        if self.args.not_is_already_uploaded or self.args.dry_run:
+            return
+
+        pending = []
+        for afile in files:
+            try:
+                st_file = os.stat(afile)
+            except OSError:
+                continue
+            if hashcache.lookup(con, cur, self.args.processes,
+                                afile, st_file) is None:
+                pending.append((afile, st_file))
+        if len(pending) < 2:
+            return
+
+        digests = hashing.digest_files([afile for afile, _ in pending],
+                                       hashing.MD5_AND_FAST)
+        self.fast_digests = dict(
+            (afile, (hashcache.stat_key(st_file),
+                     hashing.fast_digest_of(st_file.st_size, adigest)))
+            for (afile, st_file), adigest in zip(pending, digests)
+            if adigest is not None)
+        with litedb.transaction(con, 'INSERT#265:prehash_files',
+                                None, self.args.processes,
+                                dbcaughtcode='265'):
+            litedb.execute_many(con, 'INSERT#266:prehash_files',
+                                None, self.args.processes,
+                                cur,
+                                hashcache.STORE,
+                                [hashcache.store_args(afile, st_file,
+                                                      adigest['md5'])
+                                 for (afile, st_file), adigest
+                                 in zip(pending, digests)
+                                 if adigest is not None],
+                                dbcaughtcode='266')
+
+    # -------------------------------------------------------------------------
+    # file_fast_digest
+    #
+    def file_fast_digest(self, file, st_size=None):
+        """ file_fast_digest
+
+            hashing.fast_digest of file. Without reading file if it was
+            calculated by file_md5 or prehash_files and file is unchanged
+            since. st_size only to match the digest_fn of
+            hashing.same_content: file is stat anyway.
+        """
+
+        st_file = os.stat(file)
+        known = self.fast_digests.get(file)
+        if known is not None and known[0] == hashcache.stat_key(st_file):
+            return known[1]
+
+        return hashing.fast_digest(file, st_file.st_size)
+
+    # -------------------------------------------------------------------------
+    # file_content_digest
+    #
+    def file_content_digest(self, file):
+        """ file_content_digest
+
+            hashing.content_digest of file (which ignores its metadata) if
+            MANAGE_METADATA_CHANGES is True. Otherwise (or for formats other
+            than JPEG and MP4/MOV) None.
+        """
+
+        if not self.xcfg.MANAGE_METADATA_CHANGES:
+            return None
+
+        return hashing.content_digest(file)
+
+    # -------------------------------------------------------------------------
+    # file_keywords
+    #
+    def file_keywords(self, file):
+        """ file_keywords
+
+            Keywords (XMP Subject and IPTC Keywords) of file read with
+            exiftool (from RAW_TOOL_PATH). Empty list if exiftool fails.
+        """
+
+        try:
+            return exiftools.parse_keywords(
+                self.get_exiftools().execute(
+                    *(exiftools.KEYWORDS_ARGS + (file,))))
+        except (IOError, OSError) as err:
+            NP.niceerror(caught=True,
+                         caughtprefix='+++',
+                         caughtcode='276',
+                         caughtmsg='Unable to read keywords of [{!s}] with '
+                         'exiftool: [{!s}]'
+                         .format(NP.strunicodeout(file), err),
+                         useniceprint=True)
+            return []
+
+    # -------------------------------------------------------------------------
+    # replace_metadata
+    #   Should be only called from upload_file
+    #
+    #   Instead of replace_photo when only the metadata of the file changed
+    #   (same content_digest). Arguments as per replace_photo.
+    #
+    def replace_metadata(self, lock, file, file_id,
+                         oldfile_md5, file_md5, last_modified, cur, con):
+        """ replace_metadata
+
+            Updates the checksum tag of Flickr photo file_id (as file_md5)
+            and adds the keywords of file as tags, without uploading the
+            file again. Keywords removed from file are kept on Flickr.
+            Arguments as per replace_photo. Returns True on success.
+        """
+
+        if self.args.dry_run:
+            NP.niceprint('Dry Run Metadata:[{!s}]...'
+                         .format(NP.strunicodeout(file)))
+            return True
+
+        NP.niceprint('Replacing metadata:[{!s}]'
+                     .format(NP.strunicodeout(file)),
+                     verbosity=1)
+
+        res_add_tag, res_get_info = self.replace_checksum_tag(
+            file, file_id, oldfile_md5, file_md5)
+        if not (faw.is_good(res_add_tag) and faw.is_good(res_get_info)):
+            NP.niceprint('Issue replacing metadata:[{!s}]'
+                         .format(NP.strunicodeout(file)),
+                         logalso=logging.ERROR)
+            return False
+
+        keywords = self.file_keywords(file)
+        if keywords:
+            get_success, _, get_errcode = faw.flickrapi_fn(
+                self.nuflickr.photos.addTags, (),
+                dict(photo_id=file_id,
+                     tags=' '.join('"{}"'.format(keyword)
+                                   for keyword in keywords)),
+                2, 2, False, caughtcode='277')
+            if not (get_success and get_errcode == 0):
+                NP.niceprint('Keywords not added:[{!s}]'
+                             .format(NP.strunicodeout(file)),
+                             logalso=logging.ERROR)
+
+        # Update the db: same content_digest
+        self.db_write(con,
+                      'UPDATE#278',
+                      lock,
+                      cur,
+                      'UPDATE files SET md5 = ?,last_modified = ?, '
+                      'fast_digest = ? WHERE files_id = ?',
+                      qmarkargs=(file_md5, last_modified,
+                                 self.file_fast_digest(file), file_id),
+                      dbcaughtcode='278')
+
+        NP.niceprint('Replaced metadata:[{!s}]'
+                     .format(NP.strunicodeout(file)),
+                     logalso=logging.WARNING)
+
+        return True
+
+    # -------------------------------------------------------------------------
+    # replace_checksum_tag
+    #
+    # Replaces on Flickr the checksum tag with the old md5 by the new one
+    #
+    def replace_checksum_tag(self, file, file_id, oldfile_md5, file_md5):
+        """ replace_checksum_tag
+
+            Adds tag checksum:file_md5 to Flickr photo file_id and removes
+            tag checksum:oldfile_md5. Returns the responses of addTags and
+            getInfo (None if not called).
+        """
+
+        res_get_info = None
+
+        # Add checksum tag with new md5
+        get_success, res_add_tag, get_errcode = faw.flickrapi_fn(
+            self.nuflickr.photos.addTags, (),
+            dict(photo_id=file_id,
+                 tags='checksum:{}'.format(file_md5)),
+            2, 2, False, caughtcode='055')
+
+        if get_success and get_errcode == 0:
+            # Gets Flickr file info to obtain all tags
+            # in order to delete checksum tag of old md5
+            gi_success, res_get_info, gi_errcode = faw.flickrapi_fn(
+                self.nuflickr.photos.getInfo, (),
+                dict(photo_id=file_id),
+                2, 2, False, caughtcode='056')
+
+            if gi_success and gi_errcode == 0:
+                # find tag checksum with old md5 to delete it
+                tag_id = None
+                for tag in res_get_info\
+                        .find('photo')\
+                        .find('tags')\
+                        .findall('tag'):
+                    if (tag.attrib['raw'] ==
+                            'checksum:{}'.format(oldfile_md5)):
+                        tag_id = tag.attrib['id']
+                        logging.info('   Found tag_id:[%s]', tag_id)
+                        break
+                if not tag_id:
+                    NP.niceprint(' Can\'t find tag:[{!s}]'
+                                 'for file [{!s}]'
+                                 .format(tag_id, file_id))
+                else:
+                    # delete tag_id with old Md5
+                    logging.info('Removing tag_id:[%s]', tag_id)
+                    if self.photos_remove_tag(tag_id):
+                        NP.niceprint('    Tag removed:[{!s}]'
+                                     .format(NP.strunicodeout(file)))
+                    else:
+                        NP.niceprint('Tag Not removed:[{!s}]'
+                                     .format(NP.strunicodeout(file)))
+
+        return res_add_tag, res_get_info
+
     # -------------------------------------------------------------------------
     # replace_photo
     #   Should be only called from upload_file
@@ -1341,9 +2302,11 @@ class Uploadr(object):
     #                     database
     #   cur             = current cursor for updating Database
     #   con             = current DB connection
+    #   content_digest  = New file content_digest (see file_content_digest)
     #
     def replace_photo(self, lock, file, file_id,
-                      oldfile_md5, file_md5, last_modified, cur, con):
+                      oldfile_md5, file_md5, last_modified, cur, con,
+                      content_digest=None):
         """ replace_photo
         lock            = parameter for multiprocessing control of access to DB
                           (if self.args.processes = 0 then lock can be None
@@ -1357,6 +2320,7 @@ class Uploadr(object):
                           database
         cur             = current cursor for updating Database
         con             = current DB connection
+        content_digest  = New file content_digest (see file_content_digest)
         """
 
         if self.args.dry_run:
@@ -1394,13 +2358,15 @@ class Uploadr(object):
                                      verbosity=1)
 
                     # Use fileobj with filename='dummy'to accept unicode file.
-                    replace_resp = self.nuflickr.replace(
-                        filename='dummy',
-                        fileobj=photo,
-                        # fileobj=faw.FileWithCallback(
-                        #     file, faw.callback, self.args.verbose_progress),
-                        photo_id=file_id
-                    )
+                    with rate_limited.api_call('replace'):
+                        replace_resp = self.nuflickr.replace(
+                            filename='dummy',
+                            fileobj=photo,
+                            # fileobj=faw.FileWithCallback(
+                            #     file, faw.callback,
+                            #     self.args.verbose_progress),
+                            photo_id=file_id
+                        )
 
                     logging.debug('Output for replace_resp: %s',
                                   xml.etree.ElementTree.tostring(
@@ -1411,59 +2377,13 @@ class Uploadr(object):
                                  faw.is_good(replace_resp))
 
                     if faw.is_good(replace_resp):
-                        # Add checksum tag with new md5
-                        get_success, res_add_tag, get_errcode = \
-                            faw.flickrapi_fn(
-                                self.nuflickr.photos.addTags, (),
-                                dict(photo_id=file_id,
-                                     tags='checksum:{}'.format(file_md5)),
-                                2, 2, False, caughtcode='055')
-
-                        if get_success and get_errcode == 0:
-                            # Gets Flickr file info to obtain all tags
-                            # in order to delete checksum tag of old md5
-                            gi_success, res_get_info, gi_errcode = \
-                                faw.flickrapi_fn(
-                                    self.nuflickr.photos.getInfo, (),
-                                    dict(photo_id=file_id),
-                                    2, 2, False, caughtcode='056')
-
-                            if gi_success and gi_errcode == 0:
-                                # find tag checksum with old md5 to delete it
-                                tag_id = None
-                                for tag in res_get_info\
-                                    .find('photo')\
-                                    .find('tags')\
-                                        .findall('tag'):
-                                    if (tag.attrib['raw'] ==
-                                            'checksum:{}'.format(oldfile_md5)):
-                                        tag_id = tag.attrib['id']
-                                        logging.info('   Found tag_id:[%s]',
-                                                     tag_id)
-                                        break
-                                if not tag_id:
-                                    NP.niceprint(' Can\'t find tag:[{!s}]'
-                                                 'for file [{!s}]'
-                                                 .format(tag_id, file_id))
-                                    # break from attempting to update tag_id
-                                    break
-                                else:
-                                    # delete tag_id with old Md5
-                                    logging.info('Removing tag_id:[%s]',
-                                                 tag_id)
-                                    if self.photos_remove_tag(tag_id):
-                                        NP.niceprint(
-                                            '    Tag removed:[{!s}]'
-                                            .format(NP.strunicodeout(file)))
-                                    else:
-                                        NP.niceprint(
-                                            'Tag Not removed:[{!s}]'
-                                            .format(NP.strunicodeout(file)))
+                        res_add_tag, res_get_info = self.replace_checksum_tag(
+                            file, file_id, oldfile_md5, file_md5)
 
                     break
                 # Exceptions for flickr.upload function call handled on the
                 # outer try/except.
-                except (IOError, ValueError, httplib.HTTPException):
+                except (IOError, ValueError, httplib.HTTPException) as err:
                     NP.niceerror(caught=True,
                                  caughtprefix='+++',
                                  caughtcode='060',
@@ -1471,13 +2391,16 @@ class Uploadr(object):
                                  'HTTP exception',
                                  useniceprint=True,
                                  exceptsysinfo=True)
+                    replace_wait = rate_limited.backoff_delay(
+                        attempts, UPLDR_K.upload_sleep,
+                        hint=rate_limited.retry_after(err))
                     NP.niceerror(caught=True,
                                  caughtprefix='xxx',
                                  caughtcode='061',
-                                 caughtmsg='Sleep {!s} and try replacing again'
-                                 .format(UPLDR_K.upload_sleep),
+                                 caughtmsg='Sleep {:.1f} and try replacing '
+                                 'again'.format(replace_wait),
                                  useniceprint=True)
-                    NUTIME.sleep(UPLDR_K.upload_sleep)
+                    NUTIME.sleep(replace_wait)
 
                     if attempts == self.xcfg.MAX_UPLOAD_ATTEMPTS - 1:
                         raise ValueError('Reached maximum number of attempts '
@@ -1506,14 +2429,17 @@ class Uploadr(object):
 
             # Update the db the file uploaded
             # Control for when running multiprocessing set locking
-            litedb.execute(con,
-                           'UPDATE#055',
-                           lock, self.args.processes,
-                           cur,
-                           'UPDATE files SET md5 = ?,last_modified = ? '
-                           'WHERE files_id = ?',
-                           qmarkargs=(file_md5, last_modified, file_id),
-                           dbcaughtcode='055')
+            self.db_write(con,
+                          'UPDATE#055',
+                          lock,
+                          cur,
+                          'UPDATE files SET md5 = ?,last_modified = ?, '
+                          'fast_digest = ?, content_digest = ? '
+                          'WHERE files_id = ?',
+                          qmarkargs=(file_md5, last_modified,
+                                     self.file_fast_digest(file),
+                                     content_digest, file_id),
+                          dbcaughtcode='055')
 
             # Update the Video Date Taken
             self.update_video_date(file_id, file, last_modified)
@@ -1546,6 +2472,8 @@ class Uploadr(object):
                                  .format(NP.strunicodeout(file)),
                                  fname='replace',
                                  logalso=logging.WARNING)
+                    # upload_file is to find the file no longer on the DB
+                    self.flush_dbwriter()
                     if self.upload_file(lock, file):
                         NP.niceprint('.Video replaced:[{!s}]'
                                      .format(NP.strunicodeout(file)),
@@ -1606,53 +2534,39 @@ class Uploadr(object):
         def delete_record_localdb(lock, file):
             """ delete_record_localdb
 
-            Find out if the file is the last item in a set, if so,
-            remove the set from the local db
+            Remove the file from the local db and, if it is the last item
+            in a set, the set.
 
             lock  = for use with use_lock to control access to DB
             file  = row of database with (files_id, path)
 
-            Use new connection and nucur cursor to ensure commit
-
+            Via db_write: in multiprocessing mode committed in batches by
+            the DBWriter. Otherwise on commit of the caller's transaction
+            (if any, see remove_deleted_media).
             """
             con, nucur = litedb.connect(self.xcfg.DB_PATH)
 
-            litedb.execute(con,
-                           'SELECT#058:delete_record_localdb',
-                           lock, self.args.processes,
-                           nucur,
-                           'SELECT set_id FROM files WHERE files_id = ?',
-                           qmarkargs=(file[0],),
-                           dbcaughtcode='058')
-            row = nucur.fetchone()
-            if row is not None:
-                litedb.execute(con,
-                               'SELECT#061:delete_record_localdb',
-                               lock, self.args.processes,
-                               nucur,
-                               'SELECT set_id FROM files WHERE set_id = ?',
-                               qmarkargs=(row[0],),
-                               dbcaughtcode='061')
-                rows = nucur.fetchall()
-                if len(rows) == 1:
-                    NP.niceprint('File is the last of the set, '
-                                 'deleting the set ID: [{!s}]'
-                                 .format(str(row[0])))
-                    litedb.execute(
-                        con, 'DELETE#062:delete_record_localdb',
-                        lock, self.args.processes,
-                        nucur,
-                        'DELETE FROM sets WHERE set_id = ?',
-                        qmarkargs=(row[0],),
-                        dbcaughtcode='062')
-
-            litedb.execute(
-                con, 'DELETE#063:delete_record_localdb',
-                lock, self.args.processes,
-                nucur,
-                'DELETE FROM files WHERE files_id = ?',
-                qmarkargs=(file[0],),
-                dbcaughtcode='063')
+            self.db_write(con, 'DELETE#062:delete_record_localdb',
+                          lock,
+                          nucur,
+                          'DELETE FROM sets WHERE set_id = '
+                          '(SELECT set_id FROM files WHERE files_id = ?) '
+                          'AND (SELECT COUNT(*) FROM files '
+                          'WHERE files.set_id = sets.set_id) = 1',
+                          qmarkargs=(file[0],),
+                          dbcaughtcode='062')
+            self.db_write(con, 'DELETE#063:delete_record_localdb',
+                          lock,
+                          nucur,
+                          'DELETE FROM files WHERE files_id = ?',
+                          qmarkargs=(file[0],),
+                          dbcaughtcode='063')
+            self.db_write(con, 'DELETE#523:delete_record_localdb',
+                          lock,
+                          nucur,
+                          hashcache.DELETE,
+                          qmarkargs=(file[1],),
+                          dbcaughtcode='523')
 
             litedb.close(con)
         # ---------------------------------------------------------------------
@@ -1700,6 +2614,28 @@ class Uploadr(object):
 
         return success
 
+    # -------------------------------------------------------------------------
+    # fn_delete_files
+    #
+    # Processing function for deleting files in multiprocessing mode
+    #
+    def fn_delete_files(self, lockdb, running, mutex, rows, c_total, cur):
+        """ fn_delete_files
+
+            Deletes the files in rows (files_id, path). Counts on running
+            the files deleted.
+        """
+        # CODING pylint
+        # pylint: disable=unused-argument
+        for row in rows:
+            if self.delete_file(row, lockdb):
+                with mutex:
+                    running.value += 1
+                    xcount = running.value
+                if xcount % 100 == 0:
+                    NP.niceprint('[{!s:>6s}] files removed...'
+                                 .format(str(xcount)))
+
     # -------------------------------------------------------------------------
     # log_set_creation
     #
@@ -1716,26 +2652,36 @@ class Uploadr(object):
 
         Assigns Primary photo Id to set on the local DB.
 
-        Also updates photo DB entry with its set_id
+        Also updates photo DB entry with its set_id.
+        Returns True if recorded.
         """
 
         NP.niceprint('  Add set to DB:[{!s}]'
                      .format(NP.strunicodeout(setname)),
                      verbosity=1, logalso=logging.WARNING)
 
-        if litedb.execute(con, 'INSERT#094', lock, self.args.processes,
-                          cur,
-                          'INSERT INTO sets (set_id, name, primary_photo_id) '
-                          'VALUES (?,?,?)',
-                          qmarkargs=(set_id, setname, primary_photo_id),
-                          dbcaughtcode='094'):
-            litedb.execute(con, 'UPDATE#095', lock, self.args.processes,
-                           cur,
-                           'UPDATE files SET set_id = ? WHERE files_id = ?',
-                           qmarkargs=(set_id, primary_photo_id),
-                           dbcaughtcode='095')
+        # Via db_write as Sets are also created by the pool processes
+        if self.db_write(con, 'INSERT#094', lock,
+                         cur,
+                         'INSERT INTO sets (set_id, name, primary_photo_id) '
+                         'VALUES (?,?,?)',
+                         qmarkargs=(set_id, setname, primary_photo_id),
+                         dbcaughtcode='094'):
+            if self.args.checksum_index:
+                self.db_write(con, 'INSERT#281:log_set_creation', lock,
+                              cur,
+                              remoteindex.STORE_SET,
+                              qmarkargs=(str(primary_photo_id), setname),
+                              dbcaughtcode='281')
+            return self.db_write(con, 'UPDATE#095', lock,
+                                 cur,
+                                 'UPDATE files SET set_id = ? '
+                                 'WHERE files_id = ?',
+                                 qmarkargs=(set_id, primary_photo_id),
+                                 dbcaughtcode='095',
+                                 wait=True)
 
-        return True
+        return False
 
     # -------------------------------------------------------------------------
     # run
@@ -1745,10 +2691,15 @@ class Uploadr(object):
     def run(self):
         """ run
             Run in daemon mode. runs upload every SLEEP_TIME seconds.
+            With option --watch see run_watch.
         """
 
         NP.niceprint('Daemon mode run.',
                      logalso=logging.WARNING)
+        if self.args.watch:
+            self.run_watch()
+            return
+
         while True:
             NP.niceprint(' Daemon mode go:[{!s}]'
                          .format(NUTIME.strftime(
@@ -1762,63 +2713,160 @@ class Uploadr(object):
                          logalso=logging.WARNING)
             NUTIME.sleep(self.xcfg.SLEEP_TIME)
 
+    # -------------------------------------------------------------------------
+    # run_watch
+    #
+    # Daemon mode uploading files as they arrive on FILES_DIR
+    #
+    def run_watch(self):
+        """ run_watch
+            Run in daemon mode watching FILES_DIR (inotify or polling).
+            Runs a full upload once and then uploads only the new or changed
+            files (once they are no longer being written) and assigns them
+            to sets. A full upload is done every SLEEP_TIME seconds if
+            changes may have been missed.
+        """
+
+        # Watch before the full upload not to miss files arriving meanwhile
+        awatcher = watcher.get_watcher(self.xcfg.FILES_DIR,
+                                       self.exclusions)
+        try:
+            self.upload()
+            while True:
+                NP.niceprint('    Daemon watch:[{!s}]'
+                             .format(NP.strunicodeout(self.xcfg.FILES_DIR)),
+                             verbosity=1,
+                             logalso=logging.INFO)
+                candidates = awatcher.wait(self.xcfg.SLEEP_TIME)
+                if awatcher.needs_rescan:
+                    awatcher.needs_rescan = False
+                    self.upload()
+                elif candidates:
+                    NP.niceprint(' Daemon mode go:[{!s}] files:[{!s}]'
+                                 .format(NUTIME.strftime(UPLDR_K.TimeFormat),
+                                         len(candidates)))
+                    self.upload(candidates)
+                else:
+                    continue
+                self.create_sets()
+                NP.niceprint('Daemon mode out:[{!s}]'
+                             .format(str(NUTIME.asctime(time.localtime()))))
+        finally:
+            awatcher.close()
+
+    # ---------------------------------------------------------------------
+    # get_set_tasks
+    #
+    # Tasks for fn_create_sets in multiprocessing mode
+    #
+    def get_set_tasks(self, con, cur, sets_to_create, files):
+        """ get_set_tasks
+
+            Returns the batches for fn_create_sets. Each batch is a list with
+            one (setname, set_id, primary files_id, files) item:
+                one batch for each Set to be created (sets_to_create as
+                (setname, primary files_id)) with all of its files. Once
+                created, fn_create_sets hands them back in batches of 5.
+                batches of up to 5 files for Sets already created
+            files = (files_id, path, set_id, set_name) of files not in a Set
+            New Sets come first: their files can only be added once created.
+        """
+
+        litedb.execute(con, 'SELECT#264:get_set_tasks',
+                       None, self.args.processes,  # No need for lock
+                       cur,
+                       'SELECT name, set_id FROM sets',
+                       dbcaughtcode='264')
+        set_ids = dict((NP.strunicodeout(row[0]), row[1])
+                       for row in cur.fetchall())
+
+        files_by_set = {}
+        for filepic in files:
+            # filepic[3] = set_name from files table
+            files_by_set.setdefault(NP.strunicodeout(filepic[3]),
+                                    []).append(filepic)
+
+        tasks = []
+        for aset in sets_to_create:
+            setname = NP.strunicodeout(aset[0])
+            tasks.append([(setname, None, aset[1],
+                           files_by_set.pop(setname, []))])
+
+        for setname, set_files in sorted(files_by_set.items()):
+            tasks.extend([(setname, set_ids.get(setname), None, files_chunk)]
+                         for files_chunk in mp.chunk(set_files, 5))
+
+        return tasks
+
     # ---------------------------------------------------------------------
-    # fn_add_filestosets
+    # fn_create_sets
     #
-    # Processing function for adding files to set in multiprocessing mode
+    # Processing function for creating sets and adding files to sets in
+    # multiprocessing mode
     #
-    def fn_add_filestosets(self, lockdb, running, mutex, sfiles, c_total, cur):
-        """ fn_add_filestosets
+    def fn_create_sets(self, lockdb, running, mutex, sets, c_total, cur):
+        """ fn_create_sets
+
+            Creates each Set in sets without set_id (with its primary
+            files_id) and adds the files of the Sets with set_id. See
+            get_set_tasks. Returns the files of the Sets just created in
+            batches of 5 (follow-up batches for the WorkerPool) so they are
+            added by all processes.
         """
         # CODING pylint
         # pylint: disable=unused-argument
         # CODING Use a different conn and cur to avoid error +++096 (old code)
         fn_con, acur = litedb.connect(self.xcfg.DB_PATH)
 
-        for filepic in sfiles:
-            # filepic[1] = path for the file from table files
-            # filepic[2] = set_id from files table
-            setname = faw.set_name_from_file(filepic[1],
-                                             self.xcfg.FILES_DIR,
-                                             self.xcfg.FULL_SET_NAME)
-
-            aset = None
-            litedb.execute(fn_con,
-                           'SELECT#098:delete_record_localdb',
-                           lockdb, self.args.processes,
-                           acur,
-                           'SELECT set_id, name FROM sets WHERE name = ?',
-                           qmarkargs=(setname,),
-                           dbcaughtcode='098')
-            aset = acur.fetchone()
-
-            if aset is not None:
-                set_id = aset[0]
-
-                NP.niceprint('Add file to set:[{!s}] '
-                             'set:[{!s}] set_id=[{!s}]'
-                             .format(NP.strunicodeout(filepic[1]),
-                                     NP.strunicodeout(setname),
-                                     set_id))
-                self.add_file_to_set(lockdb, set_id, filepic, acur)
-            else:
-                NP.niceprint('Not able to assign pic to set',
-                             logalso=logging.ERROR)
-
-            logging.debug('===Multiprocessing=== in.mutex.acquire(w)')
-            mutex.acquire()
-            running.value += 1
-            xcount = running.value
-            mutex.release()
-            logging.info('===Multiprocessing=== out.mutex.release(w)')
-
-            # Show number of files processed so far
-            NP.niceprocessedfiles(xcount, c_total, False,
-                                  msg='Added to Set')
+        followups = []
+        for setname, set_id, primary_id, set_files in sets:
+            if set_id is None and primary_id is not None:
+                set_id = self.create_set(lockdb,
+                                         setname, primary_id,
+                                         acur, fn_con)
+                NP.niceprint('Created the set:[{!s}] '
+                             'set_id=[{!s}] '
+                             'primaryId=[{!s}]'
+                             .format(NP.strunicodeout(setname),
+                                     set_id,
+                                     primary_id))
+                if set_id:
+                    followups.extend(
+                        [(setname, set_id, None, files_chunk)]
+                        for files_chunk in mp.chunk(
+                            [filepic for filepic in set_files
+                             if filepic[0] != primary_id], 5))
+                    set_files = [filepic for filepic in set_files
+                                 if filepic[0] == primary_id]
+
+            for filepic in set_files:
+                # filepic[0] = files_id, filepic[1] = path from table files
+                if not set_id:
+                    NP.niceprint('Not able to assign pic to set',
+                                 logalso=logging.ERROR)
+                elif filepic[0] != primary_id:
+                    NP.niceprint('Add file to set:[{!s}] '
+                                 'set:[{!s}] set_id=[{!s}]'
+                                 .format(NP.strunicodeout(filepic[1]),
+                                         NP.strunicodeout(setname),
+                                         set_id))
+                    self.add_file_to_set(lockdb, set_id, filepic, acur)
+
+                logging.debug('===Multiprocessing=== in.mutex.acquire(w)')
+                mutex.acquire()
+                running.value += 1
+                xcount = running.value
+                mutex.release()
+                logging.info('===Multiprocessing=== out.mutex.release(w)')
+
+                # Show number of files processed so far
+                NP.niceprocessedfiles(xcount, c_total, False,
+                                      msg='Added to Set')
 
         # Closing DB connection
         litedb.close(fn_con)
-    # -------------------------------------------------------------------------
+
+        return followups
 
     # -------------------------------------------------------------------------
     # create_sets
@@ -1828,21 +2876,21 @@ class Uploadr(object):
 
             Creates Sets (Album) in Flickr
         """
-        # [FIND SETS] Find sets to be created
-        # [PRIMARY PIC] For each set found, determine the primary picture
+        # [FIND SETS] Find sets to be created and their primary picture
+        #   (single query grouped by set_name)
         # [CREATE SET] Create Sets wiht primary picture:
-        #   CODING: what if it is not found?
+        #   in multi-processing each Set is a task for the pool which, once
+        #   the Set is created, queues its files in batches for all processes
+        #   to add them (see fn_create_sets)
         # [WORK THRU PICS] Split work and add files to set in multi-processing
 
         # ---------------------------------------------------------------------
         # Local Variables
         #
         #   slockdb     = multiprocessing Lock for access to Database
-        #   smutex      = multiprocessing mutex for access to value srunning
-        #   srunning    = multiprocessing Value to count processed photos
+        #   use_pool    = Sets are created and files added by the pool
         slockdb = None
-        smutex = None
-        srunning = None
+        use_pool = self.args.processes and self.args.processes > 0
 
         NP.niceprint('*****Creating Sets*****')
 
@@ -1850,111 +2898,213 @@ class Uploadr(object):
             return True
 
         con, cur = litedb.connect(self.xcfg.DB_PATH)
-        con.create_function("getSet", 3, faw.set_name_from_file)
-        # Enable traceback return from con.create_function.
-        litedb.enable_callback_tracebacks(True)
 
         with con:
-            # List of Sets to be created
+            # List of Sets to be created with their Primary photo (the first
+            # file not yet in a Set)
             litedb.execute(con, 'SELECT#145', slockdb, self.args.processes,
                            cur,
-                           'SELECT DISTINCT getSet(path, ?, ?) '
-                           'FROM files WHERE getSet(path, ?, ?) '
-                           'NOT IN (SELECT name FROM sets)',
-                           qmarkargs=(self.xcfg.FILES_DIR,
-                                      self.xcfg.FULL_SET_NAME,
-                                      self.xcfg.FILES_DIR,
-                                      self.xcfg.FULL_SET_NAME,),
+                           'SELECT set_name, MIN(files_id) '
+                           'FROM files '
+                           'WHERE set_id is NULL '
+                           'AND set_name NOT IN (SELECT name FROM sets) '
+                           'GROUP BY set_name',
                            dbcaughtcode='145')
             sets_to_create = cur.fetchall()
 
-            for aset in sets_to_create:
+            # With the pool Sets are created by its processes (fn_create_sets)
+            for aset in ([] if use_pool else sets_to_create):
                 # aset[0] = setname
-                # Find Primary photo
+                # aset[1] = files_id of the Primary photo
                 setname = NP.strunicodeout(aset[0])
-                litedb.execute(con, 'SELECT#156', slockdb, self.args.processes,
-                               cur,
-                               'SELECT MIN(files_id), path '
-                               'FROM files '
-                               'WHERE set_id is NULL '
-                               'AND getSet(path, ?, ?) = ?',
-                               qmarkargs=(self.xcfg.FILES_DIR,
-                                          self.xcfg.FULL_SET_NAME,
-                                          setname,),
-                               dbcaughtcode='156')
-                primary_pic = cur.fetchone()
-
-                # primary_pic[0] = files_id from files table
                 set_id = self.create_set(slockdb,
-                                         setname, primary_pic[0],
+                                         setname, aset[1],
                                          cur, con)
                 NP.niceprint('Created the set:[{!s}] '
                              'set_id=[{!s}] '
                              'primaryId=[{!s}]'
                              .format(NP.strunicodeout(setname),
                                      set_id,
-                                     primary_pic[0]))
+                                     aset[1]))
+            self.flush_dbwriter()
 
             litedb.execute(con, 'SELECT#157', slockdb, self.args.processes,
                            cur,
-                           'SELECT files_id, path, set_id '
+                           'SELECT files_id, path, set_id, set_name '
                            'FROM files '
                            'WHERE set_id is NULL',
                            dbcaughtcode='157')
             files = cur.fetchall()
 
-            # running in multi processing mode
-            if self.args.processes and self.args.processes > 0:
+            # bulk mode: files already in their Sets (as per a listing of
+            # each Set) are recorded right away. Only the others are added.
+            if self.args.bulk_sets:
+                files = self.bulk_add_files_to_sets(con, cur, files)
+
+            # running in multi processing mode: each Set is a task for the
+            # pool. New Sets are created concurrently and their files queued
+            # right away to be added by all processes.
+            if use_pool:
                 logging.debug('Running [%s] processes pool.',
                               self.args.processes)
-                logging.debug('__name__:[%s] to prevent recursive calling)!',
-                              __name__)
-
-                # To prevent recursive calling, check if __name__ == '__main__'
-                # if __name__ == '__main__':
-                mp.mprocessing(self.args.processes,
-                               slockdb,
-                               srunning,
-                               smutex,
-                               files,
-                               self.fn_add_filestosets,
-                               cur)
+                set_tasks = self.get_set_tasks(con, cur,
+                                               sets_to_create, files)
+                self.get_pool().run_stream(
+                    'fn_create_sets',
+                    set_tasks,
+                    count_total=len(files),
+                    max_pending=rate_limited.API_SLOTS.get_limit
+                    if rate_limited.API_SLOTS is not None
+                    else 2 * self.args.processes)
+                self.flush_dbwriter()
 
             # running in single processing mode
             else:
-                for filepic in files:
-                    # filepic[1] = path for the file from table files
-                    # filepic[2] = set_id from files table
-                    setname = faw.set_name_from_file(filepic[1],
-                                                     self.xcfg.FILES_DIR,
-                                                     self.xcfg.FULL_SET_NAME)
-
-                    litedb.execute(con, 'SELECT#158',
-                                   slockdb, self.args.processes,
-                                   cur,
-                                   'SELECT set_id, name '
-                                   'FROM sets WHERE name = ?',
-                                   qmarkargs=(setname,),
-                                   dbcaughtcode='158')
-
-                    aset = cur.fetchone()
-                    if aset is not None:
-                        set_id = aset[0]
-
-                        NP.niceprint('Add file to set:[{!s}] '
-                                     'set:[{!s}] set_id=[{!s}]'
-                                     .format(NP.strunicodeout(filepic[1]),
-                                             NP.strunicodeout(setname),
-                                             set_id))
-                        self.add_file_to_set(slockdb, set_id, filepic, cur)
-                    else:
-                        NP.niceprint('Not able to assign pic to set.',
-                                     logalso=logging.ERROR)
+                # Commit set_id updates every 100 files (with reused DB
+                # connections, add_file_to_set uses the same connection)
+                for files_chunk in mp.chunk(files, 100):
+                    with litedb.transaction(con, 'UPDATE#159',
+                                            slockdb, self.args.processes,
+                                            dbcaughtcode='159'):
+                        for filepic in files_chunk:
+                            # filepic[1] = path for the file from table files
+                            # filepic[2] = set_id from files table
+                            # filepic[3] = set_name from files table
+                            setname = filepic[3]
+
+                            litedb.execute(con, 'SELECT#158',
+                                           slockdb, self.args.processes,
+                                           cur,
+                                           'SELECT set_id, name '
+                                           'FROM sets WHERE name = ?',
+                                           qmarkargs=(setname,),
+                                           dbcaughtcode='158')
+
+                            aset = cur.fetchone()
+                            if aset is not None:
+                                set_id = aset[0]
+
+                                NP.niceprint('Add file to set:[{!s}] '
+                                             'set:[{!s}] set_id=[{!s}]'
+                                             .format(
+                                                 NP.strunicodeout(filepic[1]),
+                                                 NP.strunicodeout(setname),
+                                                 set_id))
+                                self.add_file_to_set(slockdb, set_id,
+                                                     filepic, cur)
+                            else:
+                                NP.niceprint('Not able to assign pic to set.',
+                                             logalso=logging.ERROR)
 
         # Closing DB connection
         litedb.close(con)
         NP.niceprint('*****Completed creating sets*****')
 
+    # -------------------------------------------------------------------------
+    # bulk_add_files_to_sets
+    #
+    # Records the files already in their Sets on Flickr (--bulk-sets)
+    #
+    def bulk_add_files_to_sets(self, con, cur, files):
+        """ bulk_add_files_to_sets
+
+            Records files.set_id (in a single transaction per Set) of the
+            files (files_id, path, set_id, set_name) already in their Set
+            on Flickr as per photosets.getPhotos. Returns the other files,
+            to be added with photosets.addPhoto (add_file_to_set).
+
+            photosets.editPhotos is not used: it replaces all pics of a Set
+            and would drop from it pics added meanwhile or missing from a
+            partial listing.
+        """
+
+        litedb.execute(con, 'SELECT#251:bulk_add_files_to_sets',
+                       None, self.args.processes,  # No need for lock
+                       cur,
+                       'SELECT set_id, name FROM sets',
+                       dbcaughtcode='251')
+        set_ids = dict((NP.strunicodeout(row[1]), row[0])
+                       for row in cur.fetchall())
+
+        files_by_set = {}
+        for filepic in files:
+            # filepic[3] = set_name from table files
+            files_by_set.setdefault(NP.strunicodeout(filepic[3]),
+                                    []).append(filepic)
+
+        to_add = []
+        for setname, set_files in sorted(files_by_set.items()):
+            set_id = set_ids.get(setname)
+            # Sets not yet created (by the pool) or not found on Flickr
+            set_photos = None\
+                if set_id is None\
+                else self.get_photoset_photos(set_id, caughtcode='252')
+            if set_photos is None:
+                to_add.extend(set_files)
+                continue
+
+            members = set(set_photos[1])
+            in_set = [filepic for filepic in set_files
+                      if str(filepic[0]) in members]
+            to_add.extend(filepic for filepic in set_files
+                          if str(filepic[0]) not in members)
+            if not in_set:
+                continue
+
+            with litedb.transaction(con, 'UPDATE#255:bulk_add_files_to_sets',
+                                    None, self.args.processes,
+                                    dbcaughtcode='255'):
+                litedb.execute_many(con, 'UPDATE#256:bulk_add_files_to_sets',
+                                    None, self.args.processes,
+                                    cur,
+                                    'UPDATE files SET set_id = ? '
+                                    'WHERE files_id = ?',
+                                    [(set_id, filepic[0])
+                                     for filepic in in_set],
+                                    dbcaughtcode='256')
+
+            NP.niceprint(' Already in set:[{!s}] files:[{!s}] '
+                         'set_id:[{!s}]'
+                         .format(setname, len(in_set), set_id))
+
+        NP.niceprint('Files already in their Sets:[{!s}] to be added:[{!s}]'
+                     .format(len(files) - len(to_add), len(to_add)))
+        return to_add
+
+    # -------------------------------------------------------------------------
+    # get_photoset_photos
+    #
+    def get_photoset_photos(self, set_id, caughtcode='000'):
+        """ get_photoset_photos
+
+            Returns (primary photo id, [photo ids]) of the Set set_id on
+            Flickr (photosets.getPhotos, remoteindex.PER_PAGE per page).
+            None on error (e.g. Set not found).
+        """
+
+        primary_id = None
+        photo_ids = []
+        page = 1
+        pages = 1
+        while page <= pages:
+            get_success, set_result, get_errcode = faw.flickrapi_fn(
+                self.nuflickr.photosets.getPhotos, (),
+                dict(photoset_id=str(set_id),
+                     per_page=remoteindex.PER_PAGE,
+                     page=page),
+                3, 20, False, caughtcode=caughtcode)
+            if not (get_success and get_errcode == 0):
+                return None
+
+            photoset = set_result.find('photoset')
+            primary_id = photoset.attrib.get('primary')
+            pages = int(photoset.attrib['pages'] or 0)
+            photo_ids.extend(pic.attrib['id']
+                             for pic in photoset.findall('photo'))
+            page += 1
+
+        return primary_id, photo_ids
+
     # -------------------------------------------------------------------------
     # add_file_to_set
     #
@@ -1985,12 +3135,13 @@ class Uploadr(object):
                          .format(NP.strunicodeout(file[1]),
                                  NP.strunicodeout(set_id)))
 
-            litedb.execute(con, 'SELECT#159', lock, self.args.processes,
-                           bcur,
-                           'UPDATE files SET set_id = ? '
-                           'WHERE files_id = ?',
-                           qmarkargs=(set_id, file[0]),
-                           dbcaughtcode='159')
+            self.db_write(con, 'SELECT#159', lock,
+                          bcur,
+                          'UPDATE files SET set_id = ? '
+                          'WHERE files_id = ?',
+                          qmarkargs=(set_id, file[0]),
+                          dbcaughtcode='159')
+            self.index_set_add(lock, con, bcur, file[0], file[1])
 
         elif not get_success and get_errcode == 1:
             # Error: 1: Photoset not found
@@ -2005,12 +3156,13 @@ class Uploadr(object):
             NP.niceprint('Photo already in set... updating DB'
                          'set_id=[{!s}] photo_id=[{!s}]'
                          .format(set_id, file[0]))
-            litedb.execute(con, 'SELECT#160', lock, self.args.processes,
-                           bcur,
-                           'UPDATE files SET set_id = ? '
-                           'WHERE files_id = ?',
-                           qmarkargs=(set_id, file[0]),
-                           dbcaughtcode='160')
+            self.db_write(con, 'SELECT#160', lock,
+                          bcur,
+                          'UPDATE files SET set_id = ? '
+                          'WHERE files_id = ?',
+                          qmarkargs=(set_id, file[0]),
+                          dbcaughtcode='160')
+            self.index_set_add(lock, con, bcur, file[0], file[1])
         else:
             NP.niceerror(caught=True,
                          caughtprefix='xxx',
@@ -2052,12 +3204,18 @@ class Uploadr(object):
         if get_success and get_errcode == 0:
             logging.warning('get_result["photoset"]["id"]:[%s]',
                             get_result.find('photoset').attrib['id'])
-            self.log_set_creation(lock,
-                                  get_result.find('photoset').attrib['id'],
-                                  setname,
-                                  primary_photo_id,
-                                  cur,
-                                  con)
+            if not self.log_set_creation(
+                    lock,
+                    get_result.find('photoset').attrib['id'],
+                    setname,
+                    primary_photo_id,
+                    cur,
+                    con):
+                NP.niceprint('Set NOT recorded on DB:[{!s}] set_id:[{!s}]'
+                             .format(NP.strunicodeout(setname),
+                                     get_result.find('photoset')
+                                     .attrib['id']),
+                             logalso=logging.ERROR)
             return get_result.find('photoset').attrib['id']
         elif not get_success and get_errcode == 2:
             # Add to db the file NOT uploaded
@@ -2133,6 +3291,7 @@ class Uploadr(object):
             # [2] = badfiles table added
             # [3] = Adding album tags to pics on upload.
             #       Used in subsequent searches.
+            # [4] = scandirs/scanentries tables added (folders index).
             litedb.execute(con, 'SELECT#005:setup_db',
                            None, self.args.processes, cur,
                            'PRAGMA user_version',
@@ -2213,7 +3372,169 @@ class Uploadr(object):
             if row[0] == 3:
                 NP.niceprint('Database version: [{!s}]'.format(row[0]))
                 # Database version 4 <=========================DB VERSION: 4===
+                # Cater for folders listing index (see scanner)
+                NP.niceprint('Adding tables scandirs/scanentries to database',
+                             verbosity=1)
+                if scanner.create_tables(con, cur, self.args.processes):
+                    litedb.execute(con, 'PRAGMA#016:setup_db',
+                                   None, self.args.processes, cur,
+                                   'PRAGMA user_version="4"',
+                                   dbcaughtcode='016')
+                    litedb.execute(con, 'PRAGMA#017:setup_db',
+                                   None, self.args.processes, cur,
+                                   'PRAGMA user_version',
+                                   dbcaughtcode='017')
+                    row = cur.fetchone()
+
+            if row[0] == 4:
+                NP.niceprint('Database version: [{!s}]'.format(row[0]))
+                # Database version 5 <=========================DB VERSION: 5===
+                # Cater for checksums cache (see hashcache)
+                NP.niceprint('Adding table hashcache to database',
+                             verbosity=1)
+                if hashcache.create_tables(con, cur, self.args.processes):
+                    litedb.execute(con, 'PRAGMA#018:setup_db',
+                                   None, self.args.processes, cur,
+                                   'PRAGMA user_version="5"',
+                                   dbcaughtcode='018')
+                    litedb.execute(con, 'PRAGMA#019:setup_db',
+                                   None, self.args.processes, cur,
+                                   'PRAGMA user_version',
+                                   dbcaughtcode='019')
+                    row = cur.fetchone()
+
+            if row[0] == 5:
+                NP.niceprint('Database version: [{!s}]'.format(row[0]))
+                # Database version 6 <=========================DB VERSION: 6===
+                # Cater for index of pics on Flickr (see remoteindex)
+                NP.niceprint('Adding tables remote_checksums/'
+                             'remote_photosets to database',
+                             verbosity=1)
+                if remoteindex.create_tables(con, cur, self.args.processes):
+                    litedb.execute(con, 'PRAGMA#021:setup_db',
+                                   None, self.args.processes, cur,
+                                   'PRAGMA user_version="6"',
+                                   dbcaughtcode='021')
+                    litedb.execute(con, 'PRAGMA#022:setup_db',
+                                   None, self.args.processes, cur,
+                                   'PRAGMA user_version',
+                                   dbcaughtcode='022')
+                    row = cur.fetchone()
+
+            if row[0] == 6:
+                NP.niceprint('Database version: [{!s}]'.format(row[0]))
+                # Database version 7 <=========================DB VERSION: 7===
+                # Cater for delta sync with Flickr (see sync_remote)
+                NP.niceprint('Adding table sync_state to database',
+                             verbosity=1)
+                if remoteindex.create_sync_tables(con, cur,
+                                                  self.args.processes):
+                    litedb.execute(con, 'PRAGMA#023:setup_db',
+                                   None, self.args.processes, cur,
+                                   'PRAGMA user_version="7"',
+                                   dbcaughtcode='023')
+                    litedb.execute(con, 'PRAGMA#024:setup_db',
+                                   None, self.args.processes, cur,
+                                   'PRAGMA user_version',
+                                   dbcaughtcode='024')
+                    row = cur.fetchone()
+
+            if row[0] == 7:
+                NP.niceprint('Database version: [{!s}]'.format(row[0]))
+                # Database version 8 <=========================DB VERSION: 8===
+                # Cater for asynchronous uploads (see check_tickets)
+                NP.niceprint('Adding table pending_tickets to database',
+                             verbosity=1)
+                if tickets.create_tables(con, cur, self.args.processes):
+                    litedb.execute(con, 'PRAGMA#244:setup_db',
+                                   None, self.args.processes, cur,
+                                   'PRAGMA user_version="8"',
+                                   dbcaughtcode='244')
+                    litedb.execute(con, 'PRAGMA#245:setup_db',
+                                   None, self.args.processes, cur,
+                                   'PRAGMA user_version',
+                                   dbcaughtcode='245')
+                    row = cur.fetchone()
+
+            if row[0] == 8:
+                NP.niceprint('Database version: [{!s}]'.format(row[0]))
+                # Database version 9 <=========================DB VERSION: 9===
+                # Set of each file on files.set_name (see update_set_names)
+                NP.niceprint('Adding column set_name on files',
+                             verbosity=1)
+                if (litedb.execute(con, 'ALTER#260:setup_db',
+                                   None, self.args.processes, cur,
+                                   'ALTER TABLE files '
+                                   'ADD COLUMN set_name TEXT',
+                                   dbcaughtcode='260') and
+                        litedb.execute(con, 'CREATE#261:setup_db',
+                                       None, self.args.processes, cur,
+                                       'CREATE INDEX IF NOT EXISTS '
+                                       'files_set_name_index '
+                                       'ON files (set_name)',
+                                       dbcaughtcode='261')):
+                    litedb.execute(con, 'PRAGMA#262:setup_db',
+                                   None, self.args.processes, cur,
+                                   'PRAGMA user_version="9"',
+                                   dbcaughtcode='262')
+                    litedb.execute(con, 'PRAGMA#263:setup_db',
+                                   None, self.args.processes, cur,
+                                   'PRAGMA user_version',
+                                   dbcaughtcode='263')
+                    row = cur.fetchone()
+
+            if row[0] == 9:
+                NP.niceprint('Database version: [{!s}]'.format(row[0]))
+                # Database version 10 <=======================DB VERSION: 10===
+                # Fast digest of each file on files.fast_digest
+                # (see hashing.fast_digest)
+                NP.niceprint('Adding column fast_digest on files',
+                             verbosity=1)
+                if litedb.execute(con, 'ALTER#267:setup_db',
+                                  None, self.args.processes, cur,
+                                  'ALTER TABLE files '
+                                  'ADD COLUMN fast_digest TEXT',
+                                  dbcaughtcode='267'):
+                    litedb.execute(con, 'PRAGMA#268:setup_db',
+                                   None, self.args.processes, cur,
+                                   'PRAGMA user_version="10"',
+                                   dbcaughtcode='268')
+                    litedb.execute(con, 'PRAGMA#269:setup_db',
+                                   None, self.args.processes, cur,
+                                   'PRAGMA user_version',
+                                   dbcaughtcode='269')
+                    row = cur.fetchone()
+
+            if row[0] == 10:
+                NP.niceprint('Database version: [{!s}]'.format(row[0]))
+                # Database version 11 <=======================DB VERSION: 11===
+                # Content digest of each file on files.content_digest
+                # (see hashing.content_digest and MANAGE_METADATA_CHANGES)
+                NP.niceprint('Adding column content_digest on files',
+                             verbosity=1)
+                if litedb.execute(con, 'ALTER#272:setup_db',
+                                  None, self.args.processes, cur,
+                                  'ALTER TABLE files '
+                                  'ADD COLUMN content_digest TEXT',
+                                  dbcaughtcode='272'):
+                    litedb.execute(con, 'PRAGMA#273:setup_db',
+                                   None, self.args.processes, cur,
+                                   'PRAGMA user_version="11"',
+                                   dbcaughtcode='273')
+                    litedb.execute(con, 'PRAGMA#274:setup_db',
+                                   None, self.args.processes, cur,
+                                   'PRAGMA user_version',
+                                   dbcaughtcode='274')
+                    row = cur.fetchone()
+
+            if row[0] == 11:
+                NP.niceprint('Database version: [{!s}]'.format(row[0]))
+                # Database version 12 <=======================DB VERSION: 12===
                 # ...for future use!
+
+            # Set names as per the current FILES_DIR and FULL_SET_NAME
+            if row[0] >= 9:
+                self.update_set_names(con, cur)
             # Closing DB connection
             litedb.close(con)
         except lite.Error as err:
@@ -2229,6 +3550,57 @@ class Uploadr(object):
 
         NP.niceprint('Completed database setup')
 
+    # -------------------------------------------------------------------------
+    # update_set_names
+    #
+    # Recomputes files.set_name on changes of FILES_DIR or FULL_SET_NAME
+    #
+    def update_set_names(self, con, cur):
+        """ update_set_names
+
+            Recomputes files.set_name for all files (in a single
+            transaction) if FILES_DIR or FULL_SET_NAME changed since it was
+            last computed (set_name_config on table sync_state).
+            Returns True on success.
+        """
+
+        set_name_config = repr((NP.strunicodeout(self.xcfg.FILES_DIR),
+                                bool(self.xcfg.FULL_SET_NAME)))
+        if (remoteindex.get_state(con, cur, self.args.processes,
+                                  'set_name_config') == set_name_config):
+            return True
+
+        NP.niceprint('Updating the Set name of files on database',
+                     logalso=logging.WARNING)
+        if not litedb.execute(con, 'SELECT#257:update_set_names',
+                              None, self.args.processes,  # No need for lock
+                              cur,
+                              'SELECT rowid, path FROM files',
+                              dbcaughtcode='257'):
+            return False
+
+        set_names = [(faw.set_name_from_file(row[1],
+                                             self.xcfg.FILES_DIR,
+                                             self.xcfg.FULL_SET_NAME),
+                      row[0])
+                     for row in cur.fetchall()]
+        success = False
+        with litedb.transaction(con, 'UPDATE#258:update_set_names',
+                                None, self.args.processes,
+                                dbcaughtcode='258'):
+            success = litedb.execute_many(con, 'UPDATE#259:update_set_names',
+                                          None, self.args.processes,
+                                          cur,
+                                          'UPDATE files SET set_name = ? '
+                                          'WHERE rowid = ?',
+                                          set_names,
+                                          dbcaughtcode='259')
+
+        return success and remoteindex.set_state(con, cur,
+                                                 self.args.processes,
+                                                 'set_name_config',
+                                                 set_name_config)
+
     # -------------------------------------------------------------------------
     # clean_db_badfiles
     #
@@ -2256,23 +3628,22 @@ class Uploadr(object):
             # delete from badfiles table and reset SEQUENCE
             NP.niceprint('Deleting from badfiles table. '
                          'Reseting sequence.')
-            _success = litedb.execute(
-                con, 'DELETE#171',
-                None, self.args.processes,  # No need for lock
-                cur,
-                'DELETE FROM badfiles',
-                dbcaughtcode='171')
-            if not _success:
-                litedb.close(con)
-                sys.exit(7)
-
-            _success = litedb.execute(
-                con, 'DELETE#172',
-                None, self.args.processes,  # No need for lock
-                cur,
-                'DELETE FROM SQLITE_SEQUENCE '
-                'WHERE name="badfiles"',
-                dbcaughtcode='172')
+            # Both deletes committed in a single transaction
+            with litedb.transaction(con, 'DELETE#171',
+                                    None, self.args.processes,
+                                    dbcaughtcode='171'):
+                _success = litedb.execute(
+                    con, 'DELETE#171',
+                    None, self.args.processes,  # No need for lock
+                    cur,
+                    'DELETE FROM badfiles',
+                    dbcaughtcode='171') and litedb.execute(
+                        con, 'DELETE#172',
+                        None, self.args.processes,  # No need for lock
+                        cur,
+                        'DELETE FROM SQLITE_SEQUENCE '
+                        'WHERE name="badfiles"',
+                        dbcaughtcode='172')
             if not _success:
                 litedb.close(con)
                 sys.exit(7)
@@ -2317,13 +3688,13 @@ class Uploadr(object):
                          .format(NP.strunicodeout(row[0]),
                                  NP.strunicodeout(row[1])),
                          verbosity=1)
-            litedb.execute(con,
-                           'DELETE#181',
-                           None, self.args.processes,  # No need for lock
-                           cur,
-                           'DELETE FROM sets WHERE set_id = ?',
-                           qmarkargs=(row[0],),
-                           dbcaughtcode='181')
+        litedb.execute_many(con,
+                            'DELETE#181',
+                            None, self.args.processes,  # No need for lock
+                            cur,
+                            'DELETE FROM sets WHERE set_id = ?',
+                            [(row[0],) for row in unusedsets],
+                            dbcaughtcode='181')
 
         # Closing DB connection
         litedb.close(con)
@@ -2400,6 +3771,16 @@ class Uploadr(object):
         # ... and similar for set1 ...
 
         if get_success and get_errcode == 0:
+            litedb.execute(con,
+                           'SELECT#192',
+                           None, self.args.processes,  # No need for lock
+                           cur,
+                           'SELECT set_id FROM sets',
+                           dbcaughtcode='192')
+            db_set_ids = set(str(row[0]) for row in cur.fetchall())
+            # Sets to be added with a single commit
+            new_sets = []
+
             for aset in get_result.find('photosets').findall('photoset'):
                 logging.debug('Output for aset: %s',
                               xml.etree.ElementTree.tostring(aset,
@@ -2429,38 +3810,31 @@ class Uploadr(object):
                              else NP.strunicodeout(setname),
                              primary_photo_id)
 
-                litedb.execute(con,
-                               'SELECT#192',
-                               None, self.args.processes,  # No need for lock
-                               cur,
-                               'SELECT set_id FROM sets WHERE set_id = ?',
-                               qmarkargs=(set_id,),
-                               dbcaughtcode='192')
-                found_sets = cur.fetchone()
-                logging.info('Output for found_sets is [%s]',
-                             'None' if found_sets is None else found_sets)
-                if found_sets is None:
+                found_sets = set_id in db_set_ids
+                logging.info('Output for found_sets is [%s]', found_sets)
+                if not found_sets:
                     logging.info('Adding set:[%s] id:[%s] primary photo:[%s]',
                                  'None'
                                  if setname is None
                                  else NP.strunicodeout(setname),
                                  set_id,
                                  primary_photo_id)
-                    litedb.execute(con,
-                                   'INSERT#194',
-                                   None,  # No need for lock
-                                   self.args.processes, cur,
-                                   'INSERT INTO sets (set_id, name, '
-                                   'primary_photo_id) VALUES (?,?,?)',
-                                   qmarkargs=(set_id, setname,
-                                              primary_photo_id),
-                                   dbcaughtcode='194')
-
+                    new_sets.append((set_id, setname, primary_photo_id))
+                    db_set_ids.add(set_id)
                 else:
                     NP.niceprint('Found on DB Set:[{!s}]'
                                  .format(NP.strunicodeout(setname)),
                                  verbosity=1,
                                  logalso=logging.INFO)
+
+            litedb.execute_many(con,
+                                'INSERT#194',
+                                None,  # No need for lock
+                                self.args.processes, cur,
+                                'INSERT INTO sets (set_id, name, '
+                                'primary_photo_id) VALUES (?,?,?)',
+                                new_sets,
+                                dbcaughtcode='194')
         else:
             NP.niceerror(caught=True,
                          caughtprefix='xxx',
@@ -2728,6 +4102,454 @@ class Uploadr(object):
         return ret_is_photo_uploaded, ret_photos_uploaded, \
             ret_photo_id, ret_uploaded_no_set
 
+    # -------------------------------------------------------------------------
+    # build_checksum_index
+    #
+    #   Pages through all pics and Sets on Flickr into remoteindex tables
+    #
+    def build_checksum_index(self):
+        """ build_checksum_index
+
+            Builds the remoteindex (option --checksum-index) from:
+                photos.search (user_id me, 500 pics per page) for the
+                checksum (tag), title and tags of each pic
+                photosets.getList and photosets.getPhotos for the Sets
+                (Albums) of each pic
+            Returns True on success. On any error the index is not used.
+        """
+
+        NP.niceprint('*****Building remote checksum index*****')
+        index_start = int(time.time())
+
+        # pics = photo_id: (photo_id, checksum, title, tags)
+        pics = {}
+        min_upload_date = 0
+        while True:
+            # photos.search results beyond SEARCH_LIMIT are not reliable.
+            # Search again from the last upload date seen (pics on the
+            # previous search with such date are returned again).
+            search_pages = remoteindex.SEARCH_LIMIT // remoteindex.PER_PAGE
+            page = 1
+            pages = 1
+            last_upload_date = min_upload_date
+            while page <= min(pages, search_pages):
+                get_success, get_result, get_errcode = faw.flickrapi_fn(
+                    self.nuflickr.photos.search, (),
+                    dict(user_id='me',
+                         extras='tags,machine_tags,date_upload',
+                         sort='date-posted-asc',
+                         min_upload_date=min_upload_date,
+                         per_page=remoteindex.PER_PAGE,
+                         page=page),
+                    3, 20, False, caughtcode='224')
+                if not (get_success and get_errcode == 0):
+                    return False
+
+                photos = get_result.find('photos')
+                pages = int(photos.attrib['pages'] or 0)
+                for pic in photos.findall('photo'):
+                    pics[pic.attrib['id']] = (
+                        pic.attrib['id'],
+                        remoteindex.checksum_from_tags(pic.attrib['tags']),
+                        pic.attrib['title'],
+                        pic.attrib['tags'])
+                    last_upload_date = max(last_upload_date,
+                                           int(pic.attrib['dateupload']))
+                page += 1
+
+            NP.niceprint('Checksum index: [{!s}] pics.'.format(len(pics)),
+                         verbosity=1)
+            if pages <= search_pages:
+                break
+            if last_upload_date == min_upload_date:
+                NP.niceerror(caught=True,
+                             caughtprefix='xxx',
+                             caughtcode='225',
+                             caughtmsg='Too many pics uploaded at [{!s}]'
+                             .format(min_upload_date),
+                             useniceprint=True)
+                return False
+            min_upload_date = last_upload_date
+
+        get_success, get_result, get_errcode = faw.flickrapi_fn(
+            self.nuflickr.photosets.getList, (),
+            dict(),
+            3, 20, False, caughtcode='226')
+        if not (get_success and get_errcode == 0):
+            return False
+
+        photosets = []
+        for aset in get_result.find('photosets').findall('photoset'):
+            set_photos = self.get_photoset_photos(aset.attrib['id'],
+                                                  caughtcode='227')
+            if set_photos is None:
+                return False
+            photosets.extend((photo_id, aset.find('title').text)
+                             for photo_id in set_photos[1])
+
+        NP.niceprint('Checksum index: [{!s}] pics in [{!s}] Sets.'
+                     .format(len(pics), len(photosets)),
+                     logalso=logging.WARNING)
+
+        con, cur = litedb.connect(self.xcfg.DB_PATH)
+        success = (remoteindex.save(con, cur, self.args.processes,
+                                    list(pics.values()), photosets) and
+                   remoteindex.set_state(con, cur, self.args.processes,
+                                         'checksum_index', index_start))
+        litedb.close(con)
+
+        return success
+
+    # -------------------------------------------------------------------------
+    # index_upload
+    #
+    def index_upload(self, lock, con, cur, photo_id, file, file_checksum):
+        """ index_upload
+
+            Records a pic just uploaded on the remoteindex (with the title
+            and tags it was uploaded with). Only with option --checksum-index.
+        """
+
+        if not self.args.checksum_index:
+            return
+
+        title = (os.path.splitext(os.path.basename(file))[0]
+                 if self.xcfg.FLICKR["title"] == ""
+                 else str(self.xcfg.FLICKR["title"]))
+        setname = faw.set_name_from_file(file,
+                                         self.xcfg.FILES_DIR,
+                                         self.xcfg.FULL_SET_NAME)
+        self.db_write(con, 'INSERT#280:index_upload', lock,
+                      cur,
+                      remoteindex.STORE,
+                      qmarkargs=remoteindex.store_args(photo_id,
+                                                       file_checksum,
+                                                       title,
+                                                       setname),
+                      dbcaughtcode='280')
+
+    # -------------------------------------------------------------------------
+    # index_set_add
+    #
+    def index_set_add(self, lock, con, cur, photo_id, file):
+        """ index_set_add
+
+            Records on the remoteindex the pic photo_id as a member of the
+            Set of file. Only with option --checksum-index.
+        """
+
+        if not self.args.checksum_index:
+            return
+
+        setname = faw.set_name_from_file(file,
+                                         self.xcfg.FILES_DIR,
+                                         self.xcfg.FULL_SET_NAME)
+        self.db_write(con, 'INSERT#282:index_set_add', lock,
+                      cur,
+                      remoteindex.STORE_SET,
+                      qmarkargs=(str(photo_id), setname),
+                      dbcaughtcode='282')
+
+    # -------------------------------------------------------------------------
+    # is_checksum_index_synced
+    #
+    def is_checksum_index_synced(self):
+        """ is_checksum_index_synced
+
+            True if the remoteindex was built and is kept up to date by
+            sync_remote (option --delta-sync). No need to build it again.
+        """
+
+        if not self.args.delta_sync:
+            return False
+
+        con, cur = litedb.connect(self.xcfg.DB_PATH)
+        index_start = remoteindex.get_state(con, cur, self.args.processes,
+                                            'checksum_index')
+        last_sync = remoteindex.get_state(con, cur, self.args.processes,
+                                          'remote_sync')
+        litedb.close(con)
+
+        return (index_start is not None and
+                last_sync is not None and
+                last_sync >= index_start)
+
+    # -------------------------------------------------------------------------
+    # sync_remote
+    #
+    #   Pulls changes made on Flickr since the last sync (--delta-sync)
+    #
+    def sync_remote(self):
+        """ sync_remote
+
+            Updates local DB with the changes on Flickr since the previous
+            sync (high-water mark remote_sync on table sync_state):
+                Sets (photosets.getList): new, renamed and deleted Sets.
+                Sets updated since (date_update): pics added to or removed
+                from them (photosets.getPhotos). Pics removed from their Set
+                get set_id null (to be added again by create_sets).
+                Pics updated since (photos.recentlyUpdated): title and tags
+                on the remoteindex, if one was built (--checksum-index).
+            Pics deleted on Flickr are not reported by these calls.
+            First run only records the high-water mark.
+            Returns True on success.
+        """
+
+        NP.niceprint('*****Syncing changes from Flickr*****')
+        if self.args.dry_run:
+            return True
+
+        sync_start = int(time.time())
+        con, cur = litedb.connect(self.xcfg.DB_PATH)
+        last_sync = remoteindex.get_state(con, cur, self.args.processes,
+                                          'remote_sync')
+        index_start = remoteindex.get_state(con, cur, self.args.processes,
+                                            'checksum_index')
+
+        success = True
+        if last_sync is not None:
+            # Tolerate clock differences with Flickr
+            min_date = int(last_sync) - remoteindex.SYNC_MARGIN
+            statements = self.sync_remote_sets(con, cur, min_date,
+                                               index_start is not None)
+            if statements is not None and index_start is not None:
+                pics_statements = self.sync_remote_pics(min_date)
+                if pics_statements is None:
+                    statements = None
+                else:
+                    statements.extend(pics_statements)
+
+            success = statements is not None
+            if success:
+                with litedb.transaction(con, 'SYNC#228:sync_remote',
+                                        None, self.args.processes,
+                                        dbcaughtcode='228'):
+                    for qry_name, statement, qmarkargs_list in statements:
+                        if not litedb.execute_many(con, qry_name,
+                                                   None, self.args.processes,
+                                                   cur,
+                                                   statement,
+                                                   qmarkargs_list,
+                                                   dbcaughtcode='229'):
+                            success = False
+                            break
+
+        if success:
+            remoteindex.set_state(con, cur, self.args.processes,
+                                  'remote_sync', sync_start)
+        else:
+            NP.niceprint('Failed to sync changes from Flickr. Retrying '
+                         'on the next run.',
+                         logalso=logging.WARNING)
+        litedb.close(con)
+
+        return success
+
+    # -------------------------------------------------------------------------
+    # sync_remote_sets
+    #
+    def sync_remote_sets(self, con, cur, min_date, with_index):
+        """ sync_remote_sets
+
+            Returns the list of (qry_name, statement, qmarkargs_list) to
+            apply to the local DB the changes on Sets since min_date.
+            with_index = update also remote_photosets.
+            Returns None on error.
+        """
+
+        get_success, get_result, get_errcode = faw.flickrapi_fn(
+            self.nuflickr.photosets.getList, (),
+            dict(),
+            3, 20, False, caughtcode='230')
+        if not (get_success and get_errcode == 0):
+            return None
+
+        litedb.execute(con, 'SELECT#231:sync_remote_sets',
+                       None, self.args.processes,  # No need for lock
+                       cur,
+                       'SELECT set_id, name FROM sets',
+                       dbcaughtcode='231')
+        db_sets = dict((str(row[0]), row[1]) for row in cur.fetchall())
+
+        new_sets = []
+        renamed_sets = []
+        remote_set_ids = set()
+        # Files added to (if set_id null) or removed from updated Sets
+        add_members = []
+        remove_members = []
+        photosets = []
+        photosets_titles = []
+        for aset in get_result.find('photosets').findall('photoset'):
+            set_id = aset.attrib['id']
+            setname = aset.find('title').text
+            remote_set_ids.add(set_id)
+            if set_id not in db_sets:
+                new_sets.append((set_id, setname, aset.attrib['primary']))
+            elif (NP.strunicodeout(db_sets[set_id]) !=
+                  NP.strunicodeout(setname)):
+                renamed_sets.append((setname, set_id))
+
+            if int(aset.attrib.get('date_update', 0) or 0) < min_date:
+                continue
+
+            set_photos = self.get_photoset_photos(set_id, caughtcode='232')
+            if set_photos is None:
+                return None
+            members = set(set_photos[1])
+
+            NP.niceprint('Set updated on Flickr:[{!s}] pics:[{!s}]'
+                         .format(NP.strunicodeout(setname), len(members)),
+                         verbosity=1,
+                         logalso=logging.INFO)
+            litedb.execute(con, 'SELECT#233:sync_remote_sets',
+                           None, self.args.processes,  # No need for lock
+                           cur,
+                           'SELECT files_id FROM files WHERE set_id = ?',
+                           qmarkargs=(set_id, ),
+                           dbcaughtcode='233')
+            remove_members.extend((str(row[0]), )
+                                  for row in cur.fetchall()
+                                  if str(row[0]) not in members)
+            add_members.extend((set_id, photo_id) for photo_id in members)
+            photosets_titles.append((setname, ))
+            if set_id in db_sets and db_sets[set_id] != setname:
+                photosets_titles.append((db_sets[set_id], ))
+            photosets.extend((photo_id, setname) for photo_id in members)
+
+        gone_sets = [(set_id, ) for set_id in db_sets
+                     if set_id not in remote_set_ids]
+        NP.niceprint('Sets on Flickr: [{!s}] new, [{!s}] renamed, '
+                     '[{!s}] deleted, [{!s}] updated.'
+                     .format(len(new_sets), len(renamed_sets),
+                             len(gone_sets), len(photosets_titles)),
+                     logalso=logging.WARNING)
+
+        statements = [
+            ('INSERT#234:sync_remote_sets',
+             'INSERT INTO sets (set_id, name, primary_photo_id) '
+             'VALUES (?, ?, ?)', new_sets),
+            ('UPDATE#235:sync_remote_sets',
+             'UPDATE sets SET name = ? WHERE set_id = ?', renamed_sets),
+            ('DELETE#236:sync_remote_sets',
+             'DELETE FROM sets WHERE set_id = ?', gone_sets),
+            ('UPDATE#237:sync_remote_sets',
+             'UPDATE files SET set_id = null WHERE set_id = ?', gone_sets),
+            ('UPDATE#238:sync_remote_sets',
+             'UPDATE files SET set_id = null WHERE files_id = ?',
+             remove_members),
+            ('UPDATE#239:sync_remote_sets',
+             'UPDATE files SET set_id = ? '
+             'WHERE files_id = ? AND set_id IS NULL', add_members)]
+        if with_index:
+            statements.extend([
+                ('DELETE#240:sync_remote_sets',
+                 'DELETE FROM remote_photosets WHERE set_title = ?',
+                 photosets_titles),
+                ('INSERT#241:sync_remote_sets',
+                 'INSERT INTO remote_photosets (photo_id, set_title) '
+                 'VALUES (?, ?)', photosets)])
+
+        return statements
+
+    # -------------------------------------------------------------------------
+    # sync_remote_pics
+    #
+    def sync_remote_pics(self, min_date):
+        """ sync_remote_pics
+
+            Returns the list of (qry_name, statement, qmarkargs_list) to
+            update the remoteindex with the pics updated since min_date
+            (photos.recentlyUpdated). Returns None on error.
+        """
+
+        pics = []
+        page = 1
+        pages = 1
+        while page <= pages:
+            get_success, get_result, get_errcode = faw.flickrapi_fn(
+                self.nuflickr.photos.recentlyUpdated, (),
+                dict(min_date=min_date,
+                     extras='tags,machine_tags',
+                     per_page=remoteindex.PER_PAGE,
+                     page=page),
+                3, 20, False, caughtcode='242')
+            if not (get_success and get_errcode == 0):
+                return None
+
+            photos = get_result.find('photos')
+            pages = int(photos.attrib['pages'] or 0)
+            pics.extend((pic.attrib['id'],
+                         remoteindex.checksum_from_tags(pic.attrib['tags']),
+                         pic.attrib['title'],
+                         pic.attrib['tags'])
+                        for pic in photos.findall('photo'))
+            page += 1
+
+        NP.niceprint('Pics updated on Flickr: [{!s}]'.format(len(pics)),
+                     logalso=logging.WARNING)
+
+        return [('INSERT#243:sync_remote_pics',
+                 'INSERT OR REPLACE INTO remote_checksums '
+                 '(photo_id, checksum, title, tags) VALUES (?, ?, ?, ?)',
+                 pics)]
+
+    # -------------------------------------------------------------------------
+    # is_in_checksum_index
+    #
+    #   is_already_uploaded using the remoteindex
+    #
+    def is_in_checksum_index(self, xfile, xchecksum, xsetname, con, cur):
+        """ is_in_checksum_index
+
+            Same as is_already_uploaded (same results) but using the index
+            of the pics on Flickr built by build_checksum_index instead of
+            calling Flickr.
+        """
+
+        ret_is_photo_uploaded = False
+        ret_photo_id = None
+        ret_uploaded_no_set = False
+
+        pics = remoteindex.lookup(con, cur, self.args.processes, xchecksum)
+        ret_photos_uploaded = len(pics)
+        logging.info('Is In Checksum Index:[checksum:%s] album:[%s]? '
+                     'Found:[%s]',
+                     xchecksum, NP.strunicodeout(xsetname), len(pics))
+
+        # Get title from filepath as filename without extension
+        xtitle_filename = os.path.splitext(os.path.split(xfile)[1])[0]
+        for photo_id, title, tags, set_titles in pics:
+            # if pic with checksum has a different title, continue
+            if (NP.strunicodeout(xtitle_filename) !=
+                    NP.strunicodeout(title)):
+                continue
+
+            # B) and B1) No Sets: check for tag album
+            if not set_titles:
+                if (remoteindex.clean_tag(
+                        NP.strunicodeout('album:"{}"'.format(xsetname)))
+                        in NP.strunicodeout(tags).split()):
+                    ret_is_photo_uploaded = True
+                    ret_photo_id = photo_id
+                    ret_uploaded_no_set = True
+                    return ret_is_photo_uploaded, ret_photos_uploaded, \
+                        ret_photo_id, ret_uploaded_no_set
+                ret_is_photo_uploaded = False
+                ret_uploaded_no_set = True
+
+            # C) On Set xsetname. D) On other Sets: continue
+            for set_title in set_titles:
+                if (NP.strunicodeout(xsetname) ==
+                        NP.strunicodeout(set_title)):
+                    ret_is_photo_uploaded = True
+                    ret_photo_id = photo_id
+                    ret_uploaded_no_set = False
+                    return ret_is_photo_uploaded, ret_photos_uploaded, \
+                        ret_photo_id, ret_uploaded_no_set
+
+        return ret_is_photo_uploaded, ret_photos_uploaded, \
+            ret_photo_id, ret_uploaded_no_set
+
     # -------------------------------------------------------------------------
     # photos_find_tag
     #
@@ -2838,7 +4660,7 @@ class Uploadr(object):
         # CODING pylint
         # pylint: disable=unused-argument
         for i, afile in enumerate(filelist):
-            logging.warning('===Element of Chunk:[%s] file:[%s]', i, afile)
+            logging.warning('===Element of Batch:[%s] file:[%s]', i, afile)
 
             # CODING: ALBUM_TAGS_01: Refactor with code at ALBUM_TAGS_02
             # afile[0] = files_id
@@ -2957,7 +4779,10 @@ class Uploadr(object):
                            mmutex,
                            existing_media,
                            self.madd_albums_tag,
-                           cur)
+                           cur,
+                           batch_size=5,
+                           pool=self.get_pool())
+            self.flush_dbwriter()
 
         # running in single processing mode
         else:
@@ -118,6 +118,8 @@ class Konstants:
         #   no_delete_tag = Tag to mark files which were not delete.
         #                   Check parameter --no-delete-from-flickr
         #   upload_sleep  = Seconds to sleep prior to reattempt a failed upload
+        #                   (on the first attempt. Grows as per
+        #                   rate_limited.backoff_delay on the next ones)
         #
         self.base_dir = str('.')
         self.ini_file = str('uploadr.ini')
@@ -91,6 +91,12 @@ class MyConfig(object):
         'SLEEP_TIME',
         'DRIP_TIME',
         'DB_PATH',
+        'DB_JOURNAL_MODE',
+        'DB_SYNCHRONOUS',
+        'DB_CACHE_SIZE',
+        'DB_MMAP_SIZE',
+        'DB_CACHED_STATEMENTS',
+        'DB_REUSE_CONNECTION',
         'LOCK_PATH',
         'TOKEN_CACHE',
         'EXCLUDED_FOLDERS',
@@ -101,9 +107,18 @@ class MyConfig(object):
         'RAW_TOOL_PATH',
         'FILE_MAX_SIZE',
         'MANAGE_CHANGES',
+        'MANAGE_METADATA_CHANGES',
         'FULL_SET_NAME',
         'MAX_SQL_ATTEMPTS',
         'MAX_UPLOAD_ATTEMPTS',
+        'API_RATE_PER_SECOND',
+        'API_RATE_BURST',
+        'API_HOURLY_QUOTA',
+        'API_WEIGHTS',
+        'RETRY_BACKOFF_FACTOR',
+        'RETRY_MAX_WAIT',
+        'BREAKER_FAILURES',
+        'BREAKER_PAUSE',
         'LOGGING_LEVEL',
         'ROTATING_LOGGING',
         'ROTATING_LOGGING_PATH',
@@ -134,6 +149,18 @@ class MyConfig(object):
         #  DB_PATH
         "os.path.join(os.getcwd(), 'flickrdb')",
         # "os.path.join(os.path.dirname(sys.argv[0]), 'flickrdb')",
+        # DB_JOURNAL_MODE
+        "'WAL'",
+        # DB_SYNCHRONOUS
+        "'NORMAL'",
+        # DB_CACHE_SIZE
+        "-16000",  # 16000 KBytes
+        # DB_MMAP_SIZE
+        "0",
+        # DB_CACHED_STATEMENTS
+        "100",
+        # DB_REUSE_CONNECTION
+        "True",
         # LOCK_PATH
         "os.path.join(os.getcwd(), '.flickrlock')",
         # "os.path.join(os.path.dirname(sys.argv[0]), '.flickrlock')",
@@ -163,12 +190,32 @@ class MyConfig(object):
         "50000000",
         # MANAGE_CHANGES
         "True",
+        # MANAGE_METADATA_CHANGES
+        "False",
         # FULL_SET_NAME
         "False",
         #  MAX_SQL_ATTEMPTS
         "3",
         # MAX_UPLOAD_ATTEMPTS
         "10",
+        # API_RATE_PER_SECOND
+        "5",
+        # API_RATE_BURST
+        "10",
+        # API_HOURLY_QUOTA
+        "3600",
+        # API_WEIGHTS
+        "{ 'upload'  : 1,\
+           'replace' : 1\
+        }",
+        # RETRY_BACKOFF_FACTOR
+        "2",
+        # RETRY_MAX_WAIT
+        "300",
+        # BREAKER_FAILURES
+        "5",
+        # BREAKER_PAUSE
+        "60",
         # LOGGING_LEVEL (30 = logging.ERROR). Note: Affects doctests results
         "40",
         # ROTATING_LOGGING
@@ -275,6 +322,12 @@ class MyConfig(object):
             'int',   # 'SLEEP_TIME',
             'int',   # 'DRIP_TIME',
             'str',   # 'DB_PATH',
+            'str',   # 'DB_JOURNAL_MODE',
+            'str',   # 'DB_SYNCHRONOUS',
+            'int',   # 'DB_CACHE_SIZE',
+            'int',   # 'DB_MMAP_SIZE',
+            'int',   # 'DB_CACHED_STATEMENTS',
+            'bool',  # 'DB_REUSE_CONNECTION',
             'str',   # 'LOCK_PATH',
             'str',   # 'TOKEN_CACHE',
             'list',  # 'EXCLUDED_FOLDERS',
@@ -285,9 +338,18 @@ class MyConfig(object):
             'str',   # 'RAW_TOOL_PATH',
             'int',   # 'FILE_MAX_SIZE',
             'bool',  # 'MANAGE_CHANGES',
+            'bool',  # 'MANAGE_METADATA_CHANGES',
             'bool',  # 'FULL_SET_NAME',
             'int',   # 'MAX_SQL_ATTEMPTS',
             'int',   # 'MAX_UPLOAD_ATTEMPTS',
+            'int',   # 'API_RATE_PER_SECOND',
+            'int',   # 'API_RATE_BURST',
+            'int',   # 'API_HOURLY_QUOTA',
+            'dict',  # 'API_WEIGHTS',
+            'int',   # 'RETRY_BACKOFF_FACTOR',
+            'int',   # 'RETRY_MAX_WAIT',
+            'int',   # 'BREAKER_FAILURES',
+            'int',   # 'BREAKER_PAUSE',
             'int',   # 'LOGGING_LEVEL',
             'bool',  # ROTATING_LOGGING
             'str',   # ROTATING_LOGGING_PATH,
@@ -448,6 +510,50 @@ class MyConfig(object):
                     result = False
             return result
 
+        def verify_db_settings():
+            """ verify_db_settings
+
+                Checks DB_JOURNAL_MODE and DB_SYNCHRONOUS are valid values.
+            """
+
+            result = True
+            for item, values in [('DB_JOURNAL_MODE',
+                                  ['DELETE', 'TRUNCATE', 'PERSIST',
+                                   'MEMORY', 'WAL', 'OFF']),
+                                 ('DB_SYNCHRONOUS',
+                                  ['OFF', 'NORMAL', 'FULL', 'EXTRA'])]:
+                logging.debug('verifyconfig for [%s]', item)
+                self.__dict__[item] = str(self.__dict__[item]).upper()
+                if self.__dict__[item] not in values:
+                    logging.critical('%s:[%s] is not one of %s.',
+                                     item, self.__dict__[item], values)
+                    result = False
+            return result
+
+        def verify_api_rate():
+            """ verify_api_rate
+
+                Checks API_RATE_PER_SECOND, API_RATE_BURST, API_HOURLY_QUOTA,
+                API_WEIGHTS, RETRY_* and BREAKER_* are not negative.
+            """
+
+            result = True
+            for item in ['API_RATE_PER_SECOND', 'API_RATE_BURST',
+                         'API_HOURLY_QUOTA', 'RETRY_BACKOFF_FACTOR',
+                         'RETRY_MAX_WAIT', 'BREAKER_FAILURES',
+                         'BREAKER_PAUSE']:
+                logging.debug('verifyconfig for [%s]', item)
+                if self.__dict__[item] < 0:
+                    logging.critical('%s:[%s] must not be negative.',
+                                     item, self.__dict__[item])
+                    result = False
+            for method, weight in self.__dict__['API_WEIGHTS'].items():
+                if not isinstance(weight, int) or weight < 0:
+                    logging.critical('API_WEIGHTS:[%s]:[%s] must be an int '
+                                     'not negative.', method, weight)
+                    result = False
+            return result
+
         def verify_rotating_path():
             """ verify_rotating_path
 
@@ -579,6 +685,10 @@ class MyConfig(object):
             returnverify = False
         elif not verify_paths():
             returnverify = False
+        elif not verify_db_settings():
+            returnverify = False
+        elif not verify_api_rate():
+            returnverify = False
         elif not verify_rotating_path():
             returnverify = False
         elif not verify_raw_files():
@@ -18,7 +18,20 @@ from __future__ import division    # This way: 3 / 2 == 1.5; 3 // 2 == 1
 # -----------------------------------------------------------------------------
 # Import section
 #
+import contextlib
 import logging
+import os
+import threading
+import time
+import multiprocessing
+try:
+    from multiprocessing import SimpleQueue          # Python 3
+except ImportError:
+    from multiprocessing.queues import SimpleQueue   # Python 2
+try:
+    from multiprocessing.connection import wait as mp_wait   # Python 3
+except ImportError:
+    mp_wait = None                                           # Python 2
 import sqlite3 as lite
 # -----------------------------------------------------------------------------
 # Helper class and functions to print messages.
@@ -36,19 +49,104 @@ NPR = NicePrint.NicePrint()
 # -----------------------------------------------------------------------------
 
 
+# -----------------------------------------------------------------------------
+# Connection settings (see configure) and cache of connections per
+# process/thread (see connect).
+#
+DB_SETTINGS = {'journal_mode': None,
+               'synchronous': None,
+               'cache_size': None,
+               'mmap_size': None,
+               'cached_statements': 100,
+               'reuse': False}
+DB_CONNECTIONS = {}
+# id() of the connections within a transaction (see transaction)
+DB_TRANSACTIONS = set()
+
+
+def configure(journal_mode=None, synchronous=None, cache_size=None,
+              mmap_size=None, cached_statements=100, reuse=False):
+    """ configure
+
+        Settings for the subsequent connections from connect.
+        Settings at None are not set (SQLite default applies).
+
+        journal_mode      = PRAGMA journal_mode (e.g. WAL)
+        synchronous       = PRAGMA synchronous (e.g. NORMAL)
+        cache_size        = PRAGMA cache_size
+        mmap_size         = PRAGMA mmap_size
+        cached_statements = number of prepared statements kept per connection
+        reuse             = True: keep one connection per process/thread and
+                            DB file to be returned by connect. close then
+                            commits but keeps it open.
+    """
+    DB_SETTINGS.update(journal_mode=journal_mode,
+                       synchronous=synchronous,
+                       cache_size=cache_size,
+                       mmap_size=mmap_size,
+                       cached_statements=cached_statements,
+                       reuse=reuse)
+    logging.info('DB settings:[%s]', DB_SETTINGS)
+
+
 def connect(sqlite_file):
     """ connect
 
         Make connection to an SQLite database file
         Configures connection.text_factory = str
         Returns the connection and a cursor to be used in subsequent queries
+
+        With configure(reuse=True) returns the connection already opened by
+        the current process/thread (with a new cursor).
+
+        >>> import lib.SQLiteDBHelper as litedb
+        >>> litedb.configure(journal_mode='MEMORY', reuse=True)
+        >>> con1, cur1 = litedb.connect("file::memory:?cache=shared")
+        >>> con2, cur2 = litedb.connect("file::memory:?cache=shared")
+        >>> con1 is con2
+        True
+        >>> litedb.execute(con1, 'PRAGMA', None, 0, cur1,
+        ...                'PRAGMA journal_mode')
+        True
+        >>> cur1.fetchone()[0]
+        'memory'
+        >>> litedb.close(con1)
+        >>> litedb.close_all()
+        >>> litedb.configure()
     """
 
+    key = (os.getpid(), threading.current_thread().ident, sqlite_file)
+    if DB_SETTINGS['reuse'] and key in DB_CONNECTIONS:
+        conn = DB_CONNECTIONS[key]
+        try:
+            acursor = conn.cursor()
+            logging.debug('Reuse DB [%s]', sqlite_file)
+            return conn, acursor
+        except lite.ProgrammingError:
+            # Connection was closed directly
+            del DB_CONNECTIONS[key]
+
     logging.debug('Open DB [%s]', sqlite_file)
-    conn = lite.connect(sqlite_file)
+    conn = lite.connect(sqlite_file,
+                        cached_statements=DB_SETTINGS['cached_statements'])
     conn.text_factory = str
 
     acursor = conn.cursor()
+    for pragma in ['journal_mode', 'synchronous', 'cache_size', 'mmap_size']:
+        if DB_SETTINGS[pragma] is not None:
+            try:
+                acursor.execute('PRAGMA {}={}'
+                                .format(pragma, DB_SETTINGS[pragma]))
+            except lite.Error as err:
+                NPR.niceerror(caught=True,
+                              caughtprefix='+++ DB',
+                              caughtcode='009',
+                              caughtmsg='DB error on [{!s}]: [{!s}]'
+                              .format(pragma, err.args[0]),
+                              useniceprint=True)
+
+    if DB_SETTINGS['reuse']:
+        DB_CONNECTIONS[key] = conn
     logging.debug('Opened DB [%s]', sqlite_file)
 
     return conn, acursor
@@ -101,7 +199,6 @@ def execute(aconn, qry_name, adb_lock, nprocs,
 
     """
 
-    _success = True
     logging.debug('--> DBHelper.execute [%s] '
                   'statement:[%s] qmarkargs:[%s] type(qmarkargs):[%s]',
                   qry_name,
@@ -110,10 +207,73 @@ def execute(aconn, qry_name, adb_lock, nprocs,
         'DBHelper.execute [{!s}] {!s} is not a tuple!!'
         .format(qry_name, 'qmarkargs'))
 
+    _success = run_statement(aconn, qry_name, adb_lock, nprocs,
+                             cursor.execute, statement, qmarkargs,
+                             dbcaughtcode)
+
+    logging.info('<-- DBHelper.execute [%s] _success:[%s]', qry_name, _success)
+
+    return _success
+
+
+def execute_many(aconn, qry_name, adb_lock, nprocs,
+                 cursor, statement, qmarkargs_list,
+                 dbcaughtcode='000'):
+    """
+        Same as execute for a statement run with each of the tuples of
+        qmarkargs_list (cursor.executemany). Commits once.
+
+        >>> import lib.SQLiteDBHelper as litedb
+        >>> con, cur = litedb.connect(":memory:")
+        >>> litedb.execute(con, 'CREATE', None, 0, cur,
+        ...                'CREATE TABLE sets (set_id INT, name TEXT)')
+        True
+        >>> litedb.execute_many(con, 'INSERT', None, 0, cur,
+        ...                     'INSERT INTO sets VALUES (?, ?)',
+        ...                     [(i, 'set{}'.format(i)) for i in range(3)])
+        True
+        >>> litedb.total_rows(con, 'sets', None, 0, cur)
+        3
+        >>> litedb.close(con)
+    """
+
+    logging.debug('--> DBHelper.execute_many [%s] statement:[%s]',
+                  qry_name, statement)
+    qmarkargs_list = list(qmarkargs_list)
+    assert all(isinstance(qmarkargs, tuple)
+               for qmarkargs in qmarkargs_list), NPR.niceassert(
+                   'DBHelper.execute_many [{!s}] {!s} has no tuples!!'
+                   .format(qry_name, 'qmarkargs_list'))
+
+    _success = run_statement(aconn, qry_name, adb_lock, nprocs,
+                             cursor.executemany, statement, qmarkargs_list,
+                             dbcaughtcode)
+
+    logging.info('<-- DBHelper.execute_many [%s] rows:[%s] _success:[%s]',
+                 qry_name, len(qmarkargs_list), _success)
+
+    return _success
+
+
+def run_statement(aconn, qry_name, adb_lock, nprocs,
+                  cursor_fn, statement, qmarkargs, dbcaughtcode):
+    """ run_statement
+
+        Runs cursor_fn(statement, qmarkargs) for execute and execute_many.
+        Outside a transaction: takes the DB lock and commits (except on
+        SELECT statements). Within a transaction: does neither (it is done
+        once by transaction).
+
+        Returns False on sqlite3 exception
+    """
+
+    _success = True
+    in_transaction = id(aconn) in DB_TRANSACTIONS
     try:
         # Acquire DB lock if running in multiprocessing mode
-        mp.use_lock(adb_lock, True, nprocs)
-        cursor.execute(statement, qmarkargs)
+        if not in_transaction:
+            mp.use_lock(adb_lock, True, nprocs)
+        cursor_fn(statement, qmarkargs)
     except lite.Error as err:
         _success = False
         NPR.niceerror(caught=True,
@@ -123,24 +283,95 @@ def execute(aconn, qry_name, adb_lock, nprocs,
                       .format(qry_name, err.args[0]),
                       useniceprint=True)
     finally:
-        # Commit for UPDATE tasks
+        if not in_transaction:
+            # Commit for UPDATE tasks
+            if not statement.lstrip().upper().startswith('SELECT'):
+                aconn.commit()
+            # Release DB lock if running in multiprocessing mode
+            mp.use_lock(adb_lock, False, nprocs)
+
+    return _success
+
+
+@contextlib.contextmanager
+def transaction(aconn, qry_name, adb_lock, nprocs, dbcaughtcode='000'):
+    """ transaction
+
+        Context to run several execute/execute_many on aconn within a
+        single transaction: takes the DB lock once and commits once at the
+        end. Rolls back on exception.
+
+        qry_name  = Transaction Name (for logging)
+        adb_lock  = lock to be used
+        nprocs    = >0 when in multiprocessing mode
+
+        >>> import lib.SQLiteDBHelper as litedb
+        >>> con, cur = litedb.connect(":memory:")
+        >>> with litedb.transaction(con, 'TRANSACTION', None, 0):
+        ...     for i in range(3):
+        ...         litedb.execute(con, 'CREATE', None, 0, cur,
+        ...                        'CREATE TABLE t{} (a INT)'.format(i))
+        True
+        True
+        True
+        >>> litedb.total_rows(con, 'sqlite_master', None, 0, cur)
+        3
+        >>> litedb.close(con)
+    """
+
+    if id(aconn) in DB_TRANSACTIONS:
+        # Already within a transaction. Commit will happen on the outer one.
+        yield aconn
+        return
+
+    logging.debug('--> DBHelper.transaction [%s]', qry_name)
+    mp.use_lock(adb_lock, True, nprocs)
+    DB_TRANSACTIONS.add(id(aconn))
+    try:
+        yield aconn
         aconn.commit()
+    except lite.Error as err:
+        aconn.rollback()
+        NPR.niceerror(caught=True,
+                      caughtprefix='+++ DB',
+                      caughtcode=dbcaughtcode,
+                      caughtmsg='DB error on [{!s}]: [{!s}]'
+                      .format(qry_name, err.args[0]),
+                      useniceprint=True)
+    except BaseException:
+        aconn.rollback()
+        raise
+    finally:
+        DB_TRANSACTIONS.discard(id(aconn))
         # Release DB lock if running in multiprocessing mode
         mp.use_lock(adb_lock, False, nprocs)
 
-    logging.info('<-- DBHelper.execute [%s] _success:[%s]', qry_name, _success)
-
-    return _success
+    logging.info('<-- DBHelper.transaction [%s]', qry_name)
 
 
 def close(conn):
     """ close
 
     Commit changes and close connection to the database
+    A connection kept for reuse (see configure) is committed but not closed.
+    Within a transaction (see transaction) it is committed at its end.
     """
     # conn.commit()
     if conn is not None:
-        conn.close()
+        if conn in DB_CONNECTIONS.values():
+            if id(conn) not in DB_TRANSACTIONS:
+                conn.commit()
+        else:
+            conn.close()
+
+
+def close_all():
+    """ close_all
+
+    Closes the connections kept for reuse by the current process.
+    """
+    for key in [key for key in DB_CONNECTIONS if key[0] == os.getpid()]:
+        DB_CONNECTIONS.pop(key).close()
 
 
 def total_rows(aconn, table_name, lock, nprocs, acursor, dbcaughtcode='000'):
@@ -192,6 +423,324 @@ def enable_callback_tracebacks(flag):
     return _success
 
 
+# -----------------------------------------------------------------------------
+# dbwriter_serve
+#
+# Main loop of the DBWriter process.
+#
+def dbwriter_serve(sqlite_file, wqueue, flushed, flushed_seq, failed,
+                   batch_max, max_attempts):
+    """ dbwriter_serve
+
+        sqlite_file  = DB file
+        wqueue       = queue of statements to execute
+        flushed      = Condition notified once a FLUSH request is committed
+        flushed_seq  = Value with the sequence of the last FLUSH committed
+        failed       = Value counting the statements which failed
+        batch_max    = Maximum number of statements per transaction
+        max_attempts = Attempts for a statement (or commit) which finds the
+                       DB locked
+
+        Runs all statements available on wqueue (up to batch_max) within a
+        single transaction. Stops on a None message.
+        The connection uses the settings from configure (journal_mode...).
+    """
+    conn, cursor = connect(sqlite_file)
+
+    serving = True
+    while serving:
+        msgs = [wqueue.get()]
+        while len(msgs) < batch_max and not wqueue.empty():
+            msgs.append(wqueue.get())
+
+        flush = None
+        executed = 0
+        nfailed = 0
+        for msg in msgs:
+            if msg is None:
+                serving = False
+            elif msg[0] == DBWriter.FLUSH:
+                flush = msg[1]
+            else:
+                qry_name, statement, qmarkargs, dbcaughtcode = msg
+                if dbwriter_attempt(qry_name, dbcaughtcode, max_attempts,
+                                    cursor.execute, statement, qmarkargs):
+                    executed += 1
+                else:
+                    nfailed += 1
+
+        if not dbwriter_attempt('DBWriter commit', '008', max_attempts,
+                                conn.commit):
+            # Statements executed within the transaction are lost
+            nfailed += executed
+            try:
+                conn.rollback()
+            except lite.Error:
+                pass
+        logging.info('<-- DBWriter committed [%s] messages. Failed:[%s]',
+                     len(msgs), nfailed)
+
+        if flush is not None or nfailed:
+            with flushed:
+                failed.value += nfailed
+                if flush is not None:
+                    flushed_seq.value = flush
+                flushed.notify_all()
+
+    close(conn)
+    close_all()
+
+
+# -----------------------------------------------------------------------------
+# dbwriter_attempt
+#
+# Runs a statement of the DBWriter retrying while the DB is locked.
+#
+def dbwriter_attempt(qry_name, dbcaughtcode, max_attempts, afn, *args):
+    """ dbwriter_attempt
+
+        Runs afn(*args) up to max_attempts times while it fails with the DB
+        locked/busy (sleeping DBWriter.BUSY_SECS in-between).
+        Returns False on sqlite3 exception.
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            afn(*args)
+            return True
+        except lite.Error as err:
+            busy = isinstance(err, lite.OperationalError) and any(
+                word in str(err) for word in ('locked', 'busy'))
+            if busy and attempt < max_attempts:
+                logging.warning('DBWriter: [%s] retry [%s/%s] on [%s]',
+                                qry_name, attempt, max_attempts, err)
+                time.sleep(DBWriter.BUSY_SECS)
+                continue
+            NPR.niceerror(caught=True,
+                          caughtprefix='+++ DB',
+                          caughtcode=dbcaughtcode,
+                          caughtmsg='DB error on [{!s}]: [{!s}]'
+                          .format(qry_name, err.args[0]),
+                          useniceprint=True)
+            return False
+
+    return False
+
+
+# -----------------------------------------------------------------------------
+# class DBWriter
+#
+# Single process owning the only write connection to the DB
+#
+class DBWriter(object):
+    """ DBWriter
+
+        Process which owns the write connection to the DB (with
+        journal_mode WAL, see configure, others can keep reading with their
+        own connections while it writes). Write
+        statements sent via submit from any process are executed in batches
+        within a single transaction, instead of each process taking a lock
+        and committing each statement. Start it before forking the
+        processes which will submit statements (or flush).
+        Statements finding the DB locked are retried (max_attempts).
+        Those which still fail are counted and reported by flush.
+
+        >>> import os, tempfile
+        >>> import lib.SQLiteDBHelper as litedb
+        >>> dbfile = os.path.join(tempfile.mkdtemp(), 'writer.db')
+        >>> con, cur = litedb.connect(dbfile)
+        >>> litedb.execute(con, 'CREATE', None, 0, cur,
+        ...                'CREATE TABLE files (files_id INT, path TEXT)')
+        True
+        >>> writer = litedb.DBWriter(dbfile)
+        >>> writer.start()
+        >>> for i in range(3):
+        ...     writer.submit('INSERT', 'INSERT INTO files VALUES (?, ?)',
+        ...                   qmarkargs=(i, 'path{}'.format(i)))
+        True
+        True
+        True
+        >>> writer.flush()
+        0
+        >>> litedb.total_rows(con, 'files', None, 0, cur)
+        3
+        >>> writer.submit('INSERT', 'INSERT INTO nofiles VALUES (?)',
+        ...               qmarkargs=(0,), wait=True)
+        False
+        >>> def insert_and_flush(i):
+        ...     assert writer.submit('INSERT',
+        ...                          'INSERT INTO files VALUES (?, ?)',
+        ...                          qmarkargs=(i, 'proc{}'.format(i)),
+        ...                          wait=True)
+        >>> procs = [multiprocessing.Process(target=insert_and_flush,
+        ...                                  args=(i,)) for i in range(4)]
+        >>> for proc in procs:
+        ...     proc.start()
+        >>> for proc in procs:
+        ...     proc.join()
+        >>> [proc.exitcode for proc in procs]
+        [0, 0, 0, 0]
+        >>> litedb.total_rows(con, 'files', None, 0, cur)
+        7
+        >>> writer.stop()
+        >>> writer.flush() is None
+        True
+        >>> litedb.close(con)
+    """
+
+    # Message (FLUSH, sequence) requesting to commit and acknowledge on
+    # flushed_seq
+    FLUSH = 'FLUSH'
+    # Seconds before retrying a statement which found the DB locked
+    BUSY_SECS = 2
+    # Seconds between checks of the writer process while waiting on flush
+    POLL_SECS = 1
+
+    def __init__(self, sqlite_file, batch_max=500, max_attempts=10):
+        """ class DBWriter __init__
+
+            sqlite_file  = DB file
+            batch_max    = Maximum number of statements per transaction
+            max_attempts = Attempts for a statement finding the DB locked
+        """
+        self.sqlite_file = sqlite_file
+        self.batch_max = batch_max
+        self.max_attempts = max_attempts
+        # SimpleQueue writes each message right away (no feeder thread) so
+        # statements submitted before a flush are always committed by it.
+        self.wqueue = SimpleQueue()
+        # FLUSH requests are numbered (and queued) under flush_lock, so
+        # once flushed_seq reaches a request all the former are committed.
+        self.flush_lock = multiprocessing.Lock()
+        self.flush_seq = multiprocessing.RawValue('l', 0)
+        self.flushed = multiprocessing.Condition()
+        self.flushed_seq = multiprocessing.RawValue('l', 0)
+        # Statements failed: overall (guarded by flushed) and as of the
+        # last flush of this process (see flush)
+        self.failed = multiprocessing.RawValue('l', 0)
+        self.failed_seen = 0
+        self.proc = None
+        self.owner_pid = None
+
+    def start(self):
+        """ start
+
+            Starts the (daemonic) writer process.
+        """
+        self.proc = multiprocessing.Process(
+            target=dbwriter_serve,
+            args=(self.sqlite_file,
+                  self.wqueue,
+                  self.flushed,
+                  self.flushed_seq,
+                  self.failed,
+                  self.batch_max,
+                  self.max_attempts,))
+        self.proc.daemon = True
+        self.proc.start()
+        self.owner_pid = os.getpid()
+        logging.warning('===DBWriter: started with pid:[%s]', self.proc.pid)
+
+    def submit(self, qry_name, statement, qmarkargs=(), dbcaughtcode='000',
+               wait=False):
+        """ submit
+
+            Sends a write statement to be executed by the writer.
+            Same arguments as execute. Returns False if the writer is not
+            running. Otherwise True or, with wait, whether it is committed
+            (see flush): False if any statement failed meanwhile.
+        """
+        assert isinstance(qmarkargs, tuple), NPR.niceassert(
+            'DBWriter.submit [{!s}] {!s} is not a tuple!!'
+            .format(qry_name, 'qmarkargs'))
+
+        logging.debug('--> DBWriter.submit [%s] statement:[%s] '
+                      'qmarkargs:[%s]', qry_name, statement, qmarkargs)
+        if not self.is_alive():
+            NPR.niceerror(caught=True,
+                          caughtprefix='+++ DB',
+                          caughtcode=dbcaughtcode,
+                          caughtmsg='DBWriter not running: [{!s}] not '
+                          'recorded'.format(qry_name),
+                          useniceprint=True)
+            return False
+
+        if wait:
+            self.flush()
+        self.wqueue.put((qry_name, statement, qmarkargs, dbcaughtcode))
+
+        return self.flush() == 0 if wait else True
+
+    def flush(self, timeout=None):
+        """ flush
+
+            Waits for all statements submitted so far (by this process or
+            thread) to be committed. May be called from any process or
+            thread. Returns the number of statements (from any process)
+            which failed since the previous flush of this process. None if
+            not committed within timeout seconds or the writer stopped.
+        """
+        if not self.is_alive():
+            return None
+
+        with self.flush_lock:
+            self.flush_seq.value += 1
+            seq = self.flush_seq.value
+            self.wqueue.put((self.FLUSH, seq))
+
+        deadline = None if timeout is None else time.time() + timeout
+        with self.flushed:
+            while self.flushed_seq.value < seq:
+                if deadline is not None and deadline <= time.time():
+                    return None
+                self.flushed.wait(self.POLL_SECS if deadline is None
+                                  else min(self.POLL_SECS,
+                                           deadline - time.time()))
+                if self.flushed_seq.value < seq and not self.is_alive():
+                    NPR.niceerror(caught=True,
+                                  caughtprefix='+++ DB',
+                                  caughtcode='010',
+                                  caughtmsg='DBWriter stopped before '
+                                  'committing',
+                                  useniceprint=True)
+                    return None
+            failed = self.failed.value
+
+        nfailed = failed - self.failed_seen
+        self.failed_seen = failed
+        return nfailed
+
+    def is_alive(self):
+        """ is_alive
+
+            True while the writer process runs. Also from the processes
+            forked after start (which can not use Process.is_alive).
+        """
+        if self.proc is None:
+            return False
+        if os.getpid() == self.owner_pid:
+            return self.proc.is_alive()
+        sentinel = getattr(self.proc, 'sentinel', None)
+        if sentinel is not None and mp_wait is not None:
+            return not mp_wait([sentinel], 0)
+        try:
+            os.kill(self.proc.pid, 0)
+        except OSError:
+            return False
+        return True
+
+    def stop(self):
+        """ stop
+
+            Commits pending statements and stops the writer process.
+        """
+        if self.proc is not None:
+            self.wqueue.put(None)
+            self.proc.join(timeout=60)
+            logging.warning('===DBWriter: stopped exitcode:[%s]',
+                            self.proc.exitcode)
+            self.proc = None
+
+
 # -----------------------------------------------------------------------------
 # If called directly run doctests
 #
@@ -0,0 +1,276 @@
+"""
+    by oPromessa, 2018
+    Published on https://github.com/oPromessa/flickr-uploader/
+
+    exiftools = Helper classes to run exiftool commands on long running
+                exiftool processes (-stay_open True) instead of starting
+                one exiftool (perl) process per command. Used to convert RAW
+                files (see Uploadr.convert_raw_files) and to read keywords
+                (see Uploadr.file_keywords).
+"""
+
+# -----------------------------------------------------------------------------
+# Import section for Python 2 and 3 compatible code
+# from __future__ import absolute_import, division, print_function,
+#    unicode_literals
+from __future__ import division    # This way: 3 / 2 == 1.5; 3 // 2 == 1
+
+# -----------------------------------------------------------------------------
+# Import section
+#
+import logging
+import multiprocessing
+import subprocess
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+import lib.NicePrint as NicePrint
+
+# =========================================================================
+# Functions aliases
+#
+#   NPR.NicePrint = from NicePrint module
+# -------------------------------------------------------------------------
+NPR = NicePrint.NicePrint()
+
+# -------------------------------------------------------------------------
+# KEYWORDS_ARGS = exiftool arguments to print the keywords of a file (XMP
+#                 Subject and IPTC Keywords), one line per tag, comma
+#                 separated. See parse_keywords.
+#
+KEYWORDS_ARGS = ('-s3', '-sep', ',', '-XMP-dc:Subject', '-IPTC:Keywords')
+
+
+# -----------------------------------------------------------------------------
+# encode_arg
+#
+def encode_arg(arg):
+    """ encode_arg
+
+        arg as utf-8 encoded bytes (one line of the exiftool -@ argfile).
+
+        >>> encode_arg(u'-ext') == b'-ext'
+        True
+        >>> encode_arg(b'-r') == b'-r'
+        True
+    """
+    return arg if isinstance(arg, bytes) else arg.encode('utf-8')
+
+
+# -----------------------------------------------------------------------------
+# parse_keywords
+#
+def parse_keywords(output):
+    """ parse_keywords
+
+        List of the keywords (without duplicates) from the output of
+        exiftool with KEYWORDS_ARGS.
+
+        >>> parse_keywords('beach, sunset,Lisbon\\nbeach\\n')
+        ['beach', 'sunset', 'Lisbon']
+        >>> parse_keywords('')
+        []
+    """
+    keywords = []
+    for line in output.splitlines():
+        for keyword in line.split(','):
+            keyword = keyword.strip().replace('"', '')
+            if keyword and keyword not in keywords:
+                keywords.append(keyword)
+    return keywords
+
+
+# -----------------------------------------------------------------------------
+# class ExifTool
+#
+# One long running exiftool process.
+#
+class ExifTool(object):
+    """ ExifTool
+
+        exiftool started with -stay_open True -@ - which reads commands
+        (one argument per line, each followed by -execute) from stdin and
+        signals the end of the output of each one with {ready}.
+        Started on first use and restarted should it stop.
+    """
+
+    def __init__(self, executable):
+        """ class ExifTool __init__
+
+            executable = path of exiftool
+        """
+        self.executable = executable
+        self.proc = None
+        self.count = 0
+
+    def start(self):
+        """ start
+
+            Starts the exiftool process. stderr goes along with stdout.
+        """
+        self.proc = subprocess.Popen([self.executable,
+                                      '-stay_open', 'True', '-@', '-'],
+                                     stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.STDOUT)
+        logging.info('ExifTool: started pid:[%s]', self.proc.pid)
+
+    def execute(self, *args):
+        """ execute
+
+            Runs exiftool with args. Returns its output.
+            Raises OSError if exiftool stops meanwhile.
+        """
+        if self.proc is None or self.proc.poll() is not None:
+            self.start()
+
+        self.count += 1
+        ready = '{{ready{:d}}}'.format(self.count)
+        self.proc.stdin.write(
+            b'\n'.join([encode_arg(arg) for arg in args] +
+                       [encode_arg('-execute{:d}'.format(self.count)),
+                        b'']))
+        self.proc.stdin.flush()
+
+        output = []
+        while True:
+            line = self.proc.stdout.readline()
+            if not line:
+                raise OSError('exiftool stopped with exitcode:[{!s}]'
+                              .format(self.proc.poll()))
+            line = line.decode('utf-8', 'replace').rstrip('\r\n')
+            if line == ready:
+                break
+            output.append(line)
+
+        return '\n'.join(output)
+
+    def stop(self):
+        """ stop
+
+            Stops the exiftool process, if running.
+        """
+        if self.proc is not None and self.proc.poll() is None:
+            try:
+                self.proc.stdin.write(b'-stay_open\nFalse\n')
+                self.proc.stdin.flush()
+                self.proc.wait()
+            except (IOError, OSError):
+                self.proc.kill()
+        self.proc = None
+
+
+# -----------------------------------------------------------------------------
+# class ExifToolPool
+#
+# Pool of ExifTool processes used by a pool of threads.
+#
+class ExifToolPool(object):
+    """ ExifToolPool
+
+        size ExifTool processes. map runs a function on a list of items
+        with size threads, each one using an ExifTool (via execute) at a
+        time. Records the time spent on each item.
+    """
+
+    def __init__(self, executable, size=None):
+        """ class ExifToolPool __init__
+
+            executable = path of exiftool
+            size       = number of exiftool processes (default: CPU count)
+        """
+        self.size = size or multiprocessing.cpu_count()
+        self.tools = queue.Queue()
+        self.all_tools = [ExifTool(executable) for _ in range(self.size)]
+        for tool in self.all_tools:
+            self.tools.put(tool)
+        # Protects latencies from the threads
+        self.lock = threading.Lock()
+        self.latencies = []
+
+    def execute(self, *args):
+        """ execute
+
+            Runs exiftool with args on the first ExifTool available.
+            Returns its output.
+        """
+        tool = self.tools.get()
+        try:
+            return tool.execute(*args)
+        finally:
+            self.tools.put(tool)
+
+    def map(self, a_fn, items):
+        """ map
+
+            Returns [a_fn(item) for item in items] running them with size
+            threads. a_fn is expected to use execute.
+        """
+
+        def timed_fn(item):
+            """ timed_fn
+
+                a_fn(item) recording its latency.
+            """
+            start = time.time()
+            try:
+                return a_fn(item)
+            finally:
+                with self.lock:
+                    self.latencies.append(time.time() - start)
+
+        if self.size < 2 or len(items) < 2:
+            return [timed_fn(item) for item in items]
+
+        pool = ThreadPool(min(self.size, len(items)))
+        try:
+            return pool.map(timed_fn, items)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def stats(self):
+        """ stats
+
+            (count, average, maximum) of the latencies (seconds) recorded
+            so far.
+
+            >>> apool = ExifToolPool('exiftool', size=2)
+            >>> apool.map(lambda item: item * 2, [1, 2, 3])
+            [2, 4, 6]
+            >>> apool.stats()[0]
+            3
+        """
+        with self.lock:
+            if not self.latencies:
+                return 0, 0, 0
+            return (len(self.latencies),
+                    sum(self.latencies) / len(self.latencies),
+                    max(self.latencies))
+
+    def stop(self):
+        """ stop
+
+            Stops all exiftool processes.
+        """
+        for tool in self.all_tools:
+            tool.stop()
+        logging.info('ExifToolPool: stopped [%s] exiftool processes.',
+                     self.size)
+
+
+# -----------------------------------------------------------------------------
+# If called directly run doctests
+#
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.WARNING,
+                        format='[%(asctime)s]:[%(processName)-11s]' +
+                        '[%(levelname)-8s]:[%(name)s] %(message)s')
+
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,134 @@
+"""
+    by oPromessa, 2018
+    Published on https://github.com/oPromessa/flickr-uploader/
+
+    hashcache = Helper functions to keep on the local DB table hashcache the
+                MD5 checksum of files keyed by their stat (size, mtime and
+                inode). A file is only read again to calculate its checksum
+                once its stat changes.
+"""
+
+# -----------------------------------------------------------------------------
+# Import section for Python 2 and 3 compatible code
+# from __future__ import absolute_import, division, print_function,
+#    unicode_literals
+from __future__ import division    # This way: 3 / 2 == 1.5; 3 // 2 == 1
+
+# -----------------------------------------------------------------------------
+# Import section
+#
+import logging
+import lib.NicePrint as NicePrint
+import lib.SQLiteDBHelper as litedb
+
+# =========================================================================
+# Functions aliases
+#
+#   NPR.NicePrint = from NicePrint module
+# -------------------------------------------------------------------------
+NPR = NicePrint.NicePrint()
+
+# -------------------------------------------------------------------------
+# Statements to record/remove a checksum. To be run by the caller (e.g.
+# via the DBWriter in multiprocessing mode).
+#
+STORE = ('INSERT OR REPLACE INTO hashcache '
+         '(path, size, mtime, inode, md5) VALUES (?, ?, ?, ?, ?)')
+DELETE = 'DELETE FROM hashcache WHERE path = ?'
+
+
+# -----------------------------------------------------------------------------
+# stat_key
+#
+def stat_key(st_file):
+    """ stat_key
+
+        (size, mtime, inode) from the os.stat result st_file.
+    """
+    return (st_file.st_size, st_file.st_mtime, st_file.st_ino)
+
+
+# -----------------------------------------------------------------------------
+# store_args
+#
+def store_args(path, st_file, md5):
+    """ store_args
+
+        qmarkargs for STORE.
+    """
+    return (path, ) + stat_key(st_file) + (md5, )
+
+
+# -----------------------------------------------------------------------------
+# lookup
+#
+def lookup(con, cur, nprocs, path, st_file):
+    """ lookup
+
+        Returns the MD5 checksum recorded for path if its stat (st_file) is
+        unchanged. None otherwise.
+
+        >>> import os
+        >>> import tempfile
+        >>> import lib.SQLiteDBHelper as litedb
+        >>> afile = tempfile.mkstemp()[1]
+        >>> con, cur = litedb.connect(':memory:')
+        >>> create_tables(con, cur, 0)
+        True
+        >>> lookup(con, cur, 0, afile, os.stat(afile)) is None
+        True
+        >>> _ = cur.execute(STORE, store_args(afile, os.stat(afile), 'abc'))
+        >>> lookup(con, cur, 0, afile, os.stat(afile))
+        'abc'
+        >>> with open(afile, 'w') as fileobj:
+        ...     _ = fileobj.write('changed')
+        >>> lookup(con, cur, 0, afile, os.stat(afile)) is None
+        True
+        >>> litedb.close(con)
+    """
+    if not litedb.execute(con, 'SELECT#520:hashcache',
+                          None, nprocs,  # No need for lock
+                          cur,
+                          'SELECT size, mtime, inode, md5 FROM hashcache '
+                          'WHERE path = ?',
+                          qmarkargs=(path, ),
+                          dbcaughtcode='520'):
+        return None
+
+    row = cur.fetchone()
+    if row is None or tuple(row[:3]) != stat_key(st_file):
+        return None
+
+    logging.debug('hashcache: hit:[%s]', NPR.strunicodeout(path))
+    return str(row[3])
+
+
+# -----------------------------------------------------------------------------
+# create_tables
+#
+# Creates DB table for hashcache
+#
+def create_tables(con, cur, nprocs):
+    """ create_tables
+
+        Creates the table hashcache. Returns True on success.
+    """
+    return litedb.execute(con, 'CREATE#521:hashcache',
+                          None, nprocs, cur,
+                          'CREATE TABLE IF NOT EXISTS hashcache '
+                          '(path TEXT PRIMARY KEY, size INT, mtime REAL, '
+                          'inode INT, md5 TEXT)',
+                          dbcaughtcode='521')
+
+
+# -----------------------------------------------------------------------------
+# If called directly run doctests
+#
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.WARNING,
+                        format='[%(asctime)s]:[%(processName)-11s]' +
+                        '[%(levelname)-8s]:[%(name)s] %(message)s')
+
+    import doctest
+    doctest.testmod()
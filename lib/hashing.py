@@ -0,0 +1,518 @@
+"""
+    by oPromessa, 2018
+    Published on https://github.com/oPromessa/flickr-uploader/
+
+    hashing = Helper functions to calculate checksums of files: large
+              buffered reads (or mmap), several digests in a single pass
+              over the file and a pool of threads to hash files in parallel
+              (hashlib releases the GIL). Keeps statistics (MB/s and hash
+              time percentiles) to tell if disk or CPU is the limit.
+              Also a fast digest (size and BLAKE2b) to detect local changes
+              without the MD5 checksum (used on Flickr checksum: tag) and a
+              content digest of JPEG and MP4/MOV files which ignores their
+              metadata (EXIF, XMP, IPTC, ...).
+"""
+
+# -----------------------------------------------------------------------------
+# Import section for Python 2 and 3 compatible code
+# from __future__ import absolute_import, division, print_function,
+#    unicode_literals
+from __future__ import division    # This way: 3 / 2 == 1.5; 3 // 2 == 1
+
+# -----------------------------------------------------------------------------
+# Import section
+#
+import io
+import logging
+import hashlib
+import mmap
+import multiprocessing
+import os
+import struct
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+import lib.NicePrint as NicePrint
+
+# =========================================================================
+# Functions aliases
+#
+#   NPR.NicePrint = from NicePrint module
+# -------------------------------------------------------------------------
+NPR = NicePrint.NicePrint()
+
+# -------------------------------------------------------------------------
+# BUFFER_SIZE = Bytes read at a time (and fed to the digests)
+#
+BUFFER_SIZE = 4 * 1024 * 1024
+
+# -------------------------------------------------------------------------
+# FAST_ALGORITHM = Digest for fast_digest. BLAKE2b is faster than MD5 on
+#                  64 bits CPUs. Not available before Python 3.6: MD5 then
+#                  (SHA1 is no faster).
+# MD5_AND_FAST   = Algorithms for the MD5 checksum and fast_digest of a file
+#                  in a single pass (see digest_file and fast_digest_of).
+#
+FAST_ALGORITHM = 'blake2b'\
+    if 'blake2b' in hashlib.algorithms_available\
+    else 'md5'
+MD5_AND_FAST = tuple(sorted(set(('md5', FAST_ALGORITHM))))
+
+# -------------------------------------------------------------------------
+# JPEG_SKIP     = JPEG segments with metadata only: APP1 (EXIF, XMP),
+#                 APP13 (IPTC) and COM (comments)
+# ISOBMFF_SKIP  = MP4/MOV boxes with metadata only (or padding)
+# ISOBMFF_INTO  = MP4/MOV boxes holding other boxes (metadata included)
+# ISOBMFF_FIRST = Expected first box of a MP4/MOV file
+# XMP_UUID      = uuid box with XMP
+#
+JPEG_SKIP = (b'\xe1', b'\xed', b'\xfe')
+ISOBMFF_SKIP = (b'udta', b'meta', b'free', b'skip', b'wide')
+ISOBMFF_INTO = (b'moov', b'trak')
+ISOBMFF_FIRST = (b'ftyp', b'moov', b'mdat', b'free', b'skip', b'wide')
+XMP_UUID = b'\xbe\x7a\xcf\xcb\x97\xa9\x42\xe8\x9c\x71\x99\x94\x91\xe3\xaf\xac'
+
+
+# -----------------------------------------------------------------------------
+# percentile
+#
+def percentile(values, pct):
+    """ percentile
+
+        pct percentile (nearest rank) of the sorted list values.
+
+        >>> percentile([1, 2, 3, 4, 5, 6, 7, 8, 9, 10], 50)
+        5
+        >>> percentile([1, 2, 3, 4, 5, 6, 7, 8, 9, 10], 90)
+        9
+        >>> percentile([], 50)
+        0
+    """
+    if not values:
+        return 0
+    rank = max(int(round(pct / 100 * len(values))), 1)
+    return values[min(rank, len(values)) - 1]
+
+
+# -----------------------------------------------------------------------------
+# class HashStats
+#
+# Statistics of the files hashed
+#
+class HashStats(object):
+    """ HashStats
+
+        Records the size and the time taken to hash each file.
+
+        >>> stats = HashStats()
+        >>> for nbytes, secs in [(1048576, 0.5), (3145728, 0.5)]:
+        ...     stats.record(nbytes, secs)
+        >>> stats.report()
+        'Hashed [2] files [4.0] MB at [4.0] MB/s. Hash time p50 [0.500]s \
+p90 [0.500]s p99 [0.500]s'
+    """
+
+    def __init__(self):
+        """ class HashStats __init__
+        """
+        # Protects nbytes and times from the hashing threads
+        self.lock = threading.Lock()
+        self.nbytes = 0
+        self.times = []
+
+    def record(self, nbytes, secs):
+        """ record
+
+            Records a file with nbytes hashed in secs seconds.
+        """
+        with self.lock:
+            self.nbytes += nbytes
+            self.times.append(secs)
+
+    def report(self):
+        """ report
+
+            Text with the number of files, MB, MB/s and hash time
+            percentiles (p50, p90, p99). None if no file was hashed.
+        """
+        with self.lock:
+            if not self.times:
+                return None
+            times = sorted(self.times)
+            megabytes = self.nbytes / 1024 / 1024
+            total_secs = sum(times)
+
+        return ('Hashed [{!s}] files [{:.1f}] MB at [{:.1f}] MB/s. '
+                'Hash time p50 [{:.3f}]s p90 [{:.3f}]s p99 [{:.3f}]s'
+                .format(len(times), megabytes,
+                        megabytes / total_secs if total_secs else 0,
+                        percentile(times, 50),
+                        percentile(times, 90),
+                        percentile(times, 99)))
+
+
+# -------------------------------------------------------------------------
+# STATS = Statistics of the files hashed by this process
+#
+STATS = HashStats()
+
+
+# -----------------------------------------------------------------------------
+# digest_file
+#
+def digest_file(afilepath, algorithms=('md5',), use_mmap=False):
+    """ digest_file
+
+        Returns a dict algorithm: hexdigest of afilepath calculated in a
+        single pass over the file. Reads BUFFER_SIZE bytes at a time or,
+        with use_mmap, maps the file into memory.
+        Records the file on STATS.
+
+        >>> import tempfile
+        >>> afile = tempfile.mkstemp()[1]
+        >>> with open(afile, 'wb') as fileobj:
+        ...     _ = fileobj.write(b'abc')
+        >>> sorted(digest_file(afile, ('md5', 'sha1')).items())
+        [('md5', '900150983cd24fb0d6963f7d28e17f72'), \
+('sha1', 'a9993e364706816aba3e25717850c26c9cd0d89d')]
+        >>> digest_file(afile, use_mmap=True) == digest_file(afile)
+        True
+    """
+    start = time.time()
+    digests = [(algorithm, hashlib.new(algorithm))
+               for algorithm in algorithms]
+    nbytes = 0
+    with io.open(afilepath, 'rb', buffering=0) as fileobj:
+        if use_mmap and os.fstat(fileobj.fileno()).st_size > 0:
+            mapped = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                nbytes = len(mapped)
+                for offset in range(0, nbytes, BUFFER_SIZE):
+                    data = mapped[offset:offset + BUFFER_SIZE]
+                    for _, digest in digests:
+                        digest.update(data)
+            finally:
+                mapped.close()
+        else:
+            buf = bytearray(BUFFER_SIZE)
+            view = memoryview(buf)
+            while True:
+                nread = fileobj.readinto(buf)
+                if not nread:
+                    break
+                nbytes += nread
+                for _, digest in digests:
+                    digest.update(view[:nread])
+
+    STATS.record(nbytes, time.time() - start)
+    return dict((algorithm, digest.hexdigest())
+                for algorithm, digest in digests)
+
+
+# -----------------------------------------------------------------------------
+# digest_files
+#
+def digest_files(paths, algorithms=('md5',), threads=None):
+    """ digest_files
+
+        Returns [digest_file(path, algorithms) for path in paths] hashing
+        the files with a pool of threads (default: one per CPU). None for
+        the files which can not be read.
+
+        >>> import tempfile
+        >>> afile = tempfile.mkstemp()[1]
+        >>> [adigest and adigest['md5'] for adigest in
+        ...  digest_files([afile, afile + '.gone'], threads=2)]
+        ['d41d8cd98f00b204e9800998ecf8427e', None]
+    """
+
+    def digest_or_none(path):
+        """ digest_or_none
+
+            digest_file of path. None on error.
+        """
+        try:
+            return digest_file(path, algorithms)
+        except (IOError, OSError) as err:
+            logging.warning('digest_files: skipping [%s]: [%s]',
+                            NPR.strunicodeout(path), err)
+            return None
+
+    threads = threads or multiprocessing.cpu_count()
+    if threads < 2 or len(paths) < 2:
+        return [digest_or_none(path) for path in paths]
+
+    pool = ThreadPool(min(threads, len(paths)))
+    try:
+        return pool.map(digest_or_none, paths)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+# -----------------------------------------------------------------------------
+# fast_digest
+#
+def fast_digest(afilepath, st_size=None):
+    """ fast_digest
+
+        Returns '<size>:<FAST_ALGORITHM hexdigest>' of afilepath. Only to
+        detect local changes (see same_content). st_size = file size if
+        already known.
+
+        >>> import tempfile
+        >>> afile = tempfile.mkstemp()[1]
+        >>> with open(afile, 'wb') as fileobj:
+        ...     _ = fileobj.write(b'abc')
+        >>> fast_digest(afile).startswith('3:')
+        True
+    """
+    if st_size is None:
+        st_size = os.path.getsize(afilepath)
+    return fast_digest_of(st_size, digest_file(afilepath, (FAST_ALGORITHM,)))
+
+
+# -----------------------------------------------------------------------------
+# fast_digest_of
+#
+def fast_digest_of(st_size, digests):
+    """ fast_digest_of
+
+        fast_digest out of st_size and the digests (from digest_file) of a
+        file. Allows getting its MD5 checksum on the same pass.
+
+        >>> import tempfile
+        >>> afile = tempfile.mkstemp()[1]
+        >>> digests = digest_file(afile, MD5_AND_FAST)
+        >>> fast_digest_of(0, digests) == fast_digest(afile)
+        True
+    """
+    return '{!s}:{!s}'.format(st_size, digests[FAST_ALGORITHM])
+
+
+# -----------------------------------------------------------------------------
+# same_content
+#
+def same_content(afilepath, a_fast_digest, digest_fn=fast_digest):
+    """ same_content
+
+        True if afilepath still has a_fast_digest (from fast_digest). The
+        file is only read if its size is unchanged. False if a_fast_digest
+        is None. digest_fn(afilepath, st_size) = fast_digest or one which
+        reuses a fast_digest already calculated.
+
+        >>> import tempfile
+        >>> afile = tempfile.mkstemp()[1]
+        >>> adigest = fast_digest(afile)
+        >>> same_content(afile, adigest), same_content(afile, None)
+        (True, False)
+        >>> with open(afile, 'wb') as fileobj:
+        ...     _ = fileobj.write(b'abc')
+        >>> same_content(afile, adigest)
+        False
+    """
+    if a_fast_digest is None:
+        return False
+
+    st_size = os.path.getsize(afilepath)
+    if not a_fast_digest.startswith('{!s}:'.format(st_size)):
+        return False
+
+    return digest_fn(afilepath, st_size) == a_fast_digest
+
+
+# -----------------------------------------------------------------------------
+# read_exactly
+#
+def read_exactly(fileobj, nbytes):
+    """ read_exactly
+
+        Reads nbytes from fileobj. Raises ValueError if the file ends
+        before.
+    """
+    data = fileobj.read(nbytes)
+    if len(data) != nbytes:
+        raise ValueError('truncated file')
+    return data
+
+
+# -----------------------------------------------------------------------------
+# copy_to_digest
+#
+def copy_to_digest(fileobj, digest, nbytes=None):
+    """ copy_to_digest
+
+        Feeds digest with nbytes (default: up to the end of the file) from
+        fileobj, BUFFER_SIZE bytes at a time. Returns the bytes read.
+    """
+    nread = 0
+    while nbytes is None or nread < nbytes:
+        data = fileobj.read(BUFFER_SIZE if nbytes is None
+                            else min(BUFFER_SIZE, nbytes - nread))
+        if not data:
+            if nbytes is not None:
+                raise ValueError('truncated file')
+            break
+        digest.update(data)
+        nread += len(data)
+    return nread
+
+
+# -----------------------------------------------------------------------------
+# digest_jpeg
+#
+def digest_jpeg(fileobj, digest):
+    """ digest_jpeg
+
+        Feeds digest with the JPEG segments of fileobj, except JPEG_SKIP
+        ones, and the (entropy coded) image data from the Start Of Scan up
+        to the end. Raises ValueError if fileobj is not a valid JPEG.
+    """
+    if read_exactly(fileobj, 2) != b'\xff\xd8':
+        raise ValueError('not a JPEG')
+
+    while True:
+        if read_exactly(fileobj, 1) != b'\xff':
+            raise ValueError('JPEG marker expected')
+        marker = read_exactly(fileobj, 1)
+        while marker == b'\xff':  # Fill bytes
+            marker = read_exactly(fileobj, 1)
+        length = read_exactly(fileobj, 2)
+        seglen = struct.unpack('>H', length)[0]
+        if seglen < 2:
+            raise ValueError('invalid JPEG segment length')
+
+        if marker in JPEG_SKIP:
+            fileobj.seek(seglen - 2, os.SEEK_CUR)
+            continue
+
+        digest.update(b'\xff' + marker + length)
+        copy_to_digest(fileobj, digest, seglen - 2)
+        if marker == b'\xda':  # Start Of Scan
+            copy_to_digest(fileobj, digest)
+            return
+
+
+# -----------------------------------------------------------------------------
+# digest_isobmff
+#
+def digest_isobmff(fileobj, digest, end):
+    """ digest_isobmff
+
+        Feeds digest with the boxes (MP4/MOV atoms) of fileobj up to
+        position end (None: end of file), except ISOBMFF_SKIP and XMP_UUID
+        boxes, going into ISOBMFF_INTO boxes. Box sizes are left out as
+        they change with the metadata within.
+        Raises ValueError if fileobj is not a valid MP4/MOV.
+    """
+    while end is None or fileobj.tell() < end:
+        header = fileobj.read(8)
+        if not header and end is None:
+            return
+        if len(header) != 8:
+            raise ValueError('truncated file')
+        boxsize, boxtype = struct.unpack('>I4s', header)
+        if boxsize == 1:
+            boxsize = struct.unpack('>Q', read_exactly(fileobj, 8))[0] - 8
+        if boxsize == 0:
+            boxend = end
+        elif boxsize < 8:
+            raise ValueError('invalid box size')
+        else:
+            boxend = fileobj.tell() + boxsize - 8
+            if end is not None and boxend > end:
+                raise ValueError('box beyond its parent box')
+
+        boxuuid = read_exactly(fileobj, 16) if boxtype == b'uuid' else None
+        if boxtype in ISOBMFF_SKIP or boxuuid == XMP_UUID:
+            if boxend is None:
+                return
+            fileobj.seek(boxend)
+            continue
+
+        digest.update(boxtype)
+        if boxuuid is not None:
+            digest.update(boxuuid)
+        if boxtype in ISOBMFF_INTO:
+            digest_isobmff(fileobj, digest, boxend)
+        else:
+            copy_to_digest(fileobj, digest,
+                           None if boxend is None
+                           else boxend - fileobj.tell())
+
+
+# -----------------------------------------------------------------------------
+# content_digest
+#
+def content_digest(afilepath):
+    """ content_digest
+
+        Returns the FAST_ALGORITHM hexdigest of the image/video data of a
+        JPEG or MP4/MOV file, leaving out its metadata (EXIF, XMP, IPTC,
+        comments, udta/meta boxes): an edit of keywords, title, ... does not
+        change it. None for other formats or invalid files.
+
+        >>> import tempfile
+        >>> afile = tempfile.mkstemp()[1]
+        >>> def write(data):
+        ...     with open(afile, 'wb') as fileobj:
+        ...         _ = fileobj.write(data)
+        ...     return content_digest(afile)
+        >>> jpeg = (b'\\xff\\xd8\\xff\\xe0\\x00\\x04JF'
+        ...         b'\\xff\\xda\\x00\\x02pixels\\xff\\xd9')
+        >>> exif = b'\\xff\\xe1\\x00\\x06Exif'
+        >>> adigest = write(jpeg)
+        >>> adigest == write(jpeg[:8] + exif + jpeg[8:])
+        True
+        >>> adigest == write(jpeg.replace(b'pixels', b'pixelz'))
+        False
+        >>> def box(boxtype, data):
+        ...     return struct.pack('>I', 8 + len(data)) + boxtype + data
+        >>> mp4 = [box(b'ftyp', b'isom'), box(b'mdat', b'frames')]
+        >>> adigest = write(b''.join(mp4 + [box(b'moov', box(b'mvhd', b'x'))]))
+        >>> adigest == write(b''.join(mp4 + [
+        ...     box(b'moov', box(b'mvhd', b'x') + box(b'udta', b'title'))]))
+        True
+        >>> adigest == write(b''.join(mp4 + [
+        ...     box(b'uuid', XMP_UUID + b'<x/>'),
+        ...     box(b'moov', box(b'mvhd', b'x'))]))
+        True
+        >>> uuids = [write(b''.join(mp4 + [box(b'uuid', uuid + b'data')]))
+        ...          for uuid in [b'1' * 16, b'2' * 16]]
+        >>> uuids[0] == uuids[1]
+        False
+        >>> write(b'GIF89a') is None, write(jpeg[:7]) is None
+        (True, True)
+    """
+    digest = hashlib.new(FAST_ALGORITHM)
+    start = time.time()
+    with io.open(afilepath, 'rb') as fileobj:
+        magic = fileobj.read(8)
+        fileobj.seek(0)
+        try:
+            if magic[:2] == b'\xff\xd8':
+                digest_jpeg(fileobj, digest)
+            elif magic[4:8] in ISOBMFF_FIRST:
+                digest_isobmff(fileobj, digest, None)
+            else:
+                return None
+        except (ValueError, struct.error) as err:
+            logging.warning('content_digest: [%s]: [%s]',
+                            NPR.strunicodeout(afilepath), err)
+            return None
+        STATS.record(fileobj.tell(), time.time() - start)
+
+    return digest.hexdigest()
+
+
+# -----------------------------------------------------------------------------
+# If called directly run doctests
+#
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.WARNING,
+                        format='[%(asctime)s]:[%(processName)-11s]' +
+                        '[%(levelname)-8s]:[%(name)s] %(message)s')
+
+    import doctest
+    doctest.testmod()
@@ -14,9 +14,14 @@ from __future__ import division    # This way: 3 / 2 == 1.5; 3 // 2 == 1
 # -----------------------------------------------------------------------------
 # Import section
 #
+import collections
 import logging
 import multiprocessing
 from itertools import islice
+try:
+    import queue                # Python 3
+except ImportError:
+    import Queue as queue       # Python 2
 import lib.NicePrint as NicePrint
 
 # =========================================================================
@@ -104,10 +109,424 @@ def use_lock(adb_lock, operation, nprocs=0):
     return use_dblock_return
 
 
+# -----------------------------------------------------------------------------
+# chunk
+#
+# Divides an iterable in slices/chunks of size size
+#
+def chunk(iter_list, size):
+    """
+        Divides an iterable in slices/chunks of size size
+
+        >>> for a in chunk([ 1, 2, 3, 4, 5, 6, 7, 8, 9, 10], 3):
+        ...     len(a)
+        3
+        3
+        3
+        1
+    """
+    iter_list = iter(iter_list)
+    # lambda: creates a returning expression function
+    # which returns slices
+    # iter, with the second argument () stops creating
+    # iterators when it reaches the end
+    return iter(lambda: tuple(islice(iter_list, size)), ())
+
+
+# -----------------------------------------------------------------------------
+# class TaskQueueIterator
+#
+# Iterates over items pulled on demand from a shared task queue.
+#
+class TaskQueueIterator(object):
+    """ TaskQueueIterator
+
+        Iterable handed over to each process in place of a fixed chunk.
+        Each step pulls the next batch (tuple) of items from the shared
+        task_queue. A None batch is the end-of-work sentinel (one per process).
+        Processes which finish their items earlier simply take the next batch
+        so no process stays idle while there is still work queued.
+
+        >>> tasks = multiprocessing.Queue()
+        >>> for batch in chunk(range(5), 2):
+        ...     tasks.put(batch)
+        >>> tasks.put(None)
+        >>> list(TaskQueueIterator(tasks))
+        [0, 1, 2, 3, 4]
+    """
+
+    def __init__(self, task_queue):
+        """ class TaskQueueIterator __init__
+        """
+        self.task_queue = task_queue
+
+    def __iter__(self):
+        """ __iter__
+
+            Yields items from batches until the None sentinel is received.
+        """
+        while True:
+            batch = self.task_queue.get()
+            if batch is None:
+                logging.debug('===TaskQueueIterator: end of work sentinel.')
+                break
+            for item in batch:
+                yield item
+
+
+# -----------------------------------------------------------------------------
+# pool_worker
+#
+# Main loop of each process in a WorkerPool.
+#
+def pool_worker(target, task_queue, done_queue, lockdb, running, mutex):
+    """ pool_worker
+
+        target     = object holding the functions to run (by name)
+        task_queue = queue to receive tasks from. None stops the worker.
+        done_queue = queue to report begin/end of each task (and the
+                     follow-up batches, if any)
+        lockdb     = lock for access to Database
+        running    = Value to count processed items
+        mutex      = mutex for access to value running
+
+        Each task is a tuple (batch_nbr, fn_name, count_total, batch).
+        Calls target.fn_name(lockdb, running, mutex, batch, count_total, None)
+        which may return a list of follow-up batches for fn_name.
+    """
+    pid = multiprocessing.current_process().pid
+    while True:
+        task = task_queue.get()
+        if task is None:
+            logging.debug('===pool_worker: end of work sentinel.')
+            break
+
+        batch_nbr, fn_name, count_total, batch = task
+        done_queue.put(('begin', pid, batch_nbr))
+        try:
+            followups = getattr(target, fn_name)(lockdb, running, mutex,
+                                                 batch, count_total, None)
+            # Sent ahead of the end of this batch: run_stream queues them
+            if isinstance(followups, list) and followups:
+                done_queue.put(('more', pid, followups))
+        except Exception:
+            NPR.niceerror(caught=True,
+                          caughtprefix='+++ ',
+                          caughtcode='004',
+                          caughtmsg='Caught an exception on pool_worker '
+                          'running [{!s}] batch [{!s}]'
+                          .format(fn_name, batch_nbr),
+                          useniceprint=True,
+                          exceptsysinfo=True)
+        done_queue.put(('end', pid, batch_nbr))
+
+
+# -----------------------------------------------------------------------------
+# class WorkerPool
+#
+# Pool of long lived processes to reuse across multiple mprocessing calls.
+#
+class WorkerPool(object):
+    """ WorkerPool
+
+        Keeps nprocs processes alive (started on first use) to run batches
+        of items through functions of target. Processes are forked once and
+        reused by each run() call so the cost of forking (and of the target
+        state, like an authenticated flickrapi object) is paid only once.
+        As target is copied into the processes when they are forked, start
+        the pool only once target is fully setup (i.e. after authentication).
+
+        The pool owns the lockdb, running and mutex multiprocessing objects.
+        With with_lockdb False, lockdb is None (DB writes are not done via
+        lockdb, for instance when using a SQLiteDBHelper.DBWriter).
+
+        >>> class Target(object):
+        ...     def fn(self, lockdb, running, mutex, batch, count_total, cur):
+        ...         with mutex:
+        ...             running.value += sum(batch)
+        >>> apool = WorkerPool(2, Target())
+        >>> apool.run('fn', list(range(5)), batch_size=2)
+        10
+        >>> apool.run('fn', [10, 20])
+        30
+        >>> apool.shutdown()
+    """
+
+    # Seconds to wait for messages from the processes before checking them
+    WAIT_SECS = 60
+
+    def __init__(self, nprocs, target, with_lockdb=True):
+        """ class WorkerPool __init__
+
+            nprocs      = Number of processes to launch (int)
+            target      = object holding the functions to run
+            with_lockdb = create a lock for access to Database
+        """
+        self.nprocs = int(nprocs)
+        self.target = target
+        self.lockdb = multiprocessing.Lock() if with_lockdb else None
+        self.running = multiprocessing.Value('i', 0)
+        self.mutex = multiprocessing.Lock()
+        self.task_queue = multiprocessing.Queue()
+        self.done_queue = multiprocessing.Queue()
+        self.procs = []
+
+    def _spawn(self):
+        """ _spawn
+
+            Forks and starts one (daemonic) process for the pool.
+        """
+        proc_task = multiprocessing.Process(
+            target=pool_worker,
+            args=(self.target,
+                  self.task_queue,
+                  self.done_queue,
+                  self.lockdb,
+                  self.running,
+                  self.mutex,))
+        proc_task.daemon = True
+        proc_task.start()
+        NPR.niceprint('===Pool Process: [{!s}] Started '
+                      'with pid:[{!s}]'
+                      .format(proc_task.name,
+                              proc_task.pid),
+                      verbosity=3,
+                      logalso=logging.DEBUG)
+        return proc_task
+
+    def start(self):
+        """ start
+
+            Starts the processes in the pool, if not yet started.
+        """
+        if not self.procs:
+            logging.info('===WorkerPool: starting [%s] processes.',
+                         self.nprocs)
+            self.procs = [self._spawn() for _ in range(self.nprocs)]
+
+    def _check_workers(self, inflight, outstanding):
+        """ _check_workers
+
+            Replaces processes which died. The batches they were running
+            are lost: dropped from outstanding. Returns the number of
+            processes which died without a batch running (they may have
+            taken one without reporting it).
+        """
+        unreported = 0
+        for i, proc_task in enumerate(self.procs):
+            if proc_task.is_alive():
+                continue
+            NPR.niceerror(caught=True,
+                          caughtprefix='xxx',
+                          caughtcode='005',
+                          caughtmsg='Pool Process [{!s}] pid:[{!s}] '
+                          'died with exitcode:[{!s}]. Replacing it.'
+                          .format(proc_task.name,
+                                  proc_task.pid,
+                                  proc_task.exitcode),
+                          useniceprint=True)
+            batch_nbr = inflight.pop(proc_task.pid, None)
+            if batch_nbr is None:
+                unreported += 1
+            else:
+                outstanding.discard(batch_nbr)
+                NPR.niceerror(caught=True,
+                              caughtprefix='xxx',
+                              caughtcode='007',
+                              caughtmsg='Lost batch [{!s}].'
+                              .format(batch_nbr),
+                              useniceprint=True)
+            self.procs[i] = self._spawn()
+        return unreported
+
+    def run(self, fn_name, itemslist, batch_size=1):
+        """ run
+
+            fn_name    = name of the function of target to run
+            itemslist  = list of items to be processed
+            batch_size = Number of items sent at once to a process
+
+            Returns once all items were processed. Returns the number of
+            processed items as counted by fn_name on running.
+        """
+        return self.run_stream(fn_name,
+                               chunk(itemslist, batch_size),
+                               len(itemslist))
+
+    def run_stream(self, fn_name, batches, count_total=0, max_pending=0):
+        """ run_stream
+
+            fn_name     = name of the function of target to run. It may
+                          return a list of follow-up batches: they are
+                          queued ahead of the remaining ones of batches
+            batches     = iterable (e.g. generator) of batches (lists) of
+                          items to be processed
+            count_total = total number of items (for progress indication)
+            max_pending = maximum number of batches queued or running at
+                          any time (0 = no limit). batches is consumed as
+                          processes become available: the processes start
+                          working while batches is still producing items.
+                          Also a function returning the maximum, checked
+                          before each batch (e.g. AdaptiveConcurrency
+                          get_limit) to adjust it while running.
+
+            Returns once all items were processed. Returns the number of
+            processed items as counted by fn_name on running.
+
+            >>> class Target(object):
+            ...     def fn(self, lockdb, running, mutex, batch, c_total, cur):
+            ...         with mutex:
+            ...             running.value += sum(batch)
+            >>> apool = WorkerPool(2, Target())
+            >>> apool.run_stream('fn', ([i] for i in range(5)), max_pending=2)
+            10
+            >>> apool.run_stream('fn', ([i] for i in range(5)),
+            ...                  max_pending=lambda: 1)
+            10
+            >>> apool.shutdown()
+
+            Follow-up batches:
+
+            >>> class Split(object):
+            ...     def fn(self, lockdb, running, mutex, batch, c_total, cur):
+            ...         if len(batch) > 1:
+            ...             return [[item] for item in batch]
+            ...         with mutex:
+            ...             running.value += sum(batch)
+            >>> apool = WorkerPool(2, Split())
+            >>> apool.run_stream('fn', [[1, 2, 3], [4]], max_pending=1)
+            10
+            >>> apool.shutdown()
+
+            A batch is only given up on once the process running it died:
+
+            >>> import io, os, sys
+            >>> class Dying(object):
+            ...     def fn(self, lockdb, running, mutex, batch, c_total, cur):
+            ...         if 3 in batch:
+            ...             os._exit(1)
+            ...         with mutex:
+            ...             running.value += sum(batch)
+            >>> apool = WorkerPool(2, Dying())
+            >>> apool.WAIT_SECS = 1
+            >>> sys.stdout, stdout = io.StringIO(), sys.stdout
+            >>> result = apool.run('fn', list(range(5)))
+            >>> sys.stdout, errors = stdout, sys.stdout.getvalue()
+            >>> result, 'died with exitcode:[1]' in errors
+            (7, True)
+            >>> apool.shutdown()
+        """
+        self.start()
+        self.running.value = 0
+
+        # inflight    = pid: batch_nbr being run by each process
+        # outstanding = batch_nbr queued or running (not yet ended or lost)
+        # unreported  = processes which died without a batch running
+        # followups   = follow-up batches returned by fn_name, to be queued
+        inflight = {}
+        outstanding = set()
+        unreported = [0]
+        followups = collections.deque()
+        nbatches = 0
+        get_max_pending = max_pending\
+            if callable(max_pending)\
+            else (lambda: max_pending)
+        batches = iter(batches)
+        exhausted = False
+        while True:
+            if followups:
+                batch = followups.popleft()
+            elif not exhausted:
+                try:
+                    batch = next(batches)
+                except StopIteration:
+                    exhausted = True
+                    continue
+            elif outstanding:
+                self._wait_done(inflight, outstanding, unreported, followups)
+                continue
+            else:
+                break
+
+            while get_max_pending() and\
+                    len(outstanding) >= get_max_pending():
+                self._wait_done(inflight, outstanding, unreported, followups)
+            self.task_queue.put((nbatches, fn_name, count_total, batch))
+            outstanding.add(nbatches)
+            nbatches += 1
+        logging.info('===WorkerPool: fn:[%s] items:[%s] batches:[%s]',
+                     fn_name, count_total, nbatches)
+
+        return self.running.value
+
+    def _wait_done(self, inflight, outstanding, unreported, followups):
+        """ _wait_done
+
+            Waits for a message from the processes and updates inflight,
+            outstanding and followups. A batch is only given up on if the
+            process running it died, or if it was never reported as begun
+            while a process died without reporting a batch and since then
+            (WAIT_SECS) no process is running any batch.
+            unreported = [number of such processes] (updated)
+        """
+        try:
+            status, pid, batch_nbr = self.done_queue.get(
+                timeout=self.WAIT_SECS)
+        except queue.Empty:
+            NPR.niceprint('===WorkerPool: Waited for {!s}s. '
+                          'Batches pending:[{!s}] running:[{!s}]'
+                          .format(self.WAIT_SECS,
+                                  len(outstanding), len(inflight)),
+                          verbosity=3, logalso=logging.INFO)
+            # Idle processes would have taken any batch still queued
+            if unreported[0] and outstanding and not inflight:
+                NPR.niceerror(caught=True,
+                              caughtprefix='xxx',
+                              caughtcode='006',
+                              caughtmsg='Lost track of [{!s}] batches.'
+                              .format(len(outstanding)),
+                              useniceprint=True)
+                outstanding.clear()
+            unreported[0] += self._check_workers(inflight, outstanding)
+            return
+
+        if status == 'begin':
+            inflight[pid] = batch_nbr
+            return
+
+        if status == 'more':
+            # batch_nbr = follow-up batches
+            followups.extend(batch_nbr)
+            return
+
+        inflight.pop(pid, None)
+        outstanding.discard(batch_nbr)
+
+    def shutdown(self):
+        """ shutdown
+
+            Stops all processes in the pool.
+        """
+        for _ in self.procs:
+            self.task_queue.put(None)
+        for proc_task in self.procs:
+            proc_task.join(timeout=60)
+            if proc_task.is_alive():
+                proc_task.terminate()
+            NPR.niceprint('==={!s} (is alive: {!s}).exitcode = {!s}'
+                          .format(proc_task.name,
+                                  proc_task.is_alive(),
+                                  proc_task.exitcode),
+                          verbosity=2)
+        self.procs = []
+        logging.warning('===WorkerPool: all processes stopped.')
+
+
 # -----------------------------------------------------------------------------
 # mprocessing
 #
-def mprocessing(nprocs, lockdb, running, mutex, itemslist, a_fn, cur):
+def mprocessing(nprocs, lockdb, running, mutex, itemslist, a_fn, cur,
+                batch_size=1, pool=None):
     """ mprocessing Function
 
     nprocs           = Number of processes to launch (int)
@@ -120,10 +539,19 @@ def mprocessing(nprocs, lockdb, running, mutex, itemslist, a_fn, cur):
                             lockdb
                             running
                             mutex
-                            splititemslist = partial splitted list
+                            splititemslist = iterable over the items
+                                             pulled on demand by the process
                             count_total    = len(itemslist)
                             cur
     cur              = cursor variable for DB access
+    batch_size       = Number of items pulled at once from the task queue.
+    pool             = WorkerPool to run a_fn (by name) in its processes
+                       instead of forking new ones. lockdb, running, mutex
+                       and cur are then those of the pool.
+
+    itemslist is placed on a shared task queue in batches of batch_size.
+    Each process pulls the next batch once it is done with the previous one
+    instead of working on a fixed chunk defined up front.
     """
     # proc_pool   = Local variable proc_pool for Pool of processes
     # log_level   = log_level
@@ -148,28 +576,11 @@ def mprocessing(nprocs, lockdb, running, mutex, itemslist, a_fn, cur):
 
     logging.debug('===Multiprocessing=== Logging defined!')
 
-    # ---------------------------------------------------------
-    # chunk
-    #
-    # Divides an iterable in slices/chunks of size size
-    #
-    def chunk(iter_list, size):
-        """
-            Divides an iterable in slices/chunks of size size
-
-            >>> for a in chunk([ 1, 2, 3, 4, 5, 6, 7, 8, 9, 10], 3):
-            ...     len(a)
-            3
-            3
-            3
-            1
-        """
-        iter_list = iter(iter_list)
-        # lambda: creates a returning expression function
-        # which returns slices
-        # iter, with the second argument () stops creating
-        # iterators when it reaches the end
-        return iter(lambda: tuple(islice(iter_list, size)), ())
+    if pool is not None:
+        xcount = pool.run(a_fn.__name__, itemslist, batch_size)
+        # Show number of total files processed
+        NPR.niceprocessedfiles(xcount, len(itemslist), True)
+        return True
 
     proc_pool = []
     lockdb = multiprocessing.Lock()
@@ -177,25 +588,22 @@ def mprocessing(nprocs, lockdb, running, mutex, itemslist, a_fn, cur):
     mutex = multiprocessing.Lock()
     count_total = len(itemslist)
 
-    size = (len(itemslist) // int(nprocs)) \
-        if ((len(itemslist) // int(nprocs)) > 0) \
-        else 1
+    task_queue = multiprocessing.Queue()
+    # Do not launch more processes than there are items to process
+    nworkers = min(int(nprocs), count_total)
 
-    logging.debug('len(itemslist):[%s] int(nprocs):[%s] size per process:[%s]',
-                  len(itemslist), int(nprocs), size)
+    logging.debug('len(itemslist):[%s] int(nprocs):[%s] '
+                  'workers:[%s] batch_size:[%s]',
+                  count_total, int(nprocs), nworkers, batch_size)
 
-    # Split itemslist in chunks to distribute accross Processes
-    for splititemslist in chunk(itemslist, size):
-        logging.warning('===Actual/Planned Chunk size: [%s]/[%s]',
-                        len(splititemslist), size)
-        logging.debug('===type(splititemslist)=[%s]', type(splititemslist))
+    for _ in range(nworkers):
         logging.debug('===Job/Task Process: Creating...')
         proc_task = multiprocessing.Process(
             target=a_fn,  # argument function
             args=(lockdb,
                   running,
                   mutex,
-                  splititemslist,
+                  TaskQueueIterator(task_queue),
                   count_total,
                   cur,))
         proc_pool.append(proc_task)
@@ -208,6 +616,15 @@ def mprocessing(nprocs, lockdb, running, mutex, itemslist, a_fn, cur):
                       verbosity=3,
                       logalso=logging.DEBUG)
 
+    # Processes are started before feeding the queue (no feeder thread
+    # is running while forking). Place itemslist in batches on the
+    # shared task queue followed by one end-of-work sentinel (None)
+    # per process.
+    for batch in chunk(itemslist, batch_size):
+        task_queue.put(batch)
+    for _ in range(nworkers):
+        task_queue.put(None)
+
     # Check status of jobs/tasks in the Process Pool
     if log_level <= logging.DEBUG:
         NPR.niceprint('===Checking Processes launched/status:',
@@ -249,6 +666,11 @@ def mprocessing(nprocs, lockdb, running, mutex, itemslist, a_fn, cur):
     logging.warning('===Multiprocessing=== pool joined! '
                     'All processes finished.')
 
+    # Release the queue. Do not wait on its feeder thread: should a process
+    # have died, its sentinel (or remaining items) are left unconsumed.
+    task_queue.close()
+    task_queue.cancel_join_thread()
+
     # Will release (set to None) the lockdb lock control
     # this prevents subsequent calls to
     # use_lock( nuLockDB, False)
@@ -8,6 +8,17 @@
 
     retry        = Helper function to run function calls multiple times on
                    error with Python Decorators.
+
+    TokenBucket  = Helper class to pace API calls across processes within a
+                   rate per second, a burst size and an hourly quota (on
+                   any rolling hour).
+
+    AdaptiveConcurrency = Helper class to adjust the number of simultaneous
+                   uploads (AIMD) from the outcome and latency of API calls.
+
+    CircuitBreaker = Helper class to pause the API calls of all processes
+                   after consecutive failures and resume them once a single
+                   probe call succeeds.
 """
 
 # -----------------------------------------------------------------------------
@@ -20,9 +31,12 @@ from __future__ import division    # This way: 3 / 2 == 1.5; 3 // 2 == 1
 # Import section
 #
 import logging
+import math
 import multiprocessing
 import time
 import random
+import contextlib
+import email.utils
 import sqlite3 as lite
 from functools import wraps
 import flickrapi
@@ -255,6 +269,664 @@ def rate_limited(max_per_second):
 #     print (num )
 
 
+# -----------------------------------------------------------------------------
+# class TokenBucket
+#
+# Token bucket on shared memory. To be created before the processes are
+# forked (multiprocessing) so all of them consume from the same bucket.
+#
+class TokenBucket(object):
+    """ TokenBucket
+
+        rate   = tokens added per second (0 = no limit per second)
+        burst  = max tokens kept, i.e. calls allowed at once after being idle
+        hourly = max tokens taken within any rolling hour (0 = no hourly
+                 quota). The times of the last hourly tokens are kept.
+
+        >>> import lib.rate_limited as rt
+        >>> abucket = rt.TokenBucket(rate=10, burst=2, hourly=0)
+        >>> abucket.consume()
+        0.0
+        >>> abucket.consume()
+        0.0
+        >>> abucket.consume() > 0
+        True
+        >>> abucket.get_cnt()
+        3
+
+        No more than hourly calls on any rolling hour, even after being
+        idle (with a patched clock):
+
+        >>> import bisect, time
+        >>> class Clock(object):
+        ...     now = 1000.0
+        ...     def time(self):
+        ...         return self.now
+        ...     def sleep(self, secs):  # oversleeps a bit, as sleep does
+        ...         self.now += secs + 0.001
+        >>> rt.time = clock = Clock()
+        >>> abucket = rt.TokenBucket(rate=5, burst=10, hourly=3600)
+        >>> calls = []
+        >>> for _ in range(3 * 3600):
+        ...     _ = abucket.consume()
+        ...     calls.append(clock.now)
+        >>> rt.time = time
+        >>> max(bisect.bisect_left(calls, start + 3600) - i
+        ...     for i, start in enumerate(calls))
+        3600
+        >>> calls[3600] - calls[0] >= 3600
+        True
+    """
+
+    # -------------------------------------------------------------------------
+    # class TokenBucket __init__
+    #
+    def __init__(self, rate=5, burst=10, hourly=3600, name='TB'):
+        self.name = name
+        self.rate = float(rate)
+        self.burst = float(max(burst, 1))
+        self.hourly = float(hourly)
+
+        # Instantiate control variables. Guarded by bucketlock.
+        #   hour_calls = ring with the time each of the last hourly tokens
+        #                was taken. hour_pos = the oldest one.
+        self.bucketlock = multiprocessing.Lock()
+        self.tokens = multiprocessing.Value('d', self.burst, lock=False)
+        self.hour_calls = multiprocessing.Array(
+            'd', [float('-inf')] * max(int(self.hourly), 1), lock=False)
+        self.hour_pos = multiprocessing.Value('i', 0, lock=False)
+        self.last_refill = multiprocessing.Value('d', time.time(), lock=False)
+        self.cnt = multiprocessing.Value('i', 0, lock=False)
+        self.waited = multiprocessing.Value('d', 0.0, lock=False)
+
+    def _refill(self, now):
+        """ _refill
+
+            Adds the tokens for the time elapsed since the last refill.
+        """
+        elapsed = max(now - self.last_refill.value, 0.0)
+        self.last_refill.value = now
+        if self.rate > 0:
+            self.tokens.value = min(self.burst,
+                                    self.tokens.value + elapsed * self.rate)
+
+    def _hour_slots(self, weight):
+        """ _hour_slots
+
+            Indexes on hour_calls of the (oldest) slots for weight tokens.
+        """
+        size = len(self.hour_calls)
+        return [(self.hour_pos.value + i) % size
+                for i in range(int(math.ceil(weight)))]
+
+    def _time_to_wait(self, weight, now):
+        """ _time_to_wait
+
+            Seconds until weight tokens are available on the bucket and
+            within the hourly quota: until the last of the oldest weight
+            tokens on hour_calls was taken an hour ago.
+        """
+        to_wait = 0.0
+        if self.rate > 0 and self.tokens.value < weight:
+            to_wait = (weight - self.tokens.value) / self.rate
+        if self.hourly > 0:
+            to_wait = max(to_wait,
+                          self.hour_calls[self._hour_slots(weight)[-1]] +
+                          3600 - now)
+        return to_wait
+
+    def consume(self, weight=1):
+        """ consume
+
+            Waits until weight tokens are available and takes them.
+            Sleeps outside of the lock so other processes may check in.
+            Returns the seconds waited.
+        """
+        # A weight above the capacity would never be available
+        weight = min(weight, self.burst)
+        if self.hourly > 0:
+            weight = min(weight, self.hourly)
+
+        waited = 0.0
+        while True:
+            self.bucketlock.acquire()
+            try:
+                now = time.time()
+                self._refill(now)
+                to_wait = self._time_to_wait(weight, now)
+                if to_wait <= 0:
+                    self.tokens.value -= weight
+                    if self.hourly > 0:
+                        slots = self._hour_slots(weight)
+                        for slot in slots:
+                            self.hour_calls[slot] = now
+                        self.hour_pos.value = \
+                            (slots[-1] + 1) % len(self.hour_calls)
+                    self.cnt.value += 1
+                    self.waited.value += waited
+                    return waited
+            except Exception as ex:
+                NPR.niceerror(caught=True,
+                              caughtprefix='+++Bucket',
+                              caughtcode='013',
+                              caughtmsg='Exception on TokenBucket: consume',
+                              exceptuse=True,
+                              exceptmsg=ex,
+                              useniceprint=False,
+                              exceptsysinfo=True)
+                raise
+            finally:
+                self.bucketlock.release()
+
+            time.sleep(to_wait)
+            waited += to_wait
+
+    def get_cnt(self):
+        """ get_cnt
+        """
+        return self.cnt.value
+
+    def get_waited(self):
+        """ get_waited
+        """
+        return self.waited.value
+
+
+# -----------------------------------------------------------------------------
+# API_BUCKET  = TokenBucket shared by all API calls (see configure_bucket)
+# API_WEIGHTS = Tokens taken by each API method (by name). Default is 1.
+#
+API_BUCKET = None
+API_WEIGHTS = {}
+
+
+# -----------------------------------------------------------------------------
+# configure_bucket
+#
+def configure_bucket(rate=5, burst=10, hourly=3600, weights=None):
+    """ configure_bucket
+
+        Creates the TokenBucket used by throttle. Must be called before
+        forking the worker processes.
+    """
+    global API_BUCKET  # pylint: disable=global-statement
+
+    API_BUCKET = TokenBucket(rate=rate, burst=burst, hourly=hourly,
+                             name='API')
+    API_WEIGHTS.clear()
+    API_WEIGHTS.update(weights if weights is not None else {})
+    logging.info('API bucket: rate:[%s] burst:[%s] hourly:[%s] weights:[%s]',
+                 rate, burst, hourly, API_WEIGHTS)
+
+
+# -----------------------------------------------------------------------------
+# throttle
+#
+def throttle(method_name):
+    """ throttle
+
+        Waits for the tokens (weight on API_WEIGHTS) of a call to the API
+        method_name. No wait if configure_bucket was not called.
+
+        >>> import lib.rate_limited as rt
+        >>> rt.throttle('upload')
+        0.0
+        >>> rt.configure_bucket(rate=10, burst=1, hourly=0,
+        ...                     weights={'upload': 3})
+        >>> rt.throttle('getInfo')
+        0.0
+        >>> rt.throttle('upload') > 0
+        True
+        >>> rt.API_BUCKET = None
+    """
+    if API_BUCKET is None:
+        return 0.0
+
+    waited = API_BUCKET.consume(API_WEIGHTS.get(method_name, 1))
+    if waited > 0:
+        logging.debug('___Bucket f():[%s] waited:[%.2f]s',
+                      method_name, waited)
+    return waited
+
+
+# -----------------------------------------------------------------------------
+# class AdaptiveConcurrency
+#
+# AIMD (additive increase, multiplicative decrease) controller on shared
+# memory. To be created before the processes are forked (multiprocessing).
+#
+class AdaptiveConcurrency(object):
+    """ AdaptiveConcurrency
+
+        Number of slots (simultaneous uploads) between min_slots and
+        max_slots. Starts at min_slots.
+            Each successful call adds 1/slots (i.e. +1 per round of calls).
+            A call failing with an overload error (see is_overload) or with
+            a latency above LATENCY_FACTOR times the usual latency halves
+            the slots. At most once every COOLDOWN seconds, as the calls
+            already running fail together.
+
+        >>> import lib.rate_limited as rt
+        >>> slots = rt.AdaptiveConcurrency(1, 4)
+        >>> slots.get_limit()
+        1
+        >>> for _ in range(7):
+        ...     slots.record(True, 0.2)
+        >>> slots.get_limit()
+        4
+        >>> slots.record(False, errcode='105')
+        >>> slots.get_limit()
+        2
+        >>> slots.record(False, errcode='1')  # Photo not found. No overload.
+        >>> slots.get_limit()
+        2
+    """
+
+    # LATENCY_FACTOR = Latency (average) above the usual latency times
+    #                  LATENCY_FACTOR signals an overload.
+    # LATENCY_ALPHA  = Weight of each call on the average latency.
+    # BASELINE_DRIFT = Rate at which the usual latency may grow per call.
+    # COOLDOWN       = Min seconds in between decreases.
+    LATENCY_FACTOR = 2.0
+    LATENCY_ALPHA = 0.2
+    BASELINE_DRIFT = 1.01
+    COOLDOWN = 10
+
+    # -------------------------------------------------------------------------
+    # class AdaptiveConcurrency __init__
+    #
+    def __init__(self, min_slots, max_slots, name='AC'):
+        self.name = name
+        self.min_slots = max(int(min_slots), 1)
+        self.max_slots = max(int(max_slots), self.min_slots)
+
+        # Instantiate control variables. Guarded by slotlock.
+        self.slotlock = multiprocessing.Lock()
+        self.limit = multiprocessing.Value('d', float(self.min_slots),
+                                           lock=False)
+        self.latency = multiprocessing.Value('d', 0.0, lock=False)
+        self.baseline = multiprocessing.Value('d', 0.0, lock=False)
+        self.last_decrease = multiprocessing.Value('d', 0.0, lock=False)
+
+    def _congested(self, success, latency, errcode):
+        """ _congested
+
+            Updates the average latency. True if the call signals an
+            overload.
+        """
+        if latency is not None:
+            if self.latency.value <= 0:
+                self.latency.value = latency
+            else:
+                self.latency.value += (self.LATENCY_ALPHA *
+                                       (latency - self.latency.value))
+            if self.baseline.value <= 0:
+                self.baseline.value = self.latency.value
+            else:
+                self.baseline.value = min(
+                    self.latency.value,
+                    self.baseline.value * self.BASELINE_DRIFT)
+
+            if (self.latency.value >
+                    self.LATENCY_FACTOR * self.baseline.value):
+                return True
+
+        return not success and is_overload(errcode)
+
+    def record(self, success, latency=None, errcode=None):
+        """ record
+
+            Records the outcome of a call to the API and adjusts the slots.
+            success = True/False
+            latency = seconds taken (None to not account for it, e.g. on
+                      uploads whose time depends on the size of the file)
+            errcode = error code reported by flickrapi (FlickrError.code)
+        """
+        self.slotlock.acquire()
+        try:
+            previous = self.get_limit()
+            if self._congested(success, latency, errcode):
+                now = time.time()
+                if now - self.last_decrease.value >= self.COOLDOWN:
+                    self.last_decrease.value = now
+                    self.limit.value = max(float(self.min_slots),
+                                           self.limit.value / 2)
+            elif success:
+                self.limit.value = min(float(self.max_slots),
+                                       self.limit.value +
+                                       1 / self.limit.value)
+            current = self.get_limit()
+        finally:
+            self.slotlock.release()
+
+        if current != previous:
+            logging.warning('___Slots name:[%s] slots:[%s]->[%s] '
+                            'latency:[%.2f] usual:[%.2f] errcode:[%s]',
+                            self.name, previous, current,
+                            self.latency.value, self.baseline.value, errcode)
+
+    def get_limit(self):
+        """ get_limit
+
+            Current number of slots (int).
+        """
+        return int(self.limit.value)
+
+
+# -----------------------------------------------------------------------------
+# is_overload
+#
+def is_overload(errcode):
+    """ is_overload
+
+        True for errors signaling Flickr is overloaded: IO/HTTP errors
+        (no code), 105 (Service currently unavailable), 106 (Write operation
+        failed). Other errors (e.g. 1 Photo not found) relate to the call.
+
+        >>> is_overload(None), is_overload('105'), is_overload(1)
+        (True, True, False)
+    """
+    return errcode is None or str(errcode) in ('105', '106')
+
+
+# -----------------------------------------------------------------------------
+# API_SLOTS      = AdaptiveConcurrency fed by all API calls
+#                  (see configure_concurrency)
+# UPLOAD_METHODS = API methods whose latency depends on the size of the file
+#
+API_SLOTS = None
+UPLOAD_METHODS = ('upload', 'replace')
+
+
+# -----------------------------------------------------------------------------
+# configure_concurrency
+#
+def configure_concurrency(min_slots, max_slots):
+    """ configure_concurrency
+
+        Creates the AdaptiveConcurrency fed by api_call. Must be called
+        before forking the worker processes.
+    """
+    global API_SLOTS  # pylint: disable=global-statement
+
+    API_SLOTS = AdaptiveConcurrency(min_slots, max_slots, name='API')
+    logging.info('API slots: min:[%s] max:[%s]',
+                 API_SLOTS.min_slots, API_SLOTS.max_slots)
+
+
+# -----------------------------------------------------------------------------
+# api_call
+#
+@contextlib.contextmanager
+def api_call(method_name):
+    """ api_call
+
+        Context manager for a call to the API method_name: waits while
+        API_BREAKER is open, waits for its tokens (throttle) and reports its
+        outcome and latency to API_SLOTS and API_BREAKER, if configured.
+        Exceptions are re-raised.
+
+        >>> import lib.rate_limited as rt
+        >>> rt.configure_concurrency(1, 2)
+        >>> with rt.api_call('getInfo'):
+        ...     pass
+        >>> rt.API_SLOTS.get_limit()
+        2
+        >>> rt.API_SLOTS = None
+    """
+    if API_BREAKER is not None:
+        API_BREAKER.wait()
+    throttle(method_name)
+    start = time.time()
+    try:
+        yield
+    except flickrapi.exceptions.FlickrError as flickr_ex:
+        report(False, errcode=flickr_ex.code)
+        raise
+    except Exception:
+        report(False)
+        raise
+    report(True,
+           None if method_name in UPLOAD_METHODS else time.time() - start)
+
+
+# -----------------------------------------------------------------------------
+# report
+#
+def report(success, latency=None, errcode=None):
+    """ report
+
+        Reports the outcome of an API call to API_SLOTS and API_BREAKER,
+        if configured. Only overload errors (see is_overload) count as a
+        failure for API_BREAKER: any other reply means Flickr is up.
+    """
+    if API_SLOTS is not None:
+        API_SLOTS.record(success, latency, errcode)
+    if API_BREAKER is not None:
+        API_BREAKER.record(success or not is_overload(errcode))
+
+
+# -----------------------------------------------------------------------------
+# class CircuitBreaker
+#
+# Circuit breaker on shared memory. To be created before the processes are
+# forked (multiprocessing).
+#
+class CircuitBreaker(object):
+    """ CircuitBreaker
+
+        failures = consecutive failures which open (trip) the breaker
+        pause    = seconds all calls wait once open. Then a single call
+                   goes through (probe): on success the breaker closes, on
+                   failure it opens again for another pause.
+
+        >>> import lib.rate_limited as rt
+        >>> breaker = rt.CircuitBreaker(failures=2, pause=0.2)
+        >>> breaker.record(False)
+        >>> breaker.is_open()
+        False
+        >>> breaker.record(False)
+        >>> breaker.is_open()
+        True
+        >>> breaker.wait() > 0  # The probe call
+        True
+        >>> breaker.record(True)
+        >>> breaker.is_open()
+        False
+        >>> breaker.wait()
+        0.0
+    """
+
+    CLOSED = 0
+    OPEN = 1
+    PROBING = 2
+
+    # -------------------------------------------------------------------------
+    # class CircuitBreaker __init__
+    #
+    def __init__(self, failures=5, pause=60, name='CB'):
+        self.name = name
+        self.failures = max(int(failures), 1)
+        self.pause = float(pause)
+
+        # Instantiate control variables. Guarded by breakerlock.
+        self.breakerlock = multiprocessing.Lock()
+        self.state = multiprocessing.Value('i', self.CLOSED, lock=False)
+        self.count = multiprocessing.Value('i', 0, lock=False)
+        self.opened_at = multiprocessing.Value('d', 0.0, lock=False)
+
+    def is_open(self):
+        """ is_open
+
+            True while calls are paused (open or probing).
+        """
+        return self.state.value != self.CLOSED
+
+    def wait(self):
+        """ wait
+
+            Waits while the breaker is open. Once pause elapsed, the first
+            process to check in carries out the probe call; the others keep
+            waiting for its outcome (or for another pause, in case the probe
+            never reports back). Returns the seconds waited.
+        """
+        waited = 0.0
+        while True:
+            self.breakerlock.acquire()
+            try:
+                if self.state.value == self.CLOSED:
+                    return waited
+                now = time.time()
+                to_wait = self.opened_at.value + self.pause - now
+                if to_wait <= 0:
+                    self.state.value = self.PROBING
+                    self.opened_at.value = now
+                    logging.warning('___Breaker name:[%s] probing after '
+                                    '[%.1f]s paused.', self.name, waited)
+                    return waited
+            finally:
+                self.breakerlock.release()
+
+            to_wait = min(to_wait, 1.0)
+            time.sleep(to_wait)
+            waited += to_wait
+
+    def record(self, success):
+        """ record
+
+            Records the outcome of a call. Opens the breaker on the
+            failures-th consecutive failure or on a failed probe. Closes it
+            on a success.
+        """
+        self.breakerlock.acquire()
+        try:
+            if success:
+                if self.state.value != self.CLOSED:
+                    logging.warning('___Breaker name:[%s] closed. Resuming.',
+                                    self.name)
+                self.state.value = self.CLOSED
+                self.count.value = 0
+                return
+
+            self.count.value += 1
+            if (self.state.value == self.PROBING or
+                    (self.state.value == self.CLOSED and
+                     self.count.value >= self.failures)):
+                self.state.value = self.OPEN
+                self.opened_at.value = time.time()
+                NPR.niceerror(caught=True,
+                              caughtprefix='xxxBreaker',
+                              caughtcode='027',
+                              caughtmsg='[{!s}] failures in a row. Pausing '
+                              'calls to Flickr for [{!s}]s.'
+                              .format(self.count.value, self.pause),
+                              useniceprint=False)
+        finally:
+            self.breakerlock.release()
+
+
+# -----------------------------------------------------------------------------
+# RETRY_SETTINGS = Backoff in between attempts (see configure_retry)
+#     factor   = waittime is multiplied by factor on each attempt
+#                (1 = fixed waittime)
+#     max_wait = max seconds to wait in between attempts
+# API_BREAKER    = CircuitBreaker fed by all API calls (see configure_retry)
+#
+RETRY_SETTINGS = {'factor': 2, 'max_wait': 300}
+API_BREAKER = None
+
+
+# -----------------------------------------------------------------------------
+# configure_retry
+#
+def configure_retry(factor=2, max_wait=300, failures=5, pause=60):
+    """ configure_retry
+
+        Sets the backoff in between attempts (RETRY_SETTINGS) and creates
+        the CircuitBreaker fed by api_call (failures = 0 for no breaker).
+        Must be called before forking the worker processes.
+    """
+    global API_BREAKER  # pylint: disable=global-statement
+
+    RETRY_SETTINGS.update(factor=max(factor, 1), max_wait=max_wait)
+    API_BREAKER = CircuitBreaker(failures=failures, pause=pause,
+                                 name='API')\
+        if failures > 0 else None
+    logging.info('Retry settings:[%s] breaker failures:[%s] pause:[%s]',
+                 RETRY_SETTINGS, failures, pause)
+
+
+# -----------------------------------------------------------------------------
+# backoff_delay
+#
+def backoff_delay(attempt, waittime, randtime=True, hint=None):
+    """ backoff_delay
+
+        Seconds to wait after the attempt-th (from 0) failed attempt:
+            waittime * factor ** attempt, up to max_wait (RETRY_SETTINGS).
+            Randomized from 0 (full jitter) if randtime or factor > 1, so
+            processes failing together do not retry together.
+            At least hint (e.g. from retry_after), if provided.
+
+        >>> import lib.rate_limited as rt
+        >>> rt.backoff_delay(3, 0)
+        0.0
+        >>> 0 <= rt.backoff_delay(3, 5) <= 40
+        True
+        >>> 0 <= rt.backoff_delay(20, 5) <= rt.RETRY_SETTINGS['max_wait']
+        True
+        >>> rt.backoff_delay(0, 5, hint=120)
+        120.0
+    """
+    delay = 0.0
+    if waittime > 0:
+        delay = min(float(RETRY_SETTINGS['max_wait']),
+                    float(waittime) * RETRY_SETTINGS['factor'] ** attempt)
+        if randtime or RETRY_SETTINGS['factor'] > 1:
+            delay = random.uniform(0, delay)
+    if hint is not None:
+        delay = max(delay, float(hint))
+    return delay
+
+
+# -----------------------------------------------------------------------------
+# retry_after
+#
+def retry_after(exc):
+    """ retry_after
+
+        Seconds to wait as per the Retry-After header of the HTTP response
+        attached to the exception exc (e.g. requests.HTTPError), if any.
+        Returns None otherwise.
+
+        >>> import lib.rate_limited as rt
+        >>> class Response(object):
+        ...     headers = {'Retry-After': '30'}
+        >>> class HTTPError(Exception):
+        ...     response = Response()
+        >>> rt.retry_after(HTTPError())
+        30.0
+        >>> rt.retry_after(ValueError()) is None
+        True
+    """
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+
+    value = headers.get('Retry-After')
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        # HTTP-date format
+        parsed = email.utils.parsedate_tz(value)
+        if parsed is None:
+            return None
+        return max(float(email.utils.mktime_tz(parsed) - time.time()), 0.0)
+
+
 # -----------------------------------------------------------------------------
 # retry
 #
@@ -262,13 +934,14 @@ def rate_limited(max_per_second):
 def retry(attempts=3, waittime=5, randtime=False):
     """
     Catches exceptions while running a supplied function
-    Re-runs it for "attempts" while sleeping "waittime" seconds in-between
-    "waititme" is randomized if "randtime" is True.
+    Re-runs it for "attempts" while sleeping in-between as per backoff_delay:
+    "waittime" seconds growing exponentially on each attempt, randomized
+    (full jitter) and at least as long as requested by the server.
     Outputs 3 types of errors (coming from the parameters)
 
     attempts = Max Number of Attempts
-    waittime = Wait time in between Attempts
-    randtime = Randomize the Wait time from 1 to randtime for each Attempt
+    waittime = Wait time in between Attempts (on the first one)
+    randtime = Randomize the Wait time from 0 to the Wait time
 
     >>> import lib.rate_limited as rt
     >>> @rt.retry(attempts=3, waittime=3, randtime=True)
@@ -323,15 +996,13 @@ def retry(attempts=3, waittime=5, randtime=False):
                                   a_fn.__name__)
                     error = err
 
-                logging.warning('___Function:[%s] Waiting:[%s] Rnd:[%s]',
-                                a_fn.__name__, waittime, randtime)
-                if randtime:
-                    rtime.sleep(random.randrange(0,
-                                                 (waittime + 1)
-                                                 if waittime >= 0
-                                                 else 1))
-                else:
-                    rtime.sleep(waittime if waittime >= 0 else 0)
+                if i + 1 >= attempts:
+                    break
+                delay = backoff_delay(i, waittime, randtime,
+                                      retry_after(error))
+                logging.warning('___Function:[%s] Waiting:[%.1f] Rnd:[%s]',
+                                a_fn.__name__, delay, randtime)
+                rtime.sleep(delay)
             logging.error('___Retry f():[%s] '
                           'Max:[%s] Delay:[%s] Rnd[%s]: Raising ERROR!',
                           a_fn.__name__, attempts, waittime, randtime)
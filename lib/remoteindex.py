@@ -0,0 +1,304 @@
+"""
+    by oPromessa, 2018
+    Published on https://github.com/oPromessa/flickr-uploader/
+
+    remoteindex = Helper functions for a local index of the pics on Flickr:
+                  checksum (from tag checksum:), title, tags and the
+                  titles of the Sets (Albums) each pic belongs to. Kept on
+                  the local DB tables remote_checksums and remote_photosets.
+                  Used by option --checksum-index to check if a file is
+                  already uploaded without a photos.search call per file.
+                  Table sync_state keeps the time of the last sync with
+                  Flickr (option --delta-sync).
+"""
+
+# -----------------------------------------------------------------------------
+# Import section for Python 2 and 3 compatible code
+# from __future__ import absolute_import, division, print_function,
+#    unicode_literals
+from __future__ import division    # This way: 3 / 2 == 1.5; 3 // 2 == 1
+
+# -----------------------------------------------------------------------------
+# Import section
+#
+import logging
+import lib.NicePrint as NicePrint
+import lib.SQLiteDBHelper as litedb
+
+# =========================================================================
+# Functions aliases
+#
+#   NPR.NicePrint = from NicePrint module
+# -------------------------------------------------------------------------
+NPR = NicePrint.NicePrint()
+
+# -------------------------------------------------------------------------
+# PER_PAGE     = Max number of pics returned per page by Flickr
+# SEARCH_LIMIT = Max number of pics photos.search returns for one query.
+#                Pages beyond are not reliable: the search is restarted from
+#                the last upload date seen.
+# SYNC_MARGIN  = Seconds before the last sync also pulled on the next one
+#                (clock differences with Flickr).
+#
+PER_PAGE = 500
+SEARCH_LIMIT = 4000
+SYNC_MARGIN = 300
+
+# -------------------------------------------------------------------------
+# STORE     = Records a pic on the index. qmarkargs: see store_args
+# STORE_SET = Records a pic as a member of a Set. (photo_id, set_title)
+#
+STORE = ('INSERT OR REPLACE INTO remote_checksums '
+         '(photo_id, checksum, title, tags) VALUES (?, ?, ?, ?)')
+STORE_SET = 'INSERT INTO remote_photosets (photo_id, set_title) VALUES (?, ?)'
+
+
+# -----------------------------------------------------------------------------
+# clean_tag
+#
+def clean_tag(raw_tag):
+    """ clean_tag
+
+        Tag as returned by Flickr on extras tags: lower case without
+        spaces or punctuation.
+
+        >>> clean_tag('album:"My Set 2"')
+        'albummyset2'
+    """
+    return ''.join(c for c in raw_tag.lower() if c.isalnum())
+
+
+# -----------------------------------------------------------------------------
+# checksum_from_tags
+#
+def checksum_from_tags(tags):
+    """ checksum_from_tags
+
+        Returns the checksum from the tag checksum:<md5> within the
+        (clean, space separated) tags of a pic. None if not found.
+
+        >>> checksum_from_tags('a checksum0123456789abcdef0123456789abcdef b')
+        '0123456789abcdef0123456789abcdef'
+        >>> checksum_from_tags('checksum albumx') is None
+        True
+    """
+    for tag in tags.split():
+        if tag.startswith('checksum') and len(tag) == len('checksum') + 32:
+            return str(tag[len('checksum'):])
+    return None
+
+
+# -----------------------------------------------------------------------------
+# store_args
+#
+def store_args(photo_id, checksum, title, setname):
+    """ store_args
+
+        qmarkargs of STORE for a pic uploaded with tags checksum:<checksum>
+        and album:"<setname>" (kept as Flickr returns them, see clean_tag).
+
+        >>> store_args(1, 'abc', 'pic', 'My Set')
+        ('1', 'abc', 'pic', 'checksumabc albummyset')
+    """
+    tags = ' '.join([clean_tag('checksum:{}'.format(checksum)),
+                     clean_tag('album:"{}"'.format(setname))])
+    return (str(photo_id), checksum, title, tags)
+
+
+# -----------------------------------------------------------------------------
+# lookup
+#
+def lookup(con, cur, nprocs, checksum):
+    """ lookup
+
+        Returns a list of (photo_id, title, tags, [set titles]) of the pics
+        on the index with checksum.
+
+        >>> import lib.SQLiteDBHelper as litedb
+        >>> con, cur = litedb.connect(':memory:')
+        >>> create_tables(con, cur, 0)
+        True
+        >>> _ = cur.executemany('INSERT INTO remote_checksums VALUES '
+        ...                     '(?, ?, ?, ?)',
+        ...                     [('1', 'abc', 'pic', 'checksumabc albumx'),
+        ...                      ('2', 'def', 'pic', '')])
+        >>> _ = cur.execute('INSERT INTO remote_photosets VALUES (?, ?)',
+        ...                 ('1', 'x'))
+        >>> lookup(con, cur, 0, 'abc')
+        [('1', 'pic', 'checksumabc albumx', ['x'])]
+        >>> lookup(con, cur, 0, 'xyz')
+        []
+        >>> litedb.close(con)
+    """
+    result = []
+    if not litedb.execute(con, 'SELECT#530:remoteindex',
+                          None, nprocs,  # No need for lock
+                          cur,
+                          'SELECT photo_id, title, tags '
+                          'FROM remote_checksums WHERE checksum = ?',
+                          qmarkargs=(checksum, ),
+                          dbcaughtcode='530'):
+        return result
+
+    for photo_id, title, tags in cur.fetchall():
+        set_titles = []
+        if litedb.execute(con, 'SELECT#531:remoteindex',
+                          None, nprocs,  # No need for lock
+                          cur,
+                          'SELECT set_title FROM remote_photosets '
+                          'WHERE photo_id = ?',
+                          qmarkargs=(photo_id, ),
+                          dbcaughtcode='531'):
+            set_titles = [row[0] for row in cur.fetchall()]
+        result.append((photo_id, title, tags, set_titles))
+
+    return result
+
+
+# -----------------------------------------------------------------------------
+# save
+#
+def save(con, cur, nprocs, pics, photosets):
+    """ save
+
+        Replaces the contents of the index in a single transaction.
+            pics      = list of (photo_id, checksum, title, tags)
+            photosets = list of (photo_id, set_title)
+        Returns True on success.
+    """
+    statements = [
+        ('DELETE#532:remoteindex', 'DELETE FROM remote_checksums',
+         [()], '532'),
+        ('DELETE#533:remoteindex', 'DELETE FROM remote_photosets',
+         [()], '533'),
+        ('INSERT#534:remoteindex', STORE, pics, '534'),
+        ('INSERT#535:remoteindex', STORE_SET, photosets, '535')]
+
+    _success = True
+    with litedb.transaction(con, 'INDEX#536:remoteindex',
+                            None, nprocs,  # No need for lock
+                            dbcaughtcode='536'):
+        for qry_name, statement, qmarkargs_list, dbcode in statements:
+            if not litedb.execute_many(con, qry_name, None, nprocs, cur,
+                                       statement, qmarkargs_list,
+                                       dbcaughtcode=dbcode):
+                _success = False
+                break
+
+    logging.info('remoteindex: saved pics:[%s] photosets:[%s] success:[%s]',
+                 len(pics), len(photosets), _success)
+    return _success
+
+
+# -----------------------------------------------------------------------------
+# create_tables
+#
+# Creates DB tables for remoteindex
+#
+def create_tables(con, cur, nprocs):
+    """ create_tables
+
+        Creates the tables remote_checksums and remote_photosets.
+        Returns True on success.
+    """
+    statements = [
+        ('CREATE#537:remoteindex',
+         'CREATE TABLE IF NOT EXISTS remote_checksums '
+         '(photo_id TEXT PRIMARY KEY, checksum TEXT, title TEXT, tags TEXT)',
+         '537'),
+        ('CREATE#538:remoteindex',
+         'CREATE INDEX IF NOT EXISTS remote_checksumsindex '
+         'ON remote_checksums (checksum)', '538'),
+        ('CREATE#539:remoteindex',
+         'CREATE TABLE IF NOT EXISTS remote_photosets '
+         '(photo_id TEXT, set_title TEXT)', '539'),
+        ('CREATE#540:remoteindex',
+         'CREATE INDEX IF NOT EXISTS remote_photosetsindex '
+         'ON remote_photosets (photo_id)', '540')]
+
+    for qry_name, statement, dbcode in statements:
+        if not litedb.execute(con, qry_name, None, nprocs, cur, statement,
+                              dbcaughtcode=dbcode):
+            return False
+
+    return True
+
+
+# -----------------------------------------------------------------------------
+# get_state
+#
+def get_state(con, cur, nprocs, key):
+    """ get_state
+
+        Returns the value of key on table sync_state. None if not found.
+
+        >>> import lib.SQLiteDBHelper as litedb
+        >>> con, cur = litedb.connect(':memory:')
+        >>> create_sync_tables(con, cur, 0)
+        True
+        >>> get_state(con, cur, 0, 'remote_sync') is None
+        True
+        >>> set_state(con, cur, 0, 'remote_sync', 1500000000)
+        True
+        >>> get_state(con, cur, 0, 'remote_sync')
+        1500000000
+        >>> litedb.close(con)
+    """
+    if not litedb.execute(con, 'SELECT#541:remoteindex',
+                          None, nprocs,  # No need for lock
+                          cur,
+                          'SELECT value FROM sync_state WHERE key = ?',
+                          qmarkargs=(key, ),
+                          dbcaughtcode='541'):
+        return None
+
+    row = cur.fetchone()
+    return row[0] if row is not None else None
+
+
+# -----------------------------------------------------------------------------
+# set_state
+#
+def set_state(con, cur, nprocs, key, value):
+    """ set_state
+
+        Records value of key on table sync_state. Returns True on success.
+    """
+    return litedb.execute(con, 'INSERT#542:remoteindex',
+                          None, nprocs,  # No need for lock
+                          cur,
+                          'INSERT OR REPLACE INTO sync_state (key, value) '
+                          'VALUES (?, ?)',
+                          qmarkargs=(key, value),
+                          dbcaughtcode='542')
+
+
+# -----------------------------------------------------------------------------
+# create_sync_tables
+#
+# Creates DB table for sync_state
+#
+def create_sync_tables(con, cur, nprocs):
+    """ create_sync_tables
+
+        Creates the table sync_state (high-water marks of the syncs with
+        Flickr, e.g. remote_sync). Returns True on success.
+    """
+    return litedb.execute(con, 'CREATE#543:remoteindex',
+                          None, nprocs, cur,
+                          'CREATE TABLE IF NOT EXISTS sync_state '
+                          '(key TEXT PRIMARY KEY, value)',
+                          dbcaughtcode='543')
+
+
+# -----------------------------------------------------------------------------
+# If called directly run doctests
+#
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.WARNING,
+                        format='[%(asctime)s]:[%(processName)-11s]' +
+                        '[%(levelname)-8s]:[%(name)s] %(message)s')
+
+    import doctest
+    doctest.testmod()
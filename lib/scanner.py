@@ -0,0 +1,634 @@
+"""
+    by oPromessa, 2018
+    Published on https://github.com/oPromessa/flickr-uploader/
+
+    scanner  = Helper class to scan FILES_DIR reusing the listing of
+               directories which did not change since the previous scan.
+               Directories mtime and listing are kept on the local DB
+               tables scandirs and scanentries.
+"""
+
+# -----------------------------------------------------------------------------
+# Import section for Python 2 and 3 compatible code
+# from __future__ import absolute_import, division, print_function,
+#    unicode_literals
+from __future__ import division    # This way: 3 / 2 == 1.5; 3 // 2 == 1
+
+# -----------------------------------------------------------------------------
+# Import section
+#
+import sys
+import logging
+import os
+import stat
+import time
+import re
+import threading
+import collections
+from multiprocessing.pool import ThreadPool
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+import lib.NicePrint as NicePrint
+import lib.SQLiteDBHelper as litedb
+
+# =========================================================================
+# Functions aliases
+#
+#   NPR.NicePrint = from NicePrint module
+# -------------------------------------------------------------------------
+NPR = NicePrint.NicePrint()
+
+# -------------------------------------------------------------------------
+# STABLE_SECS
+#
+# Directories modified less than STABLE_SECS ago may still be changing
+# (or changed within the mtime resolution). Their listing is not reused.
+#
+STABLE_SECS = 2
+
+
+# -------------------------------------------------------------------------
+# STAT_THREADS
+#
+# Minimum number of threads listing folders in find_missing.
+#
+STAT_THREADS = 8
+
+
+# -----------------------------------------------------------------------------
+# db_text
+#
+# Text from DB in the same type as returned by os.listdir
+#
+def db_text(astr):
+    """ db_text
+
+        On Python 2 DB text is returned as utf-8 encoded str
+        (text_factory = str) while FILES_DIR and its listing are unicode.
+        Returns astr decoded into unicode on Python 2, astr otherwise.
+    """
+    if sys.version_info < (3, ) and isinstance(astr, str):
+        return astr.decode('utf-8')
+    return astr
+
+
+# -----------------------------------------------------------------------------
+# list_dir
+#
+# Lists the contents of a directory
+#
+def list_dir(dirpath):
+    """ list_dir
+
+        Returns two lists with the contents of dirpath:
+            names of the sub directories (symlinks to directories included)
+            (name, size) of the files
+        Entries which can not be stat'ed (e.g. broken links) are skipped.
+        Uses os.scandir (or the scandir package) when available to reuse
+        the entries type (and stat on Windows) from the listing.
+
+        >>> import tempfile
+        >>> adir = tempfile.mkdtemp()
+        >>> os.mkdir(os.path.join(adir, 'sub'))
+        >>> with open(os.path.join(adir, 'a.jpg'), 'w') as afile:
+        ...     _ = afile.write('abc')
+        >>> list_dir(adir)
+        (['sub'], [('a.jpg', 3)])
+    """
+    if scandir is not None:
+        return _scan_dir(dirpath)
+
+    dirnames = []
+    files = []
+    for name in sorted(os.listdir(dirpath)):
+        try:
+            st_entry = os.stat(os.path.join(dirpath, name))
+        except OSError as err:
+            logging.warning('list_dir: skipping [%s]: [%s]',
+                            NPR.strunicodeout(name), err)
+            continue
+        if stat.S_ISDIR(st_entry.st_mode):
+            dirnames.append(name)
+        else:
+            files.append((name, st_entry.st_size))
+
+    return dirnames, files
+
+
+# -----------------------------------------------------------------------------
+# _scan_dir
+#
+# list_dir using scandir
+#
+def _scan_dir(dirpath):
+    """ _scan_dir
+
+        list_dir using scandir. Sub directories are identified without a
+        stat call (except for symlinks).
+    """
+    dirnames = []
+    files = []
+    entries = scandir(dirpath)
+    try:
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    dirnames.append(entry.name)
+                else:
+                    files.append((entry.name, entry.stat().st_size))
+            except OSError as err:
+                logging.warning('list_dir: skipping [%s]: [%s]',
+                                NPR.strunicodeout(entry.name), err)
+    finally:
+        # scandir iterator close is only available from Python 3.6
+        if hasattr(entries, 'close'):
+            entries.close()
+
+    dirnames.sort()
+    files.sort()
+    return dirnames, files
+
+
+# -----------------------------------------------------------------------------
+# split_path
+#
+def split_path(path):
+    """ split_path
+
+        List of the non empty components of path (either separator).
+
+        >>> split_path('/a//b/c/')
+        ['a', 'b', 'c']
+    """
+    return [part for part in re.split(r'[\\/]', path) if part]
+
+
+# -----------------------------------------------------------------------------
+# class ExclusionMatcher
+#
+# EXCLUDED_FOLDERS and IGNORED_REGEX compiled once.
+#
+class ExclusionMatcher(object):
+    """ ExclusionMatcher
+
+        excluded_folders = folder names (or relative paths, like a/b)
+                           (EXCLUDED_FOLDERS)
+        ignored_regex    = compiled regular expressions searched on file
+                           names (IGNORED_REGEX)
+        top_dir          = folder the paths to check are within (FILES_DIR).
+                           Only their components below top_dir are matched.
+
+        Folders are kept on a trie of path components: checking a path
+        costs one lookup per component regardless of the number of
+        folders. The regular expressions are combined into a single one.
+
+        >>> matcher = ExclusionMatcher(['@eaDir', 'a/b'],
+        ...                            [re.compile('^IMG_[0-8]'),
+        ...                             re.compile('Ignore')])
+        >>> matcher.is_excluded_dir('/pics/x/@eaDir')
+        True
+        >>> matcher.is_excluded_dir('/pics/a/x/b')
+        False
+        >>> matcher.is_excluded('/pics/x/a/b/c/photo.jpg')
+        True
+        >>> matcher.is_excluded('/pics/x/b/photo.jpg')
+        False
+        >>> [matcher.is_ignored(name)
+        ...  for name in ['IMG_1.jpg', 'IMG_9.jpg', 'toIgnore.jpg']]
+        [True, False, True]
+
+        The components of top_dir itself are not matched:
+
+        >>> matcher = ExclusionMatcher(['Originals'], [],
+        ...                            top_dir='/mnt/Originals/2018')
+        >>> matcher.is_excluded_dir('/mnt/Originals/2018')
+        False
+        >>> matcher.is_excluded('/mnt/Originals/2018/05/photo.jpg')
+        False
+        >>> matcher.is_excluded_dir('/mnt/Originals/2018/05/Originals/x')
+        True
+    """
+
+    # Marks the end of a folder on the trie
+    LEAF = None
+
+    def __init__(self, excluded_folders, ignored_regex, top_dir=None):
+        """ class ExclusionMatcher __init__
+        """
+        self.top_parts = split_path(os.path.normpath(top_dir))\
+            if top_dir else []
+        self.trie = {}
+        for folder in excluded_folders:
+            node = self.trie
+            for part in split_path(folder):
+                node = node.setdefault(part, {})
+            if node is not self.trie:
+                node[self.LEAF] = True
+
+        self.ignored = None
+        if ignored_regex:
+            try:
+                self.ignored = [re.compile(
+                    '|'.join('(?:{!s})'.format(regex.pattern)
+                             for regex in ignored_regex),
+                    re.UNICODE)]
+            except re.error:
+                # e.g. back references: keep them apart
+                self.ignored = list(ignored_regex)
+
+        logging.info('ExclusionMatcher: folders:[%s] regex:[%s]',
+                     len(excluded_folders), len(ignored_regex))
+
+    def is_excluded_dir(self, dirpath):
+        """ is_excluded_dir
+
+            True if dirpath is (or is within) an excluded folder below
+            top_dir.
+        """
+        parts = split_path(os.path.normpath(dirpath))
+        if self.top_parts and \
+                parts[:len(self.top_parts)] == self.top_parts:
+            parts = parts[len(self.top_parts):]
+        for start in range(len(parts)):
+            node = self.trie
+            for part in parts[start:]:
+                node = node.get(part)
+                if node is None:
+                    break
+                if self.LEAF in node:
+                    return True
+
+        return False
+
+    def is_excluded(self, path):
+        """ is_excluded
+
+            True if the file path is within an excluded folder.
+        """
+        return self.is_excluded_dir(os.path.dirname(path))
+
+    def is_ignored(self, name):
+        """ is_ignored
+
+            True if the file name matches IGNORED_REGEX.
+        """
+        return self.ignored is not None and any(
+            regex.search(name) for regex in self.ignored)
+
+
+# -----------------------------------------------------------------------------
+# class ScanIndex
+#
+# Directory listing index persisted on the local DB.
+#
+class ScanIndex(object):
+    """ ScanIndex
+
+        Walks a folder tree listing only the directories whose mtime changed
+        since the previous scan (as recorded on the DB). Unchanged
+        directories are served from the DB. Adding, removing or renaming a
+        file changes its directory mtime, rewriting a file in place does
+        not: the size of such a file is the one from the previous listing.
+
+        con, cur  = DB connection and cursor (tables scandirs/scanentries)
+        nprocs    = >0 when in multiprocessing mode
+        full_scan = True: list all directories (and refresh the index)
+        threads   = >1 lists directories in parallel with as many threads
+
+        >>> import tempfile
+        >>> import lib.SQLiteDBHelper as litedb
+        >>> adir = tempfile.mkdtemp()
+        >>> os.mkdir(os.path.join(adir, 'sub'))
+        >>> with open(os.path.join(adir, 'sub', 'a.jpg'), 'w') as afile:
+        ...     _ = afile.write('abc')
+        >>> past = time.time() - 60
+        >>> for apath in [adir, os.path.join(adir, 'sub')]:
+        ...     os.utime(apath, (past, past))
+        >>> con, cur = litedb.connect(':memory:')
+        >>> create_tables(con, cur, 0)
+        True
+        >>> scan = ScanIndex(con, cur, 0)
+        >>> [(os.path.relpath(d, adir), f) for d, _, f in scan.walk(adir)]
+        [('.', []), ('sub', [('a.jpg', 3)])]
+        >>> scan.save()
+        True
+        >>> scan = ScanIndex(con, cur, 0)
+        >>> [(os.path.relpath(d, adir), f) for d, _, f in scan.walk(adir)]
+        [('.', []), ('sub', [('a.jpg', 3)])]
+        >>> scan.hits, scan.misses
+        (2, 0)
+        >>> scan = ScanIndex(con, cur, 0, full_scan=True, threads=4)
+        >>> sorted((os.path.relpath(d, adir), f)
+        ...        for d, _, f in scan.walk(adir))
+        [('.', []), ('sub', [('a.jpg', 3)])]
+        >>> scan.hits, scan.misses
+        (0, 2)
+        >>> litedb.close(con)
+    """
+
+    def __init__(self, con, cur, nprocs, full_scan=False, threads=1):
+        """ class ScanIndex __init__
+
+            Loads the index from the DB.
+        """
+        self.con = con
+        self.cur = cur
+        self.nprocs = nprocs
+        self.full_scan = full_scan
+        self.threads = threads
+        # Protects changed, visited, hits and misses from listdir threads
+        self.lock = threading.Lock()
+        # dirs = dirpath: mtime from DB
+        # entries = dirpath: (dirnames, files) from DB
+        # changed = dirpath: (mtime, dirnames, files) listed on this scan
+        self.dirs = {}
+        self.entries = {}
+        self.changed = {}
+        self.visited = set()
+        self.hits = 0
+        self.misses = 0
+
+        if not full_scan:
+            self.load()
+
+    def load(self):
+        """ load
+
+            Reads the index from the DB.
+        """
+        if litedb.execute(self.con, 'SELECT#500:scanner',
+                          None, self.nprocs,  # No need for lock
+                          self.cur,
+                          'SELECT path, mtime FROM scandirs',
+                          dbcaughtcode='500'):
+            self.dirs = dict((db_text(dirpath), mtime)
+                             for dirpath, mtime in self.cur.fetchall())
+
+        if litedb.execute(self.con, 'SELECT#501:scanner',
+                          None, self.nprocs,  # No need for lock
+                          self.cur,
+                          'SELECT dirpath, name, size, isdir '
+                          'FROM scanentries',
+                          dbcaughtcode='501'):
+            for dirpath, name, size, isdir in self.cur.fetchall():
+                dirnames, files = self.entries.setdefault(db_text(dirpath),
+                                                          ([], []))
+                if isdir:
+                    dirnames.append(db_text(name))
+                else:
+                    files.append((db_text(name), size))
+
+        logging.info('ScanIndex: loaded [%s] directories.', len(self.dirs))
+
+    def listdir(self, dirpath):
+        """ listdir
+
+            Returns (dirnames, files) of dirpath like list_dir. Reuses the
+            listing from the DB if dirpath mtime did not change.
+            Returns (None, None) if dirpath can not be listed.
+        """
+        with self.lock:
+            self.visited.add(dirpath)
+        try:
+            mtime = os.stat(dirpath).st_mtime
+            if (not self.full_scan and
+                    dirpath in self.dirs and
+                    self.dirs[dirpath] == mtime):
+                with self.lock:
+                    self.hits += 1
+                dirnames, files = self.entries.get(dirpath, ([], []))
+                return list(dirnames), list(files)
+
+            dirnames, files = list_dir(dirpath)
+        except OSError as err:
+            NPR.niceerror(caught=True,
+                          caughtprefix='+++ ',
+                          caughtcode='502',
+                          caughtmsg='Not able to list folder [{!s}]: [{!s}]'
+                          .format(NPR.strunicodeout(dirpath), err),
+                          useniceprint=True)
+            return None, None
+
+        # Do not reuse next time the listing of a directory still changing
+        if time.time() - mtime < STABLE_SECS:
+            mtime = None
+        with self.lock:
+            self.misses += 1
+            self.changed[dirpath] = (mtime, dirnames, files)
+
+        return list(dirnames), list(files)
+
+    def walk(self, top):
+        """ walk
+
+            Similar to os.walk(top, followlinks=True) yielding
+            (dirpath, dirnames, files) with files as a list of (name, size).
+            Clearing dirnames (in place) prevents walking into them.
+            With threads > 1 sub directories are listed in parallel (useful
+            on network shares) and yielded breadth first.
+        """
+        if self.threads > 1:
+            for result in self._walk_threaded(top):
+                yield result
+            return
+
+        stack = [top]
+        while stack:
+            dirpath = stack.pop()
+            dirnames, files = self.listdir(dirpath)
+            if dirnames is None:
+                continue
+
+            yield dirpath, dirnames, files
+
+            for name in reversed(dirnames):
+                stack.append(os.path.join(dirpath, name))
+
+    def _walk_threaded(self, top):
+        """ _walk_threaded
+
+            walk listing directories with a pool of threads. Sub directories
+            are only submitted once the caller had a chance to prune them.
+        """
+        pool = ThreadPool(self.threads)
+        try:
+            pending = collections.deque(
+                [(top, pool.apply_async(self.listdir, (top, )))])
+            while pending:
+                dirpath, result = pending.popleft()
+                dirnames, files = result.get()
+                if dirnames is None:
+                    continue
+
+                yield dirpath, dirnames, files
+
+                for name in dirnames:
+                    subdir = os.path.join(dirpath, name)
+                    pending.append(
+                        (subdir, pool.apply_async(self.listdir, (subdir, ))))
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def save(self):
+        """ save
+
+            Records on the DB the directories listed on this scan and
+            removes those no longer found. Single transaction.
+        """
+        vanished = [(dirpath,) for dirpath in self.dirs
+                    if dirpath not in self.visited]
+        refresh = [(dirpath,) for dirpath in self.changed] + vanished
+
+        logging.info('ScanIndex: hits:[%s] misses:[%s] vanished:[%s]',
+                     self.hits, self.misses, len(vanished))
+
+        statements = [
+            ('DELETE#504:scanner',
+             'DELETE FROM scanentries WHERE dirpath = ?',
+             refresh, '504'),
+            ('DELETE#505:scanner',
+             'DELETE FROM scandirs WHERE path = ?',
+             vanished, '505'),
+            ('INSERT#506:scanner',
+             'INSERT OR REPLACE INTO scandirs (path, mtime) VALUES (?, ?)',
+             [(dirpath, mtime)
+              for dirpath, (mtime, _, _) in self.changed.items()], '506'),
+            ('INSERT#507:scanner',
+             'INSERT INTO scanentries (dirpath, name, size, isdir) '
+             'VALUES (?, ?, ?, ?)',
+             self._changed_entries(), '507')]
+
+        _success = True
+        with litedb.transaction(self.con, 'SCAN#503:scanner',
+                                None, self.nprocs,  # No need for lock
+                                dbcaughtcode='503'):
+            for qry_name, statement, qmarkargs_list, dbcode in statements:
+                if not litedb.execute_many(self.con, qry_name,
+                                           None, self.nprocs,
+                                           self.cur,
+                                           statement,
+                                           qmarkargs_list,
+                                           dbcaughtcode=dbcode):
+                    _success = False
+                    break
+
+        return _success
+
+    def _changed_entries(self):
+        """ _changed_entries
+
+            Generates (dirpath, name, size, isdir) for each entry listed.
+        """
+        for dirpath, (_, dirnames, files) in self.changed.items():
+            for name in dirnames:
+                yield (dirpath, name, None, 1)
+            for name, size in files:
+                yield (dirpath, name, size, 0)
+
+
+# -----------------------------------------------------------------------------
+# find_missing
+#
+# Checks which files no longer exist
+#
+def find_missing(paths, threads=1):
+    """ find_missing
+
+        Returns the set of paths (files) which no longer exist. Each folder
+        is listed once instead of a stat per file. With threads > 1 folders
+        are listed in parallel (useful on network shares).
+
+        >>> import tempfile
+        >>> adir = tempfile.mkdtemp()
+        >>> with open(os.path.join(adir, 'a.jpg'), 'w') as afile:
+        ...     _ = afile.write('abc')
+        >>> sorted(os.path.relpath(path, adir) for path in find_missing(
+        ...     [os.path.join(adir, 'a.jpg'),
+        ...      os.path.join(adir, 'b.jpg'),
+        ...      os.path.join(adir, 'sub', 'c.jpg')], threads=2))
+        ['b.jpg', 'sub/c.jpg']
+    """
+    names_by_dir = {}
+    for path in paths:
+        dirpath, name = os.path.split(path)
+        names_by_dir.setdefault(dirpath, []).append(name)
+
+    def missing_in(dirpath):
+        """ missing_in
+
+            Paths of the files on dirpath not found on its listing.
+        """
+        names = names_by_dir[dirpath]
+        try:
+            found = set(os.listdir(dirpath))
+        except OSError:
+            # Folder removed (or not listable): check each file
+            return [os.path.join(dirpath, name) for name in names
+                    if not os.path.isfile(os.path.join(dirpath, name))]
+        return [os.path.join(dirpath, name) for name in names
+                if name not in found]
+
+    missing = set()
+    if threads > 1 and len(names_by_dir) > 1:
+        pool = ThreadPool(threads)
+        try:
+            for dir_missing in pool.imap_unordered(missing_in, names_by_dir):
+                missing.update(dir_missing)
+        finally:
+            pool.terminate()
+            pool.join()
+    else:
+        for dirpath in names_by_dir:
+            missing.update(missing_in(dirpath))
+
+    logging.info('find_missing: folders:[%s] missing:[%s]',
+                 len(names_by_dir), len(missing))
+    return missing
+
+
+# -----------------------------------------------------------------------------
+# create_tables
+#
+# Creates DB tables for ScanIndex
+#
+def create_tables(con, cur, nprocs):
+    """ create_tables
+
+        Creates the tables scandirs and scanentries. Returns True on success.
+    """
+    statements = [
+        ('CREATE#508:scanner',
+         'CREATE TABLE IF NOT EXISTS scandirs '
+         '(path TEXT PRIMARY KEY, mtime REAL)', '508'),
+        ('CREATE#509:scanner',
+         'CREATE TABLE IF NOT EXISTS scanentries '
+         '(dirpath TEXT, name TEXT, size INT, isdir INT)', '509'),
+        ('CREATE#510:scanner',
+         'CREATE INDEX IF NOT EXISTS scanentriesindex '
+         'ON scanentries (dirpath)', '510')]
+
+    for qry_name, statement, dbcode in statements:
+        if not litedb.execute(con, qry_name, None, nprocs, cur, statement,
+                              dbcaughtcode=dbcode):
+            return False
+
+    return True
+
+
+# -----------------------------------------------------------------------------
+# If called directly run doctests
+#
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.WARNING,
+                        format='[%(asctime)s]:[%(processName)-11s]' +
+                        '[%(levelname)-8s]:[%(name)s] %(message)s')
+
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,165 @@
+"""
+    by oPromessa, 2018
+    Published on https://github.com/oPromessa/flickr-uploader/
+
+    tickets = Helper functions for the asynchronous uploads (option
+              --async-upload). Flickr replies to an asynchronous upload with
+              a ticket instead of the photo id. Tickets are kept on the local
+              DB table pending_tickets until flickr.photos.upload.checkTickets
+              reports them as complete (or failed).
+"""
+
+# -----------------------------------------------------------------------------
+# Import section for Python 2 and 3 compatible code
+# from __future__ import absolute_import, division, print_function,
+#    unicode_literals
+from __future__ import division    # This way: 3 / 2 == 1.5; 3 // 2 == 1
+
+# -----------------------------------------------------------------------------
+# Import section
+#
+import logging
+import lib.NicePrint as NicePrint
+import lib.SQLiteDBHelper as litedb
+
+# =========================================================================
+# Functions aliases
+#
+#   NPR.NicePrint = from NicePrint module
+# -------------------------------------------------------------------------
+NPR = NicePrint.NicePrint()
+
+# -------------------------------------------------------------------------
+# PER_CALL  = Max number of tickets checked per checkTickets call
+# POLL_SECS = Seconds in between checks of the pending tickets
+# WAIT_SECS = Max seconds to wait for the pending tickets at the end of an
+#             upload. Tickets still pending are checked on the next run.
+#
+PER_CALL = 100
+POLL_SECS = 10
+WAIT_SECS = 600
+
+# -------------------------------------------------------------------------
+# Ticket status as per checkTickets (attribute complete)
+#
+PENDING = '0'
+COMPLETE = '1'
+FAILED = '2'
+
+# -------------------------------------------------------------------------
+# Statements to record/remove a ticket. To be run by the caller (e.g.
+# via the DBWriter in multiprocessing mode).
+#
+STORE = ('INSERT OR REPLACE INTO pending_tickets '
+         '(ticket_id, path, md5, last_modified) VALUES (?, ?, ?, ?)')
+DELETE = 'DELETE FROM pending_tickets WHERE ticket_id = ?'
+
+
+# -----------------------------------------------------------------------------
+# ticket_from_upload
+#
+def ticket_from_upload(uploadresp):
+    """ ticket_from_upload
+
+        Returns the ticket id from the response of an asynchronous upload.
+        None if not found.
+
+        >>> import xml.etree.ElementTree as ET
+        >>> ticket_from_upload(ET.fromstring(
+        ...     '<rsp stat="ok"><ticketid>1234-abcd</ticketid></rsp>'))
+        '1234-abcd'
+        >>> ticket_from_upload(ET.fromstring('<rsp stat="ok" />')) is None
+        True
+    """
+    ticket = uploadresp.find('ticketid')
+    return None if ticket is None else str(ticket.text)
+
+
+# -----------------------------------------------------------------------------
+# parse_check
+#
+def parse_check(res):
+    """ parse_check
+
+        Returns a list of (ticket_id, status, photo_id) from the response of
+        flickr.photos.upload.checkTickets. Invalid (unknown) tickets are
+        reported as FAILED.
+
+        >>> import xml.etree.ElementTree as ET
+        >>> parse_check(ET.fromstring(
+        ...     '<rsp stat="ok"><uploader>'
+        ...     '<ticket id="1" complete="1" photoid="99" />'
+        ...     '<ticket id="2" complete="0" />'
+        ...     '<ticket id="3" invalid="1" />'
+        ...     '</uploader></rsp>'))
+        [('1', '1', '99'), ('2', '0', None), ('3', '2', None)]
+    """
+    result = []
+    for ticket in res.iter('ticket'):
+        status = FAILED\
+            if ticket.attrib.get('invalid') == '1'\
+            else ticket.attrib.get('complete', PENDING)
+        result.append((ticket.attrib['id'],
+                       status,
+                       ticket.attrib.get('photoid')))
+    return result
+
+
+# -----------------------------------------------------------------------------
+# pending
+#
+def pending(con, cur, nprocs):
+    """ pending
+
+        Returns a dict ticket_id: (path, md5, last_modified) of the tickets
+        on pending_tickets.
+
+        >>> import lib.SQLiteDBHelper as litedb
+        >>> con, cur = litedb.connect(':memory:')
+        >>> create_tables(con, cur, 0)
+        True
+        >>> _ = cur.execute(STORE, ('t1', 'a.mp4', 'abc', 1.0))
+        >>> pending(con, cur, 0)
+        {'t1': ('a.mp4', 'abc', 1.0)}
+        >>> litedb.close(con)
+    """
+    if not litedb.execute(con, 'SELECT#550:tickets',
+                          None, nprocs,  # No need for lock
+                          cur,
+                          'SELECT ticket_id, path, md5, last_modified '
+                          'FROM pending_tickets',
+                          dbcaughtcode='550'):
+        return {}
+
+    return dict((row[0], tuple(row[1:])) for row in cur.fetchall())
+
+
+# -----------------------------------------------------------------------------
+# create_tables
+#
+# Creates DB table for pending_tickets
+#
+def create_tables(con, cur, nprocs):
+    """ create_tables
+
+        Creates the table pending_tickets. Returns True on success.
+    """
+    return litedb.execute(con, 'CREATE#551:tickets',
+                          None, nprocs, cur,
+                          'CREATE TABLE IF NOT EXISTS pending_tickets '
+                          '(ticket_id TEXT PRIMARY KEY, path TEXT, '
+                          'md5 TEXT, last_modified REAL)',
+                          dbcaughtcode='551')
+
+
+# -----------------------------------------------------------------------------
+# If called directly run doctests
+#
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.WARNING,
+                        format='[%(asctime)s]:[%(processName)-11s]' +
+                        '[%(levelname)-8s]:[%(name)s] %(message)s')
+
+    import doctest
+    doctest.testmod()
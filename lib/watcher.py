@@ -0,0 +1,500 @@
+"""
+    by oPromessa, 2018
+    Published on https://github.com/oPromessa/flickr-uploader/
+
+    watcher  = Helper classes to watch FILES_DIR for new or changed files.
+               Uses Linux inotify (via ctypes) when available. Otherwise
+               falls back to polling the folders.
+"""
+
+# -----------------------------------------------------------------------------
+# Import section for Python 2 and 3 compatible code
+# from __future__ import absolute_import, division, print_function,
+#    unicode_literals
+from __future__ import division    # This way: 3 / 2 == 1.5; 3 // 2 == 1
+
+# -----------------------------------------------------------------------------
+# Import section
+#
+import sys
+import logging
+import os
+import errno
+import select
+import struct
+import time
+import ctypes
+import ctypes.util
+import lib.NicePrint as NicePrint
+import lib.scanner as scanner
+
+# =========================================================================
+# Functions aliases
+#
+#   NPR.NicePrint = from NicePrint module
+# -------------------------------------------------------------------------
+NPR = NicePrint.NicePrint()
+
+# -------------------------------------------------------------------------
+# SETTLE_SECS  = A file is only reported once its size and mtime did not
+#                change for SETTLE_SECS (file still being copied/written).
+# POLL_SECS    = Interval between scans of PollingWatcher.
+#
+SETTLE_SECS = 5
+POLL_SECS = 10
+
+# -------------------------------------------------------------------------
+# inotify constants (from sys/inotify.h)
+#
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+IN_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+# struct inotify_event: int wd; uint32_t mask, cookie, len; char name[]
+EVENT_HEADER = struct.Struct('iIII')
+
+
+# -----------------------------------------------------------------------------
+# class Watcher
+#
+# Common code to InotifyWatcher and PollingWatcher.
+#
+class Watcher(object):
+    """ Watcher
+
+        Tracks candidate files until they settle: a file is only reported
+        once its size and mtime did not change for settle seconds.
+        Subclasses implement collect(timeout) calling touch for each file
+        possibly new or changed.
+
+        top        = folder to watch
+        exclusions = scanner.ExclusionMatcher of the folders not to be
+                     watched (EXCLUDED_FOLDERS). None: watch all folders.
+        settle     = seconds a file must stay unchanged to be reported
+
+        needs_rescan is set to True when changes may have been missed
+        (e.g. inotify queue overflow). Caller should then do a full scan.
+
+        >>> import tempfile
+        >>> adir = tempfile.mkdtemp()
+        >>> afile = os.path.join(adir, 'a.jpg')
+        >>> with open(afile, 'w') as fileobj:
+        ...     _ = fileobj.write('abc')
+        >>> watch = Watcher(adir, None, settle=0)
+        >>> watch.touch(afile)
+        >>> watch.touch(os.path.join(adir, 'gone.jpg'))
+        >>> watch.settled() == [afile]
+        True
+        >>> watch.settled()
+        []
+        >>> watch = Watcher(adir, None, settle=60)
+        >>> watch.touch(afile)
+        >>> watch.settled()
+        []
+    """
+
+    def __init__(self, top, exclusions, settle=SETTLE_SECS):
+        """ class Watcher __init__
+        """
+        self.top = top
+        self.exclusions = exclusions
+        self.settle = settle
+        self.needs_rescan = False
+        # pending = path: ((size, mtime), time of last change)
+        self.pending = {}
+
+    def is_excluded(self, dirpath):
+        """ is_excluded
+
+            True if folder dirpath is (or is within) an excluded folder.
+        """
+        return self.exclusions is not None and\
+            self.exclusions.is_excluded_dir(dirpath)
+
+    def touch(self, path):
+        """ touch
+
+            Registers path as possibly new or changed.
+        """
+        logging.debug('Watcher: candidate:[%s]', NPR.strunicodeout(path))
+        self.pending[path] = (None, time.time())
+
+    def settled(self):
+        """ settled
+
+            Returns the sorted list of pending files which did not change
+            for settle seconds. Files which no longer exist are discarded.
+        """
+        now = time.time()
+        result = []
+        for path, (last_stat, changed_at) in list(self.pending.items()):
+            try:
+                st_file = os.stat(path)
+            except OSError:
+                del self.pending[path]
+                continue
+
+            cur_stat = (st_file.st_size, st_file.st_mtime)
+            if cur_stat != last_stat:
+                changed_at = now
+                self.pending[path] = (cur_stat, changed_at)
+            if now - changed_at < self.settle:
+                continue
+
+            del self.pending[path]
+            result.append(path)
+
+        return sorted(result)
+
+    def collect(self, timeout):
+        """ collect
+
+            Waits up to timeout seconds for changes, calling touch for each
+            file found. To be implemented by subclasses.
+        """
+        raise NotImplementedError
+
+    def wait(self, timeout):
+        """ wait
+
+            Returns the list of new or changed (and settled) files. Waits up
+            to timeout seconds while there are none.
+        """
+        deadline = time.time() + timeout
+        while True:
+            remaining = max(0, deadline - time.time())
+            # While files are settling check them every second
+            self.collect(min(remaining, 1) if self.pending else remaining)
+            result = self.settled()
+            if result or self.needs_rescan or time.time() >= deadline:
+                return result
+
+    def close(self):
+        """ close
+
+            Releases resources.
+        """
+        pass
+
+
+# -----------------------------------------------------------------------------
+# class PollingWatcher
+#
+# Finds changes by listing the folders every POLL_SECS.
+#
+class PollingWatcher(Watcher):
+    """ PollingWatcher
+
+        Every poll seconds lists the folders within top whose mtime changed.
+        Files new or with a different size or mtime are candidates.
+        Like scanner.ScanIndex, a file rewritten in place (folder mtime not
+        changed) is not detected.
+
+        >>> import tempfile
+        >>> adir = tempfile.mkdtemp()
+        >>> os.mkdir(os.path.join(adir, 'sub'))
+        >>> watch = PollingWatcher(adir, None, settle=0, poll=0)
+        >>> watch.wait(0)
+        []
+        >>> afile = os.path.join(adir, 'sub', 'a.jpg')
+        >>> with open(afile, 'w') as fileobj:
+        ...     _ = fileobj.write('abc')
+        >>> watch.dirs.clear()  # Same mtime within its resolution
+        >>> watch.wait(0) == [afile]
+        True
+
+        Folders within EXCLUDED_FOLDERS (also a/b like ones) are not
+        watched:
+
+        >>> adir = tempfile.mkdtemp()
+        >>> for sub in ['b', 'c']:
+        ...     os.makedirs(os.path.join(adir, 'a', sub))
+        >>> watch = PollingWatcher(
+        ...     adir, scanner.ExclusionMatcher(['a/b'], [], adir),
+        ...     settle=0, poll=0)
+        >>> for sub in ['b', 'c']:
+        ...     with open(os.path.join(adir, 'a', sub, 'a.jpg'), 'w') as f:
+        ...         _ = f.write('abc')
+        >>> watch.dirs.clear()  # Same mtime within its resolution
+        >>> [os.path.relpath(path, adir) for path in watch.wait(0)]
+        ['a/c/a.jpg']
+    """
+
+    def __init__(self, top, exclusions, settle=SETTLE_SECS,
+                 poll=POLL_SECS):
+        """ class PollingWatcher __init__
+
+            Takes the initial snapshot of top.
+        """
+        super(PollingWatcher, self).__init__(top, exclusions, settle)
+        self.poll = poll
+        self.last_poll = 0
+        # dirs = dirpath: (mtime, dirnames, {name: (size, mtime)})
+        self.dirs = {}
+        self.scan(initial=True)
+
+    def scan(self, initial=False):
+        """ scan
+
+            Lists changed folders. Registers new or changed files.
+        """
+        self.last_poll = time.time()
+        found = set()
+        stack = [self.top]
+        while stack:
+            dirpath = stack.pop()
+            found.add(dirpath)
+            try:
+                mtime = os.stat(dirpath).st_mtime
+                if dirpath in self.dirs and self.dirs[dirpath][0] == mtime:
+                    stack.extend(os.path.join(dirpath, name)
+                                 for name in self.dirs[dirpath][1])
+                    continue
+                dirnames, files = scanner.list_dir(dirpath)
+            except OSError as err:
+                logging.warning('PollingWatcher: skipping [%s]: [%s]',
+                                NPR.strunicodeout(dirpath), err)
+                continue
+
+            dirnames = [name for name in dirnames
+                        if not self.is_excluded(os.path.join(dirpath, name))]
+            stack.extend(os.path.join(dirpath, name) for name in dirnames)
+
+            old_stats = self.dirs[dirpath][2] if dirpath in self.dirs else {}
+            new_stats = {}
+            for name, _ in files:
+                path = os.path.join(dirpath, name)
+                try:
+                    st_file = os.stat(path)
+                except OSError:
+                    continue
+                new_stats[name] = (st_file.st_size, st_file.st_mtime)
+                if not initial and old_stats.get(name) != new_stats[name]:
+                    self.touch(path)
+
+            self.dirs[dirpath] = (mtime, dirnames, new_stats)
+
+        for dirpath in [dirpath for dirpath in self.dirs
+                        if dirpath not in found]:
+            del self.dirs[dirpath]
+
+    def collect(self, timeout):
+        """ collect
+
+            Scans again once poll seconds elapsed since the previous scan.
+        """
+        wait = self.last_poll + self.poll - time.time()
+        if wait > timeout:
+            time.sleep(timeout)
+            return
+        if wait > 0:
+            time.sleep(wait)
+        self.scan()
+
+
+# -----------------------------------------------------------------------------
+# class InotifyWatcher
+#
+# Receives changes from the Linux kernel via inotify.
+#
+class InotifyWatcher(Watcher):
+    """ InotifyWatcher
+
+        Adds an inotify watch to each folder within top (new folders
+        included). Raises OSError if inotify is not available or the
+        watches can not be added (see fs.inotify.max_user_watches).
+
+        >>> import tempfile
+        >>> adir = tempfile.mkdtemp()
+        >>> try:
+        ...     watch = InotifyWatcher(adir, None, settle=0)
+        ... except OSError:
+        ...     watch = PollingWatcher(adir, None, settle=0, poll=0)
+        >>> os.mkdir(os.path.join(adir, 'sub'))
+        >>> afile = os.path.join(adir, 'sub', 'a.jpg')
+        >>> with open(afile, 'w') as fileobj:
+        ...     _ = fileobj.write('abc')
+        >>> watch.dirs.clear() if isinstance(watch, PollingWatcher) else None
+        >>> watch.wait(2) == [afile]
+        True
+        >>> watch.close()
+    """
+
+    def __init__(self, top, exclusions, settle=SETTLE_SECS):
+        """ class InotifyWatcher __init__
+
+            Sets up the inotify instance and the watches.
+        """
+        super(InotifyWatcher, self).__init__(top, exclusions, settle)
+        self.fd = -1
+        # wds = watch descriptor: dirpath
+        self.wds = {}
+
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, 'inotify requires Linux')
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                                use_errno=True)
+        if not hasattr(self.libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, 'inotify not available')
+
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+        try:
+            self.add_tree(top, initial=True)
+        except OSError:
+            self.close()
+            raise
+
+    def fs_encode(self, path):
+        """ fs_encode
+
+            path as bytes for the libc calls.
+        """
+        if isinstance(path, bytes):
+            return path
+        return path.encode(sys.getfilesystemencoding())
+
+    def fs_decode(self, name):
+        """ fs_decode
+
+            name (bytes) from an inotify event in the same type as top.
+        """
+        if isinstance(self.top, bytes):
+            return name
+        if sys.version_info < (3, ):
+            return name.decode(sys.getfilesystemencoding())
+        return os.fsdecode(name)
+
+    def add_tree(self, dirpath, initial=False):
+        """ add_tree
+
+            Watches dirpath and its sub folders. If not initial, files found
+            are candidates (e.g. folder moved into top).
+        """
+        stack = [dirpath]
+        while stack:
+            adir = stack.pop()
+            wd = self.libc.inotify_add_watch(self.fd,
+                                             self.fs_encode(adir),
+                                             IN_WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if initial and err in (errno.ENOSPC, errno.ENOMEM):
+                    raise OSError(err, os.strerror(err))
+                logging.warning('InotifyWatcher: not watching [%s]: [%s]',
+                                NPR.strunicodeout(adir), os.strerror(err))
+                self.needs_rescan = True
+                continue
+            self.wds[wd] = adir
+
+            try:
+                dirnames, files = scanner.list_dir(adir)
+            except OSError:
+                continue
+            stack.extend(os.path.join(adir, name)
+                         for name in dirnames
+                         if not self.is_excluded(os.path.join(adir, name)))
+            if not initial:
+                for name, _ in files:
+                    self.touch(os.path.join(adir, name))
+
+        logging.debug('InotifyWatcher: watching [%s] folders.', len(self.wds))
+
+    def collect(self, timeout):
+        """ collect
+
+            Waits up to timeout seconds for inotify events.
+        """
+        try:
+            ready, _, _ = select.select([self.fd], [], [], timeout)
+        except select.error as err:
+            if err.args[0] == errno.EINTR:
+                return
+            raise
+        if not ready:
+            return
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as err:
+            if err.errno in (errno.EAGAIN, errno.EINTR):
+                return
+            raise
+
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                logging.warning('InotifyWatcher: event queue overflow.')
+                self.needs_rescan = True
+                continue
+            if mask & IN_IGNORED:
+                self.wds.pop(wd, None)
+                continue
+            if wd not in self.wds or not name:
+                continue
+
+            path = os.path.join(self.wds[wd], self.fs_decode(name))
+            if mask & IN_ISDIR:
+                if (mask & (IN_CREATE | IN_MOVED_TO) and
+                        not self.is_excluded(path)):
+                    self.add_tree(path)
+            else:
+                self.touch(path)
+
+    def close(self):
+        """ close
+
+            Closes the inotify instance (and its watches).
+        """
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+# -----------------------------------------------------------------------------
+# get_watcher
+#
+# Returns an InotifyWatcher or a PollingWatcher if inotify is not available.
+#
+def get_watcher(top, exclusions, settle=SETTLE_SECS, poll=POLL_SECS):
+    """ get_watcher
+
+        Returns an InotifyWatcher for top or, if inotify is not available,
+        a PollingWatcher.
+    """
+    try:
+        return InotifyWatcher(top, exclusions, settle)
+    except OSError as err:
+        NPR.niceprint('inotify not available ([{!s}]). '
+                      'Polling every [{!s}] seconds.'
+                      .format(err, poll),
+                      logalso=logging.WARNING)
+
+    return PollingWatcher(top, exclusions, settle, poll)
+
+
+# -----------------------------------------------------------------------------
+# If called directly run doctests
+#
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.WARNING,
+                        format='[%(asctime)s]:[%(processName)-11s]' +
+                        '[%(levelname)-8s]:[%(name)s] %(message)s')
+
+    import doctest
+    doctest.testmod()
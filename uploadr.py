@@ -213,6 +213,27 @@ def parse_arguments():
                             metavar='P', type=int,
                             help='Number of photos to upload simultaneously. '
                                  'Number of process to assign pics to sets.')
+    pgrpparser.add_argument('--adaptive-min',
+                            metavar='M', type=int,
+                            help='With -p option, adjust the number of '
+                                 'photos uploaded simultaneously between M '
+                                 'and P as per the errors and response '
+                                 'times from Flickr. Starts at M, grows '
+                                 'while Flickr responds well and halves on '
+                                 'errors or slow responses.')
+    pgrpparser.add_argument('--async-upload', action='store_true',
+                            help='Upload files asynchronously: move on to '
+                                 'the next file as soon as one is sent, '
+                                 'while Flickr processes it. Processed '
+                                 'files are checked in batches and recorded '
+                                 'on the local database. Speeds up '
+                                 'uploading videos.')
+    pgrpparser.add_argument('--bulk-sets', action='store_true',
+                            help='List the pics of each Set (Album) to '
+                                 'record the ones already there without '
+                                 'one call per pic. Faster when many pics '
+                                 'are already in their Sets (e.g. on a '
+                                 'rebuilt local database).')
     pgrpparser.add_argument('-u', '--not-is-already-uploaded',
                             action='store_true',
                             help='Do not check if file is already uploaded '
@@ -228,12 +249,41 @@ def parse_arguments():
                             help='Do not actually delete pics from flicr.com &'
                                  ' mark them with tag:[{!s}]'
                             .format(UPLDR_K.no_delete_tag))
+    pgrpparser.add_argument('--checksum-index', action='store_true',
+                            help='Check if files are already uploaded on a '
+                                 'local index of all pics on Flickr (built '
+                                 'once per run with about one call per 500 '
+                                 'pics) instead of searching Flickr for '
+                                 'each file.')
+    pgrpparser.add_argument('--delta-sync', action='store_true',
+                            help='Before uploading, pull only the changes '
+                                 'made on Flickr since the previous run '
+                                 '(Sets created, renamed, deleted or '
+                                 'updated; pics updated) into the local '
+                                 'database. Also keeps the --checksum-index '
+                                 'up to date without rebuilding it.')
+    pgrpparser.add_argument('--full-scan', action='store_true',
+                            help='List all folders within FILES_DIR. By '
+                                 'default only folders changed since the '
+                                 'previous run are listed. Use it if files '
+                                 'were replaced keeping the same name.')
+    pgrpparser.add_argument('--scan-threads',
+                            metavar='T', type=int, default=1,
+                            help='Number of threads listing folders within '
+                                 'FILES_DIR in parallel. Speeds up scanning '
+                                 'network shares (NFS/SMB). Default is 1.')
     # run in daemon mode uploading every X seconds
     pgrpparser.add_argument('-d', '--daemon', action='store_true',
                             help='Run forever as a daemon.'
                                  'Uploading every SLEEP_TIME seconds. Please '
                                  'note it only performs '
                                  'upload/raw convert/replace.')
+    pgrpparser.add_argument('--watch', action='store_true',
+                            help='With -d option, watch FILES_DIR (inotify '
+                                 'or polling if not available) and upload '
+                                 'files (and add them to sets) as they '
+                                 'arrive instead of every SLEEP_TIME '
+                                 'seconds.')
 
     # Bad files related options -----------------------------------------------
     # Cater for bad files. files in your Library that flickr does not recognize
@@ -260,9 +310,13 @@ def parse_arguments():
                             action='store_true',
                             help='Remove previously uploaded files, that are '
                                  'now being excluded due to change of the INI '
-                                 'file configuration EXCLUDED_FOLDERS.'
-                                 'NOTE: Option --remove-ignored was '
-                                 'dropped in favor of --remove-excluded.')
+                                 'file configuration EXCLUDED_FOLDERS.')
+    # when you change IGNORED_REGEX setting
+    bgrpparser.add_argument('--remove-ignored',
+                            action='store_true',
+                            help='Remove previously uploaded files, that are '
+                                 'now being ignored due to change of the INI '
+                                 'file configuration IGNORED_REGEX.')
 
     # Migration related options -----------------------------------------------
     # 2.7.0 Version will add album/setName as one
@@ -426,8 +480,15 @@ def run_uploadr(args):
             if args.remove_excluded:
                 myflick.remove_excluded_media()
 
+            if args.remove_ignored:
+                myflick.remove_ignored_media()
+
             myflick.create_sets()
             myflick.pics_status(KonstantsClass.media_count)
+
+    # Stop the processes pool (if used). Processes are daemonic and would
+    # also be stopped on exit (for instance, in daemon mode).
+    myflick.shutdown_pool()
     # Run Uploadr -------------------------------------------------------------
 
 